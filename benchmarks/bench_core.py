@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Throughput and latency benchmarks of core.Omicron_laser.
+
+The laser is the in-process simulator (see omicron_laser.simulator.Loopback)
+so results only depend on the client code and the emulated link. Results
+are printed (or written with ``--output``) as JSON to track regressions
+between releases::
+
+    $ python -m benchmarks.bench_core --latency 0.0005 --output bench.json
+"""
+
+import argparse
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import omicron_laser
+from omicron_laser.core import LatchedFailure, Omicron_laser, Status
+from omicron_laser.simulator import Loopback
+from omicron_laser.simulator import Omicron_laser as Simulator
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name, iterations=None):
+    """
+    Register a benchmark factory ``setup(options)`` returning the callable
+    to measure, or a (callable, cleanup) pair.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = setup, iterations
+        return setup
+    return decorator
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(func, iterations: int) -> dict:
+    latencies = []
+    clock = time.perf_counter
+    start = clock()
+    for _ in range(iterations):
+        t0 = clock()
+        func()
+        latencies.append(clock() - t0)
+    total = clock() - start
+    latencies.sort()
+    return dict(
+        iterations=iterations,
+        rate=iterations / total,
+        mean=total / iterations,
+        p50=percentile(latencies, 0.50),
+        p99=percentile(latencies, 0.99),
+        max=latencies[-1],
+    )
+
+
+def make_connection(options, timeout=None) -> Loopback:
+    device = Simulator("bench", latency=options.latency, jitter=options.jitter,
+                       baudrate=options.baudrate, reset_time=0,
+                       calibration_time=0)
+    return Loopback(device, options.timeout if timeout is None else timeout)
+
+
+def make_laser(options, **kwargs) -> Omicron_laser:
+    return Omicron_laser(make_connection(options), **kwargs)
+
+
+@benchmark("ask")
+def bench_ask(options):
+    laser = make_laser(options)
+    return lambda: laser._ask(b"MDP")
+
+
+@benchmark("ask_bytes")
+def bench_ask_bytes(options):
+    laser = make_laser(options)
+    return lambda: laser._ask_bytes(b"GAS")
+
+
+@benchmark("set")
+def bench_set(options):
+    laser = make_laser(options)
+    return lambda: laser._set(b"SAS", b"1")
+
+
+@benchmark("query_many_5")
+def bench_query_many(options):
+    laser = make_laser(options)
+    commands = [b"MDP", b"MTD", b"MTA", b"GAS", b"GFB"]
+    return lambda: laser.query_many(commands)
+
+
+# Every setpoint drains the ad-hoc messages until the read timeout expires.
+@benchmark("set_level_power", iterations=20)
+def bench_set_level_power(options):
+    laser = make_laser(options)
+    return lambda: laser.set_level_power(0x100)
+
+
+# The drain only waits the adaptive timeout of SLP.
+@benchmark("set_level_power_adaptive", iterations=200)
+def bench_set_level_power_adaptive(options):
+    laser = make_laser(options, adaptive_timeout=True)
+    return lambda: laser.set_level_power(0x100)
+
+
+@benchmark("set_level_power_dispatcher")
+def bench_set_level_power_dispatcher(options):
+    laser = make_laser(options, dispatcher=True)
+    return lambda: laser.set_level_power(0x100), laser.stop_dispatcher
+
+
+@benchmark("frame_split_20")
+def bench_frame_split(options):
+    from omicron_laser.framing import FrameReader
+    conn = make_connection(options)
+    reader = FrameReader(conn)
+    burst = b"!MDP12.500\r" * 20
+
+    def split():
+        conn._rx += burst
+        for _ in range(20):
+            reader.read_frame(lambda frame: float(frame[4:-1]))
+    return split
+
+
+@benchmark("status_decode")
+def bench_status_decode(options):
+    data = b"\x43\x02"
+
+    def decode():
+        status = Status(data)
+        return status.error, status.on, status.system_power
+    return decode
+
+
+@benchmark("latched_failure_to_dict")
+def bench_latched_failure(options):
+    data = b"\x01\x02"
+    return lambda: LatchedFailure(data).to_dict()
+
+
+@benchmark("handshake_eager", iterations=200)
+def bench_handshake_eager(options):
+    return lambda: make_laser(options)
+
+
+@benchmark("handshake_pipelined", iterations=200)
+def bench_handshake_pipelined(options):
+    return lambda: make_laser(options, handshake="pipelined")
+
+
+def record_session(conn) -> bytes:
+    """
+    Record a handshake and a telemetry cycle. Run it on a real laser port
+    to make a file for ``--replay``.
+    """
+    from omicron_laser.record import RecordingConnection
+    buffer = io.BytesIO()
+    laser = Omicron_laser(RecordingConnection(conn, buffer))
+    laser.query_many([b"MDP", b"MTD", b"MTA", b"GAS", b"GFB"])
+    laser.get_level_power()
+    return buffer.getvalue()
+
+
+# Replays the --replay recording, or a simulator one, with no delay: only
+# the client cost is measured.
+@benchmark("replay_session", iterations=200)
+def bench_replay_session(options):
+    from omicron_laser.record import ReplayConnection, load, parse
+    records = load(options.replay) if options.replay else \
+        parse(record_session(make_connection(options)))
+
+    def replay():
+        conn = ReplayConnection(records, speed=float("inf"))
+        laser = Omicron_laser(conn)
+        try:
+            while True:
+                laser.query_many([b"MDP", b"MTD", b"MTA", b"GAS", b"GFB"])
+                laser.get_level_power()
+        except EOFError:
+            pass
+    return replay
+
+
+def import_module(module: str = None):
+    """Import *module* in a fresh interpreter (startup included)"""
+    command = [sys.executable, "-c",
+               "pass" if module is None else "import " + module]
+    return lambda: subprocess.run(command, check=True)
+
+
+# Interpreter startup alone, to subtract from the import benchmarks.
+@benchmark("import_baseline", iterations=10)
+def bench_import_baseline(options):
+    return import_module()
+
+
+@benchmark("import_package", iterations=10)
+def bench_import_package(options):
+    return import_module("omicron_laser")
+
+
+@benchmark("import_core", iterations=10)
+def bench_import_core(options):
+    return import_module("omicron_laser.core")
+
+
+@benchmark("import_tango_entry_point", iterations=10)
+def bench_import_tango_entry_point(options):
+    return import_module("omicron_laser.tango.server")
+
+
+def run(options) -> dict:
+    results = {}
+    for name, (setup, iterations) in BENCHMARKS.items():
+        if options.filter and not any(f in name for f in options.filter):
+            continue
+        func, cleanup = setup(options), None
+        if isinstance(func, tuple):
+            func, cleanup = func
+        results[name] = measure(func, iterations or options.iterations)
+        if cleanup is not None:
+            cleanup()
+    return dict(
+        version=omicron_laser.__version__,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        timestamp=time.time(),
+        options=dict(latency=options.latency, jitter=options.jitter,
+                     baudrate=options.baudrate, timeout=options.timeout),
+        results=results,
+    )
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated reply latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="simulated reply jitter (s)")
+    parser.add_argument("--baudrate", type=int, default=None,
+                        help="emulated link baudrate")
+    parser.add_argument("--timeout", type=float, default=0.01,
+                        help="connection read timeout (s)")
+    parser.add_argument("--replay", default=None,
+                        help="record_session() file replayed by replay_session")
+    parser.add_argument("--output", default=None,
+                        help="JSON file (default: stdout)")
+    parser.add_argument("filter", nargs="*",
+                        help="only run benchmarks containing these names")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(args)
+    report = run(options)
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,4 +11,27 @@ __author__ = """Alberto López Sánchez"""
 __email__ = 'controls@cells.es'
 __version__ = '0.1.0'
 
-from .core import Omicron_laser
+import importlib
+
+# Public names and their modules, imported on first access so that
+# ``import omicron_laser`` stays cheap.
+_LAZY = {
+    "Omicron_laser": "core",
+    "AsyncOmicronLaser": "aio",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
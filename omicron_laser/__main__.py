@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""Command line main (``python -m omicron_laser``)"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Asyncio Omicron_laser module.
+
+It receives an asynchronous connection object (any object providing
+``async write(data)`` and ``async readline(eol=...)``, like the ones
+returned by connio). Example::
+
+    from connio import connection_for_url
+    from omicron_laser.aio import AsyncOmicronLaser
+
+    async def main():
+        conn = connection_for_url("serial:///dev/ttyUSB0", baudrate=500000)
+        laser = AsyncOmicronLaser(conn)
+        await laser.initialize()
+
+        print(laser.serial_number, await laser.measure_diode_power())
+
+    asyncio.run(main())
+"""
+import asyncio
+import inspect
+import logging
+import time
+
+from .core import (EOL, CalibrationResult, LatchedFailure, OperationMode,
+                   Status, adhoc_command, decode_bytes, decode_fields,
+                   encode_query, is_adhoc, parse_reply)
+from .metrics import CommandMetrics
+
+
+# Longest single read (s) while waiting for a long operation to complete.
+WAIT_STEP = 0.1
+
+
+class AsyncOmicronLaser:
+    """The asyncio Omicron_laser.
+
+    Every command is a coroutine. Transactions on the same laser are
+    serialized with a lock so concurrent coroutines never interleave their
+    replies, while different lasers can be driven from the same event loop.
+    """
+
+    def __init__(self, conn, timeout: float = None):
+        """
+        *timeout* (s) bounds the wait for each reply frame: past it, what
+        the port buffered is discarded and TimeoutError is raised, so a lost
+        reply cannot hold the client forever.
+        """
+        self._conn = conn
+        self.timeout = timeout
+        self._lock = asyncio.Lock()
+        self.metrics = CommandMetrics()
+        self.temporal_power = None
+        # Completion frames of long operations read by other transactions.
+        self._completed = {}
+        self._read_task = None
+
+    async def _readline(self, timeout: float = None) -> bytes:
+        """
+        Next frame, or ``b""`` if none is complete within *timeout*.
+
+        The read is never cancelled midway (connio would lose the part of
+        the frame already received): when it times out, or the caller is
+        cancelled, the next call picks it up where it was.
+        """
+        if self._read_task is None:
+            self._read_task = asyncio.ensure_future(
+                self._conn.readline(eol=EOL))
+        task = self._read_task
+        done, _ = await asyncio.wait((task,), timeout=timeout)
+        if not done:
+            return b""
+        self._read_task = None
+        return task.result()
+
+    async def _next_frame(self) -> bytes:
+        raw = await self._readline(self.timeout)
+        if not raw and self.timeout is not None:
+            await self._reset_input()
+            raise TimeoutError(
+                "No reply from the laser within {}s".format(self.timeout))
+        return raw
+
+    async def _reset_input(self):
+        """Drop the pending read and the input buffered by the port"""
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        reset = getattr(self._conn, "reset_input_buffer", None)
+        if reset is not None:
+            result = reset()
+            if inspect.isawaitable(result):
+                await result
+
+    def _handle_adhoc(self, raw: bytes):
+        command = adhoc_command(raw)
+        if command in (b"$RsC", b"$CLD"):
+            self._completed[command] = raw
+            return
+        decoded = raw.lstrip(b"\x00")[:-1].decode("Latin1")
+        if decoded.startswith("$TPP"):
+            self.temporal_power = float(decoded[4:].split("|")[0])
+
+    def _is_foreign(self, command: bytes, raw: bytes) -> bool:
+        # Frames of a long operation in course may come before the reply.
+        if command is None or raw[1:4] == command or raw[1:3] == b"UK" \
+                or not raw.startswith(b"!"):
+            return False
+        logging.info("Skipping unexpected frame {!r}".format(raw))
+        return True
+
+    async def _reply(self, command: bytes = None) -> bytes:
+        # Ad-hoc messages may precede the reply; consume them on the way.
+        raw = await self._next_frame()
+        while is_adhoc(raw) or self._is_foreign(command, raw):
+            if is_adhoc(raw):
+                self._handle_adhoc(raw)
+            raw = await self._next_frame()
+        return raw
+
+    async def _wait_adhoc(self, command: bytes, progress=None) -> bytes:
+        """
+        Wait for the ad-hoc frame ending a long operation. The lock is only
+        held for one read at a time, so other commands run meanwhile.
+        """
+        start = time.monotonic()
+        while True:
+            raw = self._completed.pop(command, None)
+            if raw is not None:
+                return raw
+            async with self._lock:
+                if command in self._completed:
+                    continue
+                raw = await self._readline(WAIT_STEP)
+            if is_adhoc(raw):
+                if adhoc_command(raw) == command:
+                    return raw
+                self._handle_adhoc(raw)
+            elif raw:
+                logging.info("{} in course, laser response: {}".format(
+                    command[1:].decode(), raw))
+            if progress is not None:
+                progress(time.monotonic() - start, raw)
+
+    async def _transaction(self, frame: bytes) -> bytes:
+        command = frame[1:4]
+        async with self._lock:
+            start = self.metrics.request(command, frame)
+            await self._conn.write(frame)
+            try:
+                raw = await self._reply(command)
+            except TimeoutError:
+                self.metrics.response(command, b"", start)
+                raise
+            self.metrics.response(command, raw, start)
+            return raw
+
+    async def _ask(self, question: bytes) -> list:
+        return decode_fields(await self._transaction(encode_query(question)))
+
+    async def _ask_bytes(self, question: bytes) -> bytes:
+        return decode_bytes(await self._transaction(encode_query(question)))
+
+    async def _set(self, what: bytes, value: bytes) -> list:
+        return decode_fields(await self._transaction(encode_query(what, value)))
+
+    async def query_many(self, commands) -> list:
+        """Pipeline several queries in one write; see Omicron_laser.query_many"""
+        commands = list(commands)
+        metrics = self.metrics
+        async with self._lock:
+            frame = b"".join(encode_query(command) for command in commands)
+            starts = [metrics.request(command, frame) for command in commands]
+            await self._conn.write(frame)
+            replies = []
+            for command, start in zip(commands, starts):
+                try:
+                    replies.append(await self._reply(command))
+                except TimeoutError:
+                    metrics.response(command, b"", start)
+                    raise
+                metrics.response(command, replies[-1], start)
+        return [parse_reply(command, raw)
+                for command, raw in zip(commands, replies)]
+
+    async def initialize(self):
+        firmware = await self._ask(b"GFw")
+        self.model_code = firmware[0]
+        self.device_id = firmware[1]
+        self.firmware_version = firmware[2]
+
+        self.serial_number = (await self._ask(b"GSN"))[0]
+
+        specs = await self._ask(b"GSI")
+        self.wavelength = specs[0]
+        self.power = specs[1]
+
+        self.max_power = await self._ask(b"GMP")
+
+    async def get_working_hours(self):
+        return (await self._ask(b"GWH"))[0]
+
+    async def get_maximum_power(self):
+        return float((await self._ask(b"GMP"))[0])
+
+    async def measure_diode_power(self) -> float:
+        return float((await self._ask(b"MDP"))[0])
+
+    async def measure_temperature_diode(self) -> float:
+        return float((await self._ask(b"MTD"))[0])
+
+    async def measure_temperature_ambient(self) -> float:
+        return float((await self._ask(b"MTA"))[0])
+
+    async def get_status(self) -> Status:
+        self.status = Status(await self._ask_bytes(b"GAS"))
+        return self.status
+
+    async def get_failure_bytes(self) -> bytes:
+        return await self._ask_bytes(b"GFB")
+
+    async def get_latched_failure(self) -> LatchedFailure:
+        self.latched_failure = LatchedFailure(await self._ask_bytes(b"GLF"))
+        return self.latched_failure
+
+    async def get_level_power(self):
+        response = (await self._ask(b"GLP"))[0]
+        return int(response, 16)
+
+    async def set_level_power(self, value: int) -> bool:
+        response = await self._set(b"SLP", hex(value)[2:].encode("Latin1"))
+        return response[0] == ">"
+
+    async def set_temporary_power(self, percentage: float):
+        response = await self._set(b"TPP", str(percentage).encode("Latin1"))
+        return response[0] == ">"
+
+    async def get_temporary_power(self):
+        return (await self._ask(b"TPP"))[0]
+
+    async def get_operation_mode(self) -> OperationMode:
+        self.operation_mode = OperationMode(await self._ask_bytes(b"GOM"))
+        return self.operation_mode
+
+    async def update_operation_mode(self):
+        mode = bytes(self.operation_mode)
+        response = (await self._set(b"SOM", mode))[0]
+        return response == '>'
+
+    async def set_auto_powerup(self, value: bool) -> bool:
+        response = (await self._set(b"SAP", str(int(value)).encode("Latin1")))[0]
+        return response == ">"
+
+    async def set_auto_startup(self, value: bool) -> bool:
+        response = (await self._set(b"SAS", str(int(value)).encode("Latin1")))[0]
+        return response == ">"
+
+    async def set_auto_reset(self, value) -> bool:
+        response = (await self._set(b"ARs", str(int(value)).encode("Latin1")))[0]
+        return response == ">"
+
+    async def power_on(self) -> bool:
+        return (await self._ask(b"POn"))[0] == ">"
+
+    async def power_off(self) -> bool:
+        return (await self._ask(b"POf"))[0] == ">"
+
+    async def laser_on(self) -> bool:
+        return (await self._ask(b"LOn"))[0] == ">"
+
+    async def laser_off(self) -> bool:
+        return (await self._ask(b"LOf"))[0] == ">"
+
+    async def reset(self, progress=None) -> bool:
+        """
+        Reset the laser. *progress(elapsed, raw)* is called for every frame
+        received before completion. Other commands are served while the
+        laser resets. Use ``asyncio.wait_for`` for a timeout.
+        """
+        async with self._lock:
+            self._completed.pop(b"$RsC", None)
+            await self._conn.write(b"?RsC" + EOL)
+            recv = await self._next_frame() == b"!RsC" + EOL
+            logging.info("Reset command received. Laser reponse: {}".format(recv))
+            if not recv:
+                return False
+        await self._wait_adhoc(b"$RsC", progress)
+        return True
+
+    async def calibrate_laser_diode(self, progress=None) -> CalibrationResult:
+        """Calibrate the laser diode; see :meth:`reset` for *progress*"""
+        async with self._lock:
+            self._completed.pop(b"$CLD", None)
+            await self._conn.write(encode_query(b"CLD"))
+            if decode_fields(await self._next_frame())[0] != ">":
+                return CalibrationResult.UNKNOWN_ERROR
+            logging.info("Laser calibration initiated")
+        response = await self._wait_adhoc(b"$CLD", progress)
+        code = response[response.index(b"$CLD") + 4:-1]
+        return CalibrationResult(int(code))
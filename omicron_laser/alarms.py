@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Alarm and drift detection over batches of telemetry samples.
+
+A batch maps field names to numpy arrays of the same length, one of them
+being ``time`` (the record arrays of :mod:`omicron_laser.archive` work as
+is). Rules are evaluated on a whole batch at once with numpy and only the
+edges are reported: an :class:`Event` when a condition becomes true and
+another when it clears, or one per flag that flips in a packed status
+word. Rules hold no state, so one rule list can be shared by the
+:class:`AlarmEngine` of every laser::
+
+    rules = [Threshold("diode_hot", "temperature_diode", high=35),
+             RateOfChange("ambient_drift", "temperature_ambient", 0.5 / 60,
+                          window=300),
+             PowerBelowSetpoint("power_low", max_power=100, tolerance=0.1),
+             BitTransition("status", "status", Status)]
+    engine = AlarmEngine(rules)
+    for event in engine.process(archive.range(start, stop)):
+        print(event)
+
+Requires numpy (``pip install omicron_laser[telemetry]``).
+"""
+
+import collections
+
+import numpy
+
+from .core import LatchedFailure, Status
+
+
+LEVEL_POWER_MAX = 0xFFF
+
+
+class Event(collections.namedtuple("Event", "time rule active value")):
+    """
+    An alarm edge: *rule* became *active* (or cleared) at *time*. *value*
+    is the sample that triggered it (the packed word for bit transitions,
+    whose rule is named ``"<rule>.<flag>"``).
+    """
+
+    __slots__ = ()
+
+
+def _has_field(batch, name: str) -> bool:
+    names = getattr(getattr(batch, "dtype", None), "names", None)
+    return name in (batch if names is None else names)
+
+
+def _edges(name: str, times, condition, values, state: dict) -> list:
+    previous = state.get("active", False)
+    changed = numpy.flatnonzero(
+        condition != numpy.concatenate(([previous], condition[:-1])))
+    if len(condition):
+        state["active"] = bool(condition[-1])
+    return [Event(float(times[i]), name, bool(condition[i]), values[i].item())
+            for i in changed]
+
+
+class Threshold:
+    """Active while *field* is below *low* or above *high*"""
+
+    def __init__(self, name: str, field: str, low: float = None,
+                 high: float = None):
+        self.name = name
+        self.field = field
+        self.low = low
+        self.high = high
+
+    def evaluate(self, batch, state: dict) -> list:
+        values = numpy.asarray(batch[self.field])
+        condition = numpy.zeros(len(values), dtype=bool)
+        if self.low is not None:
+            condition |= values < self.low
+        if self.high is not None:
+            condition |= values > self.high
+        return _edges(self.name, batch["time"], condition, values, state)
+
+
+class RateOfChange:
+    """
+    Active while *field* changes faster than *limit* per second, measured
+    over the last *window* seconds (samples of previous batches included).
+    """
+
+    def __init__(self, name: str, field: str, limit: float,
+                 window: float = 60.0):
+        self.name = name
+        self.field = field
+        self.limit = limit
+        self.window = window
+
+    def evaluate(self, batch, state: dict) -> list:
+        new_times = numpy.asarray(batch["time"], dtype=numpy.float64)
+        new_values = numpy.asarray(batch[self.field], dtype=numpy.float64)
+        old_times, old_values = state.get("tail", ((), ()))
+        times = numpy.concatenate((old_times, new_times))
+        values = numpy.concatenate((old_values, new_values))
+        new = slice(len(old_times), None)
+
+        start = numpy.searchsorted(times, times[new] - self.window, "left")
+        elapsed = times[new] - times[start]
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            rate = numpy.where(elapsed > 0,
+                               (values[new] - values[start]) / elapsed, 0.0)
+        condition = numpy.abs(rate) > self.limit
+
+        if len(times):
+            keep = numpy.searchsorted(times, times[-1] - self.window, "left")
+            state["tail"] = times[keep:], values[keep:]
+        return _edges(self.name, new_times, condition, rate, state)
+
+
+class PowerBelowSetpoint:
+    """
+    Active while the laser is on and ``diode_power`` is more than
+    *tolerance* (fraction) below the setpoint, computed from the
+    ``level_power`` field (raw ``GLP`` value, see
+    :meth:`~omicron_laser.core.Omicron_laser.get_level_power`) and
+    *max_power* (mW). Batches without that field use *level_power*, and
+    are skipped if it is not given either. Without a ``status`` field the
+    laser is assumed to be on.
+    """
+
+    def __init__(self, name: str, max_power: float, tolerance: float = 0.1,
+                 level_power: int = None):
+        self.name = name
+        self.max_power = max_power
+        self.tolerance = tolerance
+        self.level_power = level_power
+
+    def evaluate(self, batch, state: dict) -> list:
+        if _has_field(batch, "level_power"):
+            level = numpy.asarray(batch["level_power"], dtype=numpy.float64)
+        elif self.level_power is not None:
+            level = float(self.level_power)
+        else:
+            return []
+        power = numpy.asarray(batch["diode_power"], dtype=numpy.float64)
+        setpoint = level * (self.max_power / LEVEL_POWER_MAX)
+        condition = power < setpoint * (1 - self.tolerance)
+        if _has_field(batch, "status"):
+            condition &= (numpy.asarray(batch["status"]) & Status.on.mask) != 0
+        return _edges(self.name, batch["time"], condition, power, state)
+
+
+class BitTransition:
+    """
+    One event per flag of *flags* (a :class:`~omicron_laser.core.Flags`
+    class) that flips in the packed word *field*. Transitions are found by
+    XOR of consecutive words.
+    """
+
+    def __init__(self, name: str, field: str, flags=Status):
+        self.name = name
+        self.field = field
+        self.flags = flags
+
+    def evaluate(self, batch, state: dict) -> list:
+        words = numpy.asarray(batch[self.field]).astype(numpy.uint32)
+        if not len(words):
+            return []
+        times = batch["time"]
+        previous = state.get("word", words[0])
+        changes = words ^ numpy.concatenate(([previous], words[:-1]))
+        state["word"] = words[-1]
+
+        events = []
+        for flag, mask in self.flags._fields:
+            for i in numpy.flatnonzero(changes & mask):
+                events.append(Event(float(times[i]), self.name + "." + flag,
+                                    bool(words[i] & mask), int(words[i])))
+        events.sort(key=lambda event: event.time)
+        return events
+
+
+def default_rules(max_power: float, level_power: int = None) -> list:
+    """A reasonable rule set for one laser of *max_power* mW"""
+    return [
+        Threshold("diode_temperature", "temperature_diode", 15.0, 40.0),
+        Threshold("ambient_temperature", "temperature_ambient", 10.0, 40.0),
+        RateOfChange("diode_temperature_drift", "temperature_diode",
+                     1.0 / 60, window=300),
+        RateOfChange("ambient_temperature_drift", "temperature_ambient",
+                     1.0 / 60, window=300),
+        PowerBelowSetpoint("power_below_setpoint", max_power,
+                           level_power=level_power),
+        BitTransition("status", "status", Status),
+        BitTransition("latched_failure", "latched_failure", LatchedFailure),
+    ]
+
+
+class AlarmEngine:
+    """
+    Evaluate *rules* on consecutive batches of one laser, keeping the
+    state needed to report edges across batch boundaries.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.callbacks = []
+        self._states = [{} for _ in self.rules]
+
+    def process(self, batch) -> list:
+        """Events of *batch*, in time order; they are also passed to callbacks"""
+        events = []
+        for rule, state in zip(self.rules, self._states):
+            events.extend(rule.evaluate(batch, state))
+        events.sort(key=lambda event: event.time)
+        for event in events:
+            for callback in self.callbacks:
+                callback(event)
+        return events
+
+    def active(self) -> list:
+        """Names of the condition rules currently active"""
+        return [rule.name for rule, state in zip(self.rules, self._states)
+                if state.get("active")]
+
+    def reset(self):
+        self._states = [{} for _ in self.rules]
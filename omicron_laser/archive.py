@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Long-term telemetry archive.
+
+Samples (diode power, temperatures and packed status words) are appended
+as fixed-width binary records to one file, in chunks of *chunk_size*
+records. A small ``.idx`` file next to it holds the time of the first
+record of each chunk. :class:`Archive` memory-maps the file, so a time range
+query only touches the pages of the chunks it spans and returns numpy views
+instead of loading the file::
+
+    with ArchiveWriter("laser.oma") as writer:
+        writer.record(laser, period=1.0)    # until interrupted
+
+    archive = Archive("laser.oma")
+    records = archive.range(time.time() - 86400)
+    print(records["temperature_diode"].mean())
+
+Requires numpy (``pip install omicron_laser[telemetry]``).
+"""
+
+import os
+import struct
+import threading
+import time
+
+import numpy
+
+from .core import decode_float
+from .sampler import decode_word
+
+
+MAGIC = b"OMLA"
+VERSION = 1
+
+# magic, version, record size, records per chunk; padded to HEADER_SIZE.
+HEADER = struct.Struct("<4sHHI")
+HEADER_SIZE = 64
+
+RECORD = numpy.dtype([
+    ("time", "<f8"),
+    ("diode_power", "<f4"),
+    ("temperature_diode", "<f4"),
+    ("temperature_ambient", "<f4"),
+    ("status", "<u2"),
+    ("failure", "<u2"),
+    ("latched_failure", "<u2"),
+])
+
+_RECORD = struct.Struct("<dfffHHH")
+
+# Query and decoder of each field but time.
+FIELD_QUERIES = (
+    (b"MDP", decode_float),
+    (b"MTD", decode_float),
+    (b"MTA", decode_float),
+    (b"GAS", decode_word),
+    (b"GFB", decode_word),
+    (b"GLF", decode_word),
+)
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def index_path(path) -> str:
+    return os.fspath(path) + ".idx"
+
+
+def _read_header(file, path) -> int:
+    magic, version, size, chunk_size = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or size != RECORD.itemsize:
+        raise ValueError("{} is not an Omicron laser archive (v{})".format(
+            path, VERSION))
+    return chunk_size
+
+
+class ArchiveWriter:
+    """
+    Append samples to an archive, creating it if needed. Timestamps must
+    not go backwards.
+    """
+
+    def __init__(self, path, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.path = os.fspath(path)
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, "rb") as file:
+                self.chunk_size = _read_header(file, self.path)
+            size = os.path.getsize(self.path) - HEADER_SIZE
+            self.count = size // RECORD.itemsize
+            if size % RECORD.itemsize:
+                # Drop a record half written by a crash.
+                os.truncate(self.path,
+                            HEADER_SIZE + self.count * RECORD.itemsize)
+            self._file = open(self.path, "ab")
+        else:
+            self.chunk_size = chunk_size
+            self.count = 0
+            self._file = open(self.path, "wb")
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize,
+                                         chunk_size).ljust(HEADER_SIZE, b"\x00"))
+        self._index = self._open_index()
+        self._last = None
+        if self.count:
+            with open(self.path, "rb") as file:
+                file.seek(-RECORD.itemsize, os.SEEK_END)
+                self._last = _RECORD.unpack(file.read(RECORD.itemsize))[0]
+        self._lock = threading.Lock()
+
+    def _open_index(self):
+        path = index_path(self.path)
+        chunks = -(-self.count // self.chunk_size)
+        if os.path.exists(path) and os.path.getsize(path) == 8 * chunks:
+            return open(path, "ab", buffering=0)
+        # Missing or out of sync with the records: rebuild it.
+        index = open(path, "wb", buffering=0)
+        if self.count:
+            self._file.flush()
+            times = numpy.memmap(self.path, dtype=RECORD, mode="r",
+                                 offset=HEADER_SIZE, shape=(self.count,))["time"]
+            index.write(times[::self.chunk_size].astype("<f8").tobytes())
+        return index
+
+    def append(self, timestamp: float, diode_power: float,
+               temperature_diode: float, temperature_ambient: float,
+               status: int, failure: int, latched_failure: int):
+        with self._lock:
+            if self._last is not None and timestamp < self._last:
+                raise ValueError("Archive timestamps must not go backwards")
+            if not self.count % self.chunk_size:
+                self._file.flush()
+                self._index.write(struct.pack("<d", timestamp))
+            self._file.write(_RECORD.pack(
+                timestamp, diode_power, temperature_diode, temperature_ambient,
+                status, failure, latched_failure))
+            self._last = timestamp
+            self.count += 1
+
+    def sample(self, laser, timestamp: float = None):
+        """Read every field from *laser* in one pipelined query and append it"""
+        replies = laser.query_many([query for query, _ in FIELD_QUERIES],
+                                   raw=True)
+        timestamp = time.time() if timestamp is None else timestamp
+        self.append(timestamp, *(decode(raw) for (_, decode), raw
+                                 in zip(FIELD_QUERIES, replies)))
+
+    def record(self, laser, period: float = 1.0, stop: threading.Event = None):
+        """Sample *laser* every *period* seconds until *stop* is set"""
+        stop = threading.Event() if stop is None else stop
+        next_time = time.monotonic()
+        while not stop.is_set():
+            self.sample(laser)
+            next_time += period
+            stop.wait(max(next_time - time.monotonic(), 0))
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Archive:
+    """
+    Read-only memory-mapped view of an archive. Call :meth:`refresh` to see
+    records appended after it was opened.
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as file:
+            self.chunk_size = _read_header(file, self.path)
+        self.refresh()
+
+    def refresh(self):
+        count = (os.path.getsize(self.path) - HEADER_SIZE) // RECORD.itemsize
+        if count > 0:
+            self.records = numpy.memmap(self.path, dtype=RECORD, mode="r",
+                                        offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = numpy.zeros(0, dtype=RECORD)
+        chunks = -(-count // self.chunk_size)
+        try:
+            index = numpy.fromfile(index_path(self.path), dtype="<f8")[:chunks]
+        except FileNotFoundError:
+            index = numpy.zeros(0, dtype="<f8")
+        if len(index) < chunks:
+            # Index not written yet (or lost): take it from the records.
+            start = len(index) * self.chunk_size
+            index = numpy.concatenate(
+                (index, self.records["time"][start::self.chunk_size]))
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _position(self, timestamp: float, side: str) -> int:
+        chunk = max(int(numpy.searchsorted(self.index, timestamp, side)) - 1, 0)
+        start = chunk * self.chunk_size
+        times = self.records["time"][start:start + self.chunk_size]
+        return start + int(numpy.searchsorted(times, timestamp, side))
+
+    def range(self, start: float = None, stop: float = None) -> numpy.ndarray:
+        """Records with start <= time < stop, as a view on the file"""
+        first = 0 if start is None else self._position(start, "left")
+        last = len(self.records) if stop is None else self._position(stop, "left")
+        return self.records[first:max(first, last)]
+
+    def column(self, name: str, start: float = None, stop: float = None):
+        """(times, values) views of one field over a time range"""
+        records = self.range(start, stop)
+        return records["time"], records[name]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""Per-command TTL cache of raw laser replies."""
+
+import threading
+import time
+
+from .metrics import OK, classify
+
+
+class TTLCache:
+    """
+    Cache raw reply frames per query command.
+
+    *ttl* maps commands (ex: ``b"GMP"``) to the number of seconds a reply
+    stays valid; commands not in *ttl* are never cached. Use
+    ``float("inf")`` for values the laser cannot change. Timeouts, error
+    and malformed replies are never cached either.
+
+    A reply read while a setter invalidates its command may predate the
+    setter: take a :meth:`version` before sending the query and give it to
+    :meth:`put`, which drops the reply if the command was invalidated since.
+    """
+
+    def __init__(self, ttl: dict, clock=time.monotonic):
+        self.ttl = dict(ttl)
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._version = 0
+        self._invalidated = {}
+        self._cleared = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, command: bytes) -> bool:
+        return command in self.ttl
+
+    def get(self, command: bytes):
+        """Return the cached reply for *command* or None"""
+        if command not in self.ttl:
+            return None
+        with self._lock:
+            entry = self._entries.get(command)
+            if entry is not None and entry[0] > self.clock():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        return None
+
+    def version(self) -> int:
+        """Token for :meth:`put` of a reply requested from now on"""
+        with self._lock:
+            return self._version
+
+    def put(self, command: bytes, raw: bytes, version: int = None):
+        ttl = self.ttl.get(command)
+        if not ttl or classify(command, raw) != OK:
+            return
+        with self._lock:
+            if version is not None and version < max(
+                    self._cleared, self._invalidated.get(command, 0)):
+                return
+            self._entries[command] = self.clock() + ttl, raw
+
+    def invalidate(self, *commands):
+        with self._lock:
+            self._version += 1
+            for command in commands:
+                self._entries.pop(command, None)
+                self._invalidated[command] = self._version
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._cleared = self._version
+            self._entries.clear()
+
+    def info(self) -> dict:
+        return dict(hits=self.hits, misses=self.misses,
+                    size=len(self._entries))
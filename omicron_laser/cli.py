@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Command line interface.
+
+``omicron-laser monitor`` streams telemetry of one or more lasers to
+stdout, as CSV or JSON lines::
+
+    $ omicron-laser monitor /dev/ttyUSB0 /dev/ttyUSB1 --format json
+    $ omicron-laser monitor socket://moxa:4001 -c MDP -c GAS --interval 0.1
+
+Each laser is polled from its own thread with all its channels pipelined in
+one write, as fast as the link allows (or every ``--interval`` seconds).
+Rows go through a bounded queue: when stdout is slower than the lasers, the
+pollers wait instead of piling up samples in memory.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+from .core import Status, pack_word, parse_reply
+
+
+# Output columns of each channel and how to get them from the parsed reply.
+CHANNELS = {
+    "MDP": (("diode_power",), lambda value: (value,)),
+    "MTD": (("temperature_diode",), lambda value: (value,)),
+    "MTA": (("temperature_ambient",), lambda value: (value,)),
+    "GAS": (tuple(name for name, _ in Status._fields),
+            lambda status: tuple(status.to_dict().values())),
+    "GFB": (("failure",), lambda data: (pack_word(data),)),
+}
+
+# Marks the end of the samples of one laser in the queue.
+_DONE = object()
+
+
+def columns(channels) -> list:
+    names = ["time", "port"]
+    for channel in channels:
+        names.extend(CHANNELS[channel][0])
+    return names
+
+
+def poll(url: str, laser, channels, rows: queue.Queue, stop: threading.Event,
+         interval: float = 0.0, count: int = None):
+    """Put one row per sample of *laser* in *rows* until *stop* or *count*"""
+    commands = [channel.encode("Latin1") for channel in channels]
+    extractors = [CHANNELS[channel][1] for channel in channels]
+    samples = 0
+    next_time = time.monotonic()
+    try:
+        while not stop.is_set() and (count is None or samples < count):
+            try:
+                replies = laser.query_many(commands, raw=True)
+                now = time.time()
+                row = [now, url]
+                for command, extract, raw in zip(commands, extractors, replies):
+                    row.extend(extract(parse_reply(command, raw)))
+            except Exception as error:
+                logging.error("%s: %s", url, error)
+                stop.wait(1)
+                continue
+            # Blocks while the writer is behind (backpressure).
+            while not stop.is_set():
+                try:
+                    rows.put(row, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            samples += 1
+            if interval:
+                next_time += interval
+                stop.wait(max(next_time - time.monotonic(), 0))
+    finally:
+        rows.put(_DONE)
+
+
+def write_rows(rows: queue.Queue, names, pollers: int, output, fmt: str):
+    """Write rows until every poller is done; flush when the queue is empty"""
+    if fmt == "csv":
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(names)
+        write = writer.writerow
+    else:
+        def write(row):
+            output.write(json.dumps(dict(zip(names, row))) + "\n")
+    while pollers:
+        try:
+            row = rows.get_nowait()
+        except queue.Empty:
+            output.flush()
+            row = rows.get()
+        if row is _DONE:
+            pollers -= 1
+        else:
+            write(row)
+    output.flush()
+
+
+def monitor(options) -> int:
+    import serial
+    from .core import Omicron_laser
+
+    channels = options.channel or list(CHANNELS)
+    lasers = []
+    try:
+        for url in options.urls:
+            conn = serial.serial_for_url(url, baudrate=options.baudrate,
+                                         timeout=options.timeout)
+            lasers.append((url, Omicron_laser(
+                conn, handshake="lazy", adaptive_timeout=options.adaptive)))
+    except (serial.SerialException, ValueError) as error:
+        logging.error("%s", error)
+        for _, laser in lasers:
+            laser._conn.close()
+        return 1
+
+    rows = queue.Queue(maxsize=options.buffer)
+    stop = threading.Event()
+    threads = [threading.Thread(target=poll, name="monitor " + url, daemon=True,
+                                args=(url, laser, channels, rows, stop,
+                                      options.interval, options.count))
+               for url, laser in lasers]
+    for thread in threads:
+        thread.start()
+    try:
+        write_rows(rows, columns(channels), len(threads), sys.stdout,
+                   options.format)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        stop.set()
+        for _, laser in lasers:
+            laser._conn.close()
+    return 0
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog="omicron-laser",
+                                     description="Omicron laser tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    monitor_parser = commands.add_parser(
+        "monitor", help="stream telemetry as CSV or JSON lines")
+    monitor_parser.add_argument("urls", nargs="+", metavar="url",
+                                help="port URL (ex: /dev/ttyUSB0, "
+                                     "socket://host:port)")
+    monitor_parser.add_argument("-c", "--channel", action="append",
+                                choices=list(CHANNELS),
+                                help="channel to stream (default: all)")
+    monitor_parser.add_argument("-f", "--format", choices=("csv", "json"),
+                                default="csv")
+    monitor_parser.add_argument("--baudrate", type=int, default=500000)
+    monitor_parser.add_argument("--timeout", type=float, default=0.1,
+                                help="read timeout (s)")
+    monitor_parser.add_argument("--adaptive", action="store_true",
+                                help="adapt the timeout of each command")
+    monitor_parser.add_argument("-i", "--interval", type=float, default=0.0,
+                                help="seconds between samples (default: "
+                                     "as fast as possible)")
+    monitor_parser.add_argument("-n", "--count", type=int, default=None,
+                                help="stop after this many samples per laser")
+    monitor_parser.add_argument("--buffer", type=int, default=1000,
+                                help="rows buffered before the lasers wait "
+                                     "for stdout")
+    monitor_parser.set_defaults(func=monitor)
+    return parser.parse_args(args)
+
+
+def main(args=None) -> int:
+    options = parse_args(args)
+    logging.basicConfig(level=logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    return options.func(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
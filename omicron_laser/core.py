@@ -22,275 +22,312 @@ It can receive an asynchronous connection object. Example::
 
     asyncio.run(main())
 """
-from serial import Serial
-import serial
+import collections
+import concurrent.futures
+import json
 import logging
+import queue
+import threading
+import time
 from enum import Enum
 
+from .cache import TTLCache
+from .coalesce import SingleFlight
+from .framing import FrameReader
+from .metrics import CommandMetrics
+from .scheduler import CONTROL, SAFETY, TELEMETRY, PriorityScheduler
+
+
+EOL = b"\r"
+
 
 def bit_enabled(byte: bytes, pos: int) -> bool:
     return int(byte) & (0x01 << pos) != 0
 
 
-class Status:
+def encode_query(command: bytes, value: bytes = b"") -> bytes:
+    return b"?" + command + value + b"|" + EOL
 
-    def __init__(self, bytes) -> None:
-        """
-        This bit indicates whetherany preceded or pending error prevents the 
-        devicefrom starting into normal operation. Only if this bit is unset 
-        the laser/ledwill operate as expected. Please refer to the 
-        “error handling” chapter for details.
-        """
-        self.error = bit_enabled(bytes[0], 0)
 
-        """
-        If the bit is set the laser/led is switched on and the working hours
-        are counting. Note: there are some other dependencies that may prevent
-        the laser/led from emitting light. Please refer to the “Best practices”
-        chapter for details.
-        """
-        self.on = bit_enabled(bytes[0], 1)
+def decode_fields(raw: bytes) -> list:
+    return raw[:-1].decode("Latin1")[4:].split("|")
 
-        """
-        This bit indicates if the device is actually preheating. This is a 
-        temporary state. If the laser/led is already switched on, the 
-        “Laser-ON”/“Led-ON” bit will be signaled beside the “preheating” bit 
-        but the laser/led will not emit light during this situation. Immediately
-        after the diode temperature has reached the valid range the laser/led 
-        will start into operation.
-        """
-        self.preheating = bit_enabled(bytes[0], 2)
 
-        """
-        This bit is signalized if a situation occurred that needs special 
-        attention.LedHUBcontroller:one or more channels are in interlock state.
-        In this situation the functionality of the LedHUB is restricted, but it
-        still may be operated with the remaining wavelengths. QuixX:The bit is
-        set if the laser is in pulse mode and triggered by the external digital
-        input, but the externally applied frequency is far from the given set
-        point. (see QuixX manual for details).
-        For all other devices this bit is reserved
-        """
-        self.attention_required = bit_enabled(bytes[0], 4)
+def decode_bytes(raw: bytes) -> bytes:
+    return raw[4:-1]
 
-        """
-        This bit represents the state of the laser-enable/led-enable input pin 
-        at the control-port.Note: if the laser-enable/led-enable input is not
-        connected it will stay active and the bit is set.LedHUB: the bit is 
-        set if “shutter” on the front panelis set to “open”
-        """
-        self.enabled_pin = bit_enabled(bytes[0], 6)
 
-        """
-        This bit represents the state of the key-switch input pin at the 
-        control-port.
-        """
-        self.key_switch = bit_enabled(bytes[0], 7)
+def is_adhoc(raw: bytes) -> bool:
+    # Some ad-hoc frames (ex: reset completion) come with a leading NUL.
+    return raw.lstrip(b"\x00").startswith(b"$")
 
-        """
-        This bit relies to laserCDRH operation only. If the bit is set,a
-        key-switch toggle is needed to release laser operation.
-        """
-        self.toggle_key = bit_enabled(bytes[1], 0)
 
-        """
-        If the bit is set,the laser/ledsystem is powered-up. This will happen
-        automatically if the laser/led is in auto power-up mode (default state).
-        """
-        self.system_power = bit_enabled(bytes[1], 1)
+def adhoc_command(raw: bytes) -> bytes:
+    return raw.lstrip(b"\x00")[:4]
 
-        """
-        This bit is set, if an external light sensor is connected to the device.
-        (LedHUB controller only)
-        """
-        self.external_sensor_connected = bit_enabled(bytes[1], 5)
 
-    def __repr__(self) -> str:
-        return """{{
-            "error": {},
-            "on": {},
-            "preheating": {},
-            "attention_required": {},
-            "enabled_pin": {},
-            "key_switch": {},
-            "toggle_key": {},
-            "system_power": {},
-            "external_sensor_connected": {}
-        }}""".format(self.error, self.on, self.preheating,
-                     self.attention_required, self.enabled_pin, self.key_switch,
-                     self.toggle_key, self.system_power,
-                     self.external_sensor_connected)
-
-
-class LatchedFailure:
-
-    def __init__(self, bytes) -> None:
-        """
-        This bit indicates that the laser system is in internal error state
-        (safety lockout). This bit is signalized in the “Get Actual Status” 
-        value (bit 0), too. 
-        """
-        self.error_state = bit_enabled(bytes[0], 0)
+def pack_word(data: bytes) -> int:
+    """Pack the two status bytes of a reply into one integer (LSB first)"""
+    return data[0] | data[1] << 8
 
-        """
-        This error bit may be signaled in two situations:
-        - a laser is configured as CDHR compliant but no CDRH-kit is connected 
-          to the laser.
-        - a laser is not configured as CDHR compliant (OEM) but a CDRH-kit is 
-          connected.
-        """
-        self.CDRH = bit_enabled(bytes[0], 4)
 
-        """
-        A controller<->headcommunication error occurred.With PhoxX lasers this
-        mostly indicates that the laserhead is not connected correctly to the
-        controller or the cable is defect.Otherwise this indicates serious 
-        electronic problems.
-        """
-        self.internal_comunication_error = bit_enabled(bytes[0], 5)
+class Flag:
+    """A single bit of a :class:`Flags` word."""
 
-        """
-        An internal error occurred(the K1 relay did not operate).This indicates 
-        serious electronic problems
-        """
-        self.k1_relay_error = bit_enabled(bytes[0], 6)
+    def __init__(self, bit: int, doc: str = None) -> None:
+        self.mask = 0x01 << bit
+        self.__doc__ = doc
 
-        """
-        (Possible with PhoxX lasers only) some diodes of PhoxX lasers need a
-        specially signed “high power controller”.If you own high and low power 
-        PhoxX lasers and do mix up the controllers this bit will indicate that
-        the actual connected low power controller is not suitable to drive the 
-        connected high power laser head.
-        """
-        self.high_power = bit_enabled(bytes[0], 7)
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj.word & self.mask != 0
 
-        """
-        an under voltage or overvoltage occurred.(is still pending ifbit is set 
-        in “Get Failure Byte” command)
-        """
-        self.under_over_voltage = bit_enabled(bytes[1], 0)
+    def __set__(self, obj, value):
+        if value:
+            obj.word |= self.mask
+        else:
+            obj.word &= ~self.mask
 
-        """
-        The external interlock loop was open.(it is still open if this bit is
-        set in “Get Failure Byte” command)Note:if the “Auto Reset” function is 
-        active this will also be signalized in the “Latched Failure”as long the
-        interlock loop is still open, since the device will automatically reset
-        itself after the interlock is closed again.
-        """
-        self.external_interlock = bit_enabled(bytes[1], 1)
 
-        """
-        The diode currentexceeded the maximum allowed value.
-        """
-        self.diode_current = bit_enabled(bytes[1], 2)
+class Flags:
+    """
+    Bitfield backed by a single integer.
 
-        """
-        The ambient temperaturein the laser head exceededthe valid temperature 
-        range. (still exceeds if bit is set in “Get Failure Byte” command)
-        """
-        self.ambient_temp = bit_enabled(bytes[1], 3)
+    Each :class:`Flag` class attribute decodes its bit on access, so building
+    a Flags object costs one integer. Flags compare equal when their words
+    are equal and ``a ^ b`` returns the flags that differ.
+    """
 
-        """
-        The diode temperatureexceededthe valid temperature range.(still exceeds 
-        if bit is set in “Get Failure Byte” command)
-        """
-        self.diode_temp = bit_enabled(bytes[1], 4)
+    __slots__ = ("word",)
 
-        """
-        The test error was triggered.This test error can be triggered by 
-        sending “?TIS” (test interlock state).
-        """
-        self.test_error = bit_enabled(bytes[1], 5)
+    _fields = ()
+    _mask = 0
 
-        """
-        An internal error occurred. This indicates serious electronic problems.
-        """
-        self.internal_error = bit_enabled(bytes[1], 6)
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = tuple(
+            (name, value.mask) for name, value in vars(cls).items()
+            if isinstance(value, Flag))
+        cls._mask = 0
+        for _, mask in cls._fields:
+            cls._mask |= mask
+
+    def __init__(self, bytes=b"\x00\x00") -> None:
+        self.word = pack_word(bytes) & self._mask
+
+    @classmethod
+    def from_int(cls, word: int):
+        flags = cls.__new__(cls)
+        flags.word = word & cls._mask
+        return flags
 
+    @classmethod
+    def decode_array(cls, words) -> dict:
         """
-        The diode power exceeded the maximum allowed value.
+        Decode an array of packed words (see :func:`pack_word`) into one
+        boolean numpy column per flag. Requires numpy.
         """
-        self.diode_power = bit_enabled(bytes[1], 7)
+        import numpy
+        words = numpy.asarray(words)
+        return {name: (words & mask) != 0 for name, mask in cls._fields}
 
-    def __repr__(self) -> str:
-        return """{{
-            "error_state": {},
-            "CDRH_error": {},
-            "internal_communication_error": {},
-            "k1_relay_error": {},
-            "high_power": {},
-            "under_over_voltage": {},
-            "external_interlock": {},
-            "diode_current": {},
-            "ambient_temp": {},
-            "diode_temp": {},
-            "test_error": {},
-            "internal_error": {},
-            "diode_power": {}
-        }}""".format(self.error_state, self.CDRH,
-                     self.internal_comunication_error, self.k1_relay_error,
-                     self.high_power, self.under_over_voltage,
-                     self.external_interlock, self.diode_current,
-                     self.ambient_temp, self.diode_temp, self.test_error,
-                     self.internal_error, self.diode_power)
-
-
-class OperationMode:
-    def __init__(self, bytes) -> None:
-        self.internal_clock_generator = bit_enabled(bytes[0], 2)
-        self.bias_level_release = bit_enabled(bytes[0], 3)
-        self.operating_level_release = bit_enabled(bytes[0], 4)
-        self.digital_input_release = bit_enabled(bytes[0], 5)
-        self.analog_input_release = bit_enabled(bytes[0], 7)
-
-        self.APC_mode = bit_enabled(bytes[1], 0)
-        self.digital_input_impedance = bit_enabled(bytes[1], 3)
-        self.analog_input_impedance = bit_enabled(bytes[1], 4)
-        self.usb_adhoc_mode = bit_enabled(bytes[1], 5)
-        self.auto_startup = bit_enabled(bytes[1], 6)
-        self.auto_powerup = bit_enabled(bytes[1], 7)
+    def __int__(self) -> int:
+        return self.word
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.word == other.word
+
+    __hash__ = None
+
+    def __xor__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.from_int(self.word ^ other.word)
+
+    def __iter__(self):
+        """Names of the flags that are set"""
+        word = self.word
+        return (name for name, mask in self._fields if word & mask)
+
+    def to_dict(self) -> dict:
+        word = self.word
+        return {name: word & mask != 0 for name, mask in self._fields}
 
     def __repr__(self) -> str:
-        return """{{ "hex": "{}", "bin": "{}", 
-            "internal_clock_generator": {},
-            bias_level_release {},
-            "operating_level_release", {},
-            "digital_input_release", {},
-            "analog_input_release", {},
-            "APC_mode", {},
-            "digital_input_impedance", {},
-            "analog_input_impedance", {},
-            "usb_adhoc_mode", {},
-            "auto_startup", {},
-            "auto_powerup", {}
-        }}""".format(hex(int(self)), bin(int(self)),
-                     self.internal_clock_generator,
-                     self.bias_level_release,
-                     self.operating_level_release,
-                     self.digital_input_release,
-                     self.analog_input_release,
-                     self.APC_mode,
-                     self. digital_input_impedance,
-                     self.analog_input_impedance,
-                     self.usb_adhoc_mode,
-                     self.auto_startup,
-                     self.auto_powerup)
+        return json.dumps(self.to_dict(), indent=4)
+
+
+class Status(Flags):
+
+    __slots__ = ()
+
+    error = Flag(0, """
+    This bit indicates whetherany preceded or pending error prevents the 
+    devicefrom starting into normal operation. Only if this bit is unset 
+    the laser/ledwill operate as expected. Please refer to the 
+    “error handling” chapter for details.
+    """)
+
+    on = Flag(1, """
+    If the bit is set the laser/led is switched on and the working hours
+    are counting. Note: there are some other dependencies that may prevent
+    the laser/led from emitting light. Please refer to the “Best practices”
+    chapter for details.
+    """)
+
+    preheating = Flag(2, """
+    This bit indicates if the device is actually preheating. This is a 
+    temporary state. If the laser/led is already switched on, the 
+    “Laser-ON”/“Led-ON” bit will be signaled beside the “preheating” bit 
+    but the laser/led will not emit light during this situation. Immediately
+    after the diode temperature has reached the valid range the laser/led 
+    will start into operation.
+    """)
+
+    attention_required = Flag(4, """
+    This bit is signalized if a situation occurred that needs special 
+    attention.LedHUBcontroller:one or more channels are in interlock state.
+    In this situation the functionality of the LedHUB is restricted, but it
+    still may be operated with the remaining wavelengths. QuixX:The bit is
+    set if the laser is in pulse mode and triggered by the external digital
+    input, but the externally applied frequency is far from the given set
+    point. (see QuixX manual for details).
+    For all other devices this bit is reserved
+    """)
+
+    enabled_pin = Flag(6, """
+    This bit represents the state of the laser-enable/led-enable input pin 
+    at the control-port.Note: if the laser-enable/led-enable input is not
+    connected it will stay active and the bit is set.LedHUB: the bit is 
+    set if “shutter” on the front panelis set to “open”
+    """)
+
+    key_switch = Flag(7, """
+    This bit represents the state of the key-switch input pin at the 
+    control-port.
+    """)
+
+    toggle_key = Flag(8, """
+    This bit relies to laserCDRH operation only. If the bit is set,a
+    key-switch toggle is needed to release laser operation.
+    """)
+
+    system_power = Flag(9, """
+    If the bit is set,the laser/ledsystem is powered-up. This will happen
+    automatically if the laser/led is in auto power-up mode (default state).
+    """)
+
+    external_sensor_connected = Flag(13, """
+    This bit is set, if an external light sensor is connected to the device.
+    (LedHUB controller only)
+    """)
+
+
+class LatchedFailure(Flags):
+
+    __slots__ = ()
+
+    error_state = Flag(0, """
+    This bit indicates that the laser system is in internal error state
+    (safety lockout). This bit is signalized in the “Get Actual Status” 
+    value (bit 0), too.
+    """)
+
+    CDRH = Flag(4, """
+    This error bit may be signaled in two situations:
+    - a laser is configured as CDHR compliant but no CDRH-kit is connected 
+      to the laser.
+    - a laser is not configured as CDHR compliant (OEM) but a CDRH-kit is 
+      connected.
+    """)
+
+    internal_comunication_error = Flag(5, """
+    A controller<->headcommunication error occurred.With PhoxX lasers this
+    mostly indicates that the laserhead is not connected correctly to the
+    controller or the cable is defect.Otherwise this indicates serious 
+    electronic problems.
+    """)
+
+    k1_relay_error = Flag(6, """
+    An internal error occurred(the K1 relay did not operate).This indicates 
+    serious electronic problems
+    """)
+
+    high_power = Flag(7, """
+    (Possible with PhoxX lasers only) some diodes of PhoxX lasers need a
+    specially signed “high power controller”.If you own high and low power 
+    PhoxX lasers and do mix up the controllers this bit will indicate that
+    the actual connected low power controller is not suitable to drive the 
+    connected high power laser head.
+    """)
+
+    under_over_voltage = Flag(8, """
+    an under voltage or overvoltage occurred.(is still pending ifbit is set 
+    in “Get Failure Byte” command)
+    """)
+
+    external_interlock = Flag(9, """
+    The external interlock loop was open.(it is still open if this bit is
+    set in “Get Failure Byte” command)Note:if the “Auto Reset” function is 
+    active this will also be signalized in the “Latched Failure”as long the
+    interlock loop is still open, since the device will automatically reset
+    itself after the interlock is closed again.
+    """)
+
+    diode_current = Flag(10, """
+    The diode currentexceeded the maximum allowed value.
+    """)
+
+    ambient_temp = Flag(11, """
+    The ambient temperaturein the laser head exceededthe valid temperature 
+    range. (still exceeds if bit is set in “Get Failure Byte” command)
+    """)
+
+    diode_temp = Flag(12, """
+    The diode temperatureexceededthe valid temperature range.(still exceeds 
+    if bit is set in “Get Failure Byte” command)
+    """)
+
+    test_error = Flag(13, """
+    The test error was triggered.This test error can be triggered by 
+    sending “?TIS” (test interlock state).
+    """)
+
+    internal_error = Flag(14, """
+    An internal error occurred. This indicates serious electronic problems.
+    """)
+
+    diode_power = Flag(15, """
+    The diode power exceeded the maximum allowed value.
+    """)
+
+
+class OperationMode(Flags):
+
+    __slots__ = ()
+
+    internal_clock_generator = Flag(2)
+    bias_level_release = Flag(3)
+    operating_level_release = Flag(4)
+    digital_input_release = Flag(5)
+    analog_input_release = Flag(7)
+
+    APC_mode = Flag(8)
+    digital_input_impedance = Flag(11)
+    analog_input_impedance = Flag(12)
+    usb_adhoc_mode = Flag(13)
+    auto_startup = Flag(14)
+    auto_powerup = Flag(15)
 
-    def __int__(self) -> int:
-        return self.internal_clock_generator << 2 | \
-            self.bias_level_release << 3 | \
-            self.operating_level_release << 4 | \
-            self.digital_input_release << 5 | \
-            self.analog_input_release << 7 | \
-            self.APC_mode << 8 | \
-            self.digital_input_impedance << 10 | \
-            self.analog_input_impedance << 12 | \
-            self.usb_adhoc_mode << 13 | \
-            self.auto_startup << 14 | \
-            self.auto_powerup << 15
+    def __repr__(self) -> str:
+        return json.dumps(dict(hex=hex(self.word), bin=bin(self.word),
+                               **self.to_dict()), indent=4)
 
     def __bytes__(self) -> bytes:
-        return hex(self.__int__())[2:].encode("Latin1")
+        return hex(self.word)[2:].encode("Latin1")
 
 
 class CalibrationResult(Enum):
@@ -311,48 +348,419 @@ class CalibrationResult(Enum):
     UNKNOWN_ERROR = 14
 
 
+class Operation(concurrent.futures.Future):
+    """
+    Future of a long laser operation (reset, calibration).
+
+    Unlike a plain Future, :meth:`cancel` also works while the operation
+    runs: the client stops waiting for the laser and the operation fails
+    with CancelledError (the laser itself carries on).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.aborted = threading.Event()
+
+    def cancel(self) -> bool:
+        """
+        Return False if the operation already finished, else True: a
+        pending operation is cancelled, a running one aborted.
+        """
+        if self.done():
+            return False
+        self.aborted.set()
+        super().cancel()
+        return True
+
+
+class Settings(collections.namedtuple(
+        "Settings", "serial_number model_code firmware_version wavelength "
+                    "level_power temporary_power operation_mode auto_reset")):
+    """
+    Laser configuration captured by :meth:`Omicron_laser.snapshot`.
+    *operation_mode* is the packed word (auto power-up and start-up
+    included, see :class:`OperationMode`).
+    """
+
+    __slots__ = ()
+
+
+def _first_field(raw: bytes) -> str:
+    return decode_fields(raw)[0]
+
+
+def _field_end(raw) -> int:
+    end = raw.find(b"|", 4)
+    return len(raw) - 1 if end < 0 else end
+
+
+def decode_float(raw: bytes) -> float:
+    # float() parses the bytes directly: no decode or split.
+    try:
+        return float(raw[4:_field_end(raw)])
+    except ValueError:
+        raise ValueError("Invalid reply {!r}".format(bytes(raw))) from None
+
+
+def _hex_field(raw: bytes) -> int:
+    try:
+        return int(raw[4:_field_end(raw)], 16)
+    except ValueError:
+        raise ValueError("Invalid reply {!r}".format(bytes(raw))) from None
+
+
+# Typed decoding of the reply to each query, keyed by command.
+REPLY_PARSERS = {
+    b"GFw": decode_fields,
+    b"GSN": _first_field,
+    b"GSI": decode_fields,
+    b"GMP": decode_float,
+    b"GWH": _first_field,
+    b"MDP": decode_float,
+    b"MTD": decode_float,
+    b"MTA": decode_float,
+    b"GAS": lambda raw: Status(decode_bytes(raw)),
+    b"GFB": decode_bytes,
+    b"GLF": lambda raw: LatchedFailure(decode_bytes(raw)),
+    b"GLP": _hex_field,
+    b"TPP": _first_field,
+    b"GOM": lambda raw: OperationMode(decode_bytes(raw)),
+}
+
+
+def parse_reply(command: bytes, raw: bytes):
+    """Decode a raw reply frame for the given query command.
+
+    Commands without a registered parser return the list of reply fields.
+    """
+    return REPLY_PARSERS.get(command, decode_fields)(raw)
+
+
+# Cached queries made stale by each setter.
+INVALIDATES = {
+    b"SLP": (b"GLP",),
+    b"TPP": (b"TPP",),
+    b"SOM": (b"GOM",),
+    b"SAP": (b"GOM",),
+    b"SAS": (b"GOM",),
+}
+
+# Reasonable TTLs (seconds) for Omicron_laser(conn, cache_ttl=...).
+DEFAULT_CACHE_TTL = {
+    b"GFw": float("inf"),
+    b"GSN": float("inf"),
+    b"GSI": float("inf"),
+    b"GMP": float("inf"),
+    b"GWH": 60.0,
+    b"GOM": 10.0,
+    b"GLP": 10.0,
+}
+
+
+# Scheduling class of the commands that are not plain telemetry queries.
+# Setters default to CONTROL (see _set): TPP, which is also the temporary
+# power query, must stay out of this table.
+PRIORITIES = {
+    b"LOf": SAFETY,
+    b"POf": SAFETY,
+    b"LOn": CONTROL,
+    b"POn": CONTROL,
+    b"SLP": CONTROL,
+    b"SOM": CONTROL,
+    b"SAP": CONTROL,
+    b"SAS": CONTROL,
+    b"ARs": CONTROL,
+    b"RsC": CONTROL,
+    b"CLD": CONTROL,
+}
+
+
+# Setters of single OperationMode flags, used instead of SOM when only
+# these flags change.
+FLAG_SETTERS = (("auto_powerup", b"SAP"), ("auto_startup", b"SAS"))
+
+
+# Polling period (s) of long operations waiting on the dispatcher.
+WAIT_STEP = 0.1
+
+IDENTITY_QUERIES = (b"GFw", b"GSN", b"GSI", b"GMP")
+
+SETTINGS_QUERIES = (b"GFw", b"GSN", b"GSI", b"GLP", b"TPP", b"GOM")
+
+IDENTITY_FIELDS = ("model_code", "device_id", "firmware_version",
+                   "serial_number", "wavelength", "power", "max_power")
+
+
 class Omicron_laser:
     """The central Omicron_laser"""
 
+    def _readline(self) -> bytes:
+        if self._dispatcher is not None:
+            return self._dispatcher.readline(
+                self._reply_timeout or getattr(self._conn, "timeout", None))
+        return self._reader.read_until(EOL)
+
+    def _reply(self, command: bytes = None) -> bytes:
+        raw = self._readline()
+        while is_adhoc(raw) or self._is_stale(command, raw):
+            if is_adhoc(raw):
+                self._handle_adhoc(raw)
+            raw = self._readline()
+        return raw
+
+    def _is_stale(self, command: bytes, raw: bytes) -> bool:
+        # With adaptive timeouts a reply can arrive after its request gave
+        # up: drop it instead of taking it for the reply to *command*.
+        if self._timeouts is None or command is None or raw[1:4] == command \
+                or raw[1:3] == b"UK" or not raw.endswith(EOL):
+            return False
+        logging.info("Dropping late reply {!r}".format(raw))
+        return True
+
+    def _use_timeout(self, command: bytes):
+        """Read the reply to *command* with its adaptive timeout"""
+        if self._timeouts is None:
+            return
+        timeout = self._timeouts.get(command)
+        if self._dispatcher is not None:
+            self._reply_timeout = timeout
+        elif self._conn.timeout != timeout:
+            self._conn.timeout = timeout
+
+    def _transaction(self, frame: bytes, priority: int = TELEMETRY) -> bytes:
+        command = frame[1:4]
+        with self._scheduler.slot(priority):
+            start = self.metrics.request(command, frame)
+            self._conn.write(frame)
+            self._use_timeout(command)
+            raw = self._reply(command)
+            self.metrics.response(command, raw, start)
+            return raw
+
+    def _fetch(self, question: bytes) -> bytes:
+        cache = self._cache
+        raw = cache.get(question) if cache else None
+        if raw is None:
+            version = cache.version() if cache else None
+            raw = self._transaction(encode_query(question),
+                                    PRIORITIES.get(question, TELEMETRY))
+            if cache:
+                cache.put(question, raw, version)
+        return raw
+
+    def _query(self, question: bytes) -> bytes:
+        if question in REPLY_PARSERS:
+            # Concurrent identical queries share a single transaction.
+            return self._flights.do(question, lambda: self._fetch(question))
+        return self._fetch(question)
+
     def _ask(self, question: bytes) -> str:
-        self._conn.write(b"?" + question + b"|\r")
-        raw = self._conn.read_until(b'\r')
-        return raw[:-1].decode("Latin1")[4:].split("|")
+        return decode_fields(self._query(question))
 
     def _ask_bytes(self, question: bytes) -> bytes:
-        self._conn.write(b"?" + question + b"|\r")
-        return self._conn.read_until(b'\r')[4:-1]
+        return decode_bytes(self._query(question))
 
     def _set(self, what: bytes, value: bytes) -> str:
-        self._conn.write(b"?" + what + value + b"|\r")
-        return self._conn.read_until(b'\r')[:-1].decode("Latin1")[4:].split("|")
+        with self._scheduler.slot(PRIORITIES.get(what, CONTROL)):
+            invalidated = INVALIDATES.get(what, ())
+            if self._cache:
+                self._cache.invalidate(*invalidated)
+            if b"GOM" in invalidated:
+                self._known_mode = None
+            frame = encode_query(what, value)
+            start = self.metrics.request(what, frame)
+            self._conn.write(frame)
+            self._use_timeout(what)
+            raw = self._reply(what)
+            self.metrics.response(what, raw, start)
+            return decode_fields(raw)
+
+    def _handle_adhoc(self, raw: bytes):
+        command = adhoc_command(raw)
+        if command in (b"$RsC", b"$CLD"):
+            # Completion of a long operation, read while a safety command
+            # had the link (see _wait_adhoc).
+            self._completed[command] = raw
+            return
+        decoded = raw[:-1].decode("Latin1")
+        command = decoded[:4]
+        content = decoded[4:].split("|")
+        if command.startswith("$TPP"):
+            self.temporal_power = float(content[0])
 
     def _process_adhoc(self):
-        raw = self._conn.read_until(b'\r')
-        while raw != b'':
-            decoded = raw[:-1].decode("Latin1")
-            command = decoded[:4]
-            content = decoded[4:].split("|")
-            if command.startswith("$TPP"):
-                self.temporal_power = float(content[0])
-
-            raw = self._conn.read_until(b'\r')
+        if self._dispatcher is not None:
+            # The dispatcher already routes ad-hoc messages as they arrive.
+            return
+        with self._scheduler.slot(CONTROL):
+            raw = self._reader.read_until(EOL)
+            while raw != b'':
+                self._handle_adhoc(raw)
+                raw = self._reader.read_until(EOL)
+
+    def start_dispatcher(self):
+        """
+        Start a background thread owning the read side of the connection.
 
-    def __init__(self, conn: Serial):
+        Replies are routed to the waiting request and ad-hoc messages to the
+        callbacks registered with :meth:`add_adhoc_callback`, so setpoint
+        writes no longer pay a read timeout draining the port.
+        """
+        if self._dispatcher is None:
+            from .dispatcher import Dispatcher
+            self._dispatcher = Dispatcher(self._reader)
+            self._dispatcher.add_callback(self._handle_adhoc)
+            self._dispatcher.start()
+        return self._dispatcher
+
+    def stop_dispatcher(self):
+        if self._dispatcher is not None:
+            self._dispatcher.stop()
+            self._dispatcher = None
+
+    def add_adhoc_callback(self, callback):
+        """Call *callback(raw: bytes)* for every ad-hoc ($) message"""
+        self.start_dispatcher().add_callback(callback)
+
+    def _expect_adhoc(self, command: bytes):
+        if self._dispatcher is not None:
+            return self._dispatcher.expect(command)
+
+    def query_many(self, commands, raw: bool = False) -> list:
+        """Send several queries in a single write and return their replies.
+
+        The frames are pipelined so the whole batch costs about one serial
+        round trip. Replies are decoded with :func:`parse_reply`, in the
+        order of *commands*, unless *raw* is set, in which case the reply
+        frames are returned untouched. Ad-hoc messages interleaved with the
+        replies are processed and skipped. Queries with a valid cached reply
+        are not sent.
+        """
+        commands = list(commands)
+        cache = self._cache
+        replies = [cache.get(command) if cache else None for command in commands]
+        missing = [command for command, reply in zip(commands, replies)
+                   if reply is None]
+        if missing:
+            version = cache.version() if cache else None
+            priority = min(PRIORITIES.get(command, TELEMETRY)
+                           for command in missing)
+            with self._scheduler.slot(priority):
+                fetched = iter(self._pipeline(
+                    [(command, b"") for command in missing]))
+            for index, command in enumerate(commands):
+                if replies[index] is None:
+                    replies[index] = next(fetched)
+                    if cache:
+                        cache.put(command, replies[index], version)
+        if raw:
+            return replies
+        return [parse_reply(command, reply)
+                for command, reply in zip(commands, replies)]
+
+    def __init__(self, conn: "serial.Serial", dispatcher: bool = False,
+                 cache_ttl: dict = None, handshake: str = "eager",
+                 identity_cache: str = None, adaptive_timeout=False):
+        """
+        *handshake* selects how the identity values (model_code,
+        serial_number, wavelength, ...) are read: ``"eager"`` one query at a
+        time, ``"pipelined"`` all queries in a single write, or ``"lazy"``
+        (pipelined) on first access to any of them.
+
+        *identity_cache* is an optional JSON file path where the identity of
+        each (port, serial number) is stored so later handshakes only need
+        to read the serial number.
+
+        *adaptive_timeout* (True or an
+        :class:`~omicron_laser.tuning.AdaptiveTimeouts`) gives each command
+        a read timeout learnt from its measured latency instead of the
+        single timeout of the connection.
+        """
+        if handshake not in ("eager", "pipelined", "lazy"):
+            raise ValueError("Unknown handshake mode {!r}".format(handshake))
         self._conn = conn
+        # Ports that report in_waiting are read in bulk (see FrameReader).
+        self._reader = FrameReader(conn, EOL) \
+            if hasattr(type(conn), "in_waiting") else conn
+        self._scheduler = PriorityScheduler()
+        self._completed = {}
+        self._flights = SingleFlight()
+        self.metrics = CommandMetrics()
+        self._timeouts = None
+        self._reply_timeout = None
+        # Configuration as last read from (or verified on) the laser.
+        self._known_mode = None
+        self._auto_reset = None
+        if adaptive_timeout:
+            from .tuning import AdaptiveTimeouts
+            self._timeouts = adaptive_timeout \
+                if isinstance(adaptive_timeout, AdaptiveTimeouts) \
+                else AdaptiveTimeouts()
+            self.metrics.on_response.append(self._timeouts.observe)
+        self._dispatcher = None
+        self._cache = TTLCache(cache_ttl) if cache_ttl else None
+        self._identity_cache = None
+        if identity_cache is not None:
+            from .identity import IdentityCache
+            self._identity_cache = IdentityCache(identity_cache)
+        self._lazy_identity = handshake == "lazy"
+        self.temporal_power = None
+        if dispatcher:
+            self.start_dispatcher()
+
+        if not self._lazy_identity:
+            self.read_identity(pipelined=handshake == "pipelined")
+
+    def __getattr__(self, name):
+        # Only called for missing attributes: fetch a lazy identity once.
+        if name in IDENTITY_FIELDS and self.__dict__.get("_lazy_identity"):
+            # Clears the flag only once read: a failed read is retried.
+            self.read_identity()
+            return getattr(self, name)
+        raise AttributeError(
+            "{!r} object has no attribute {!r}".format(type(self).__name__, name))
+
+    def _port_name(self) -> str:
+        return str(getattr(self._conn, "port", None) or
+                   getattr(self._conn, "name", ""))
+
+    def read_identity(self, pipelined: bool = True):
+        """Read (or load from the identity cache) the laser identity values"""
+        cache = self._identity_cache
+        values = {}
+        if cache is not None:
+            values[b"GSN"] = self._ask(b"GSN")
+            identity = cache.get(self._port_name(), values[b"GSN"][0])
+            if identity is not None:
+                self.__dict__.update(identity)
+                self._lazy_identity = False
+                return
+
+        # The serial number read to key the cache is not asked again.
+        queries = [query for query in IDENTITY_QUERIES if query not in values]
+        if pipelined:
+            replies = self.query_many(queries, raw=True)
+            values.update(zip(queries, map(decode_fields, replies)))
+        else:
+            values.update(zip(queries, map(self._ask, queries)))
+        firmware, serial, specs, max_power = (values[query]
+                                              for query in IDENTITY_QUERIES)
 
-        firmware = self._ask(b"GFw")
         self.model_code = firmware[0]
         self.device_id = firmware[1]
         self.firmware_version = firmware[2]
 
-        self.serial_number = self._ask(b"GSN")[0]
+        self.serial_number = serial[0]
 
-        specs = self._ask(b"GSI")
         self.wavelength = specs[0]
         self.power = specs[1]
 
-        self.max_power = self._ask(b"GMP")
+        self.max_power = max_power
+        self._lazy_identity = False
+
+        if cache is not None:
+            cache.put(self._port_name(), self.serial_number,
+                      {name: getattr(self, name) for name in IDENTITY_FIELDS})
 
     def get_working_hours(self):
         return self._ask(b"GWH")[0]
@@ -361,13 +769,13 @@ class Omicron_laser:
         return float(self._ask(b"GMP")[0])
 
     def measure_diode_power(self) -> float:
-        return float(self._ask(b"MDP")[0])
+        return decode_float(self._query(b"MDP"))
 
     def measure_temperature_diode(self) -> float:
-        return float(self._ask(b"MTD")[0])
+        return decode_float(self._query(b"MTD"))
 
     def measure_temperature_ambient(self) -> float:
-        return float(self._ask(b"MTA")[0])
+        return decode_float(self._query(b"MTA"))
 
     def get_status(self) -> Status:
         self.status = Status(self._ask_bytes(b"GAS"))
@@ -381,17 +789,18 @@ class Omicron_laser:
         return self.latched_failure
 
     def get_level_power(self):
-        response = self._ask(b"GLP")[0]
-        return int(response, 16)
+        return _hex_field(self._query(b"GLP"))
 
     def set_level_power(self, value: int) -> bool:
-        response = self._set(b"SLP", hex(value)[2:].encode("Latin1"))
-        self._process_adhoc()
+        with self._scheduler.slot(CONTROL):
+            response = self._set(b"SLP", hex(value)[2:].encode("Latin1"))[0]
+            self._process_adhoc()
         return response == ">"
 
     def set_temporary_power(self, percentage: float):
-        response = self._set(b"TPP", str(percentage).encode("Latin1"))
-        self._process_adhoc()
+        with self._scheduler.slot(CONTROL):
+            response = self._set(b"TPP", str(percentage).encode("Latin1"))[0]
+            self._process_adhoc()
         return response == ">"
 
     def get_temporary_power(self):
@@ -399,13 +808,191 @@ class Omicron_laser:
 
     def get_operation_mode(self) -> OperationMode:
         self.operation_mode = OperationMode(self._ask_bytes(b"GOM"))
+        self._known_mode = OperationMode.from_int(self.operation_mode.word)
         return self.operation_mode
 
+    def _read_mode(self) -> OperationMode:
+        """
+        Read GOM now, bypassing the cache and query coalescing, which could
+        wait on a request queued behind the caller (that holds the link).
+        """
+        raw = self._transaction(encode_query(b"GOM"), CONTROL)
+        self.operation_mode = OperationMode(decode_bytes(raw))
+        self._known_mode = OperationMode.from_int(self.operation_mode.word)
+        return self._known_mode
+
+    def cache_info(self) -> dict:
+        """Hit/miss counters of the reply cache (empty if disabled)"""
+        return self._cache.info() if self._cache else {}
+
     def update_operation_mode(self):
-        mode = bytes(self.operation_mode)
-        print("Mode: ", mode)
-        response = self._set(b"SOM", mode)[0]
-        return response == '>'
+        """Write the (edited) operation_mode attribute; see :meth:`configure`"""
+        return self.configure(self.operation_mode)
+
+    def configure(self, mode: OperationMode = None, auto_reset: bool = None,
+                  **flags) -> bool:
+        """
+        Change the operation mode and startup flags in one transaction.
+
+        The target is *mode* (or the current mode) with the given
+        OperationMode *flags* (ex: ``auto_startup=True``) applied. Only the
+        commands needed to go from the last known configuration to the
+        target are sent (SAP/SAS when just those flags change, else one
+        SOM; ARs only if *auto_reset* changes), pipelined with a ``GOM``
+        read back. Returns True if every command was accepted and the read
+        back mode matches the target.
+        """
+        unknown = set(flags).difference(name for name, _ in OperationMode._fields)
+        if unknown:
+            raise ValueError("Unknown operation mode flags: {}".format(
+                ", ".join(sorted(unknown))))
+
+        with self._scheduler.slot(CONTROL):
+            current, fresh = self._known_mode, False
+            while True:
+                if current is None:
+                    current, fresh = self._read_mode(), True
+                target = OperationMode.from_int((mode or current).word)
+                for name, value in flags.items():
+                    setattr(target, name, value)
+                commands = self._mode_commands(current, target, auto_reset)
+                if commands or fresh:
+                    break
+                # The last known mode may be stale (front panel, another
+                # client): check it before saying there is nothing to do.
+                current = None
+            if not commands:
+                return True
+
+            commands.append((b"GOM", b""))
+            replies = self._pipeline(commands)
+            version = self._cache.version() if self._cache else None
+
+        accepted = all(decode_fields(raw)[0] == ">" for raw in replies[:-1])
+        self.operation_mode = OperationMode(decode_bytes(replies[-1]))
+        self._known_mode = OperationMode.from_int(self.operation_mode.word)
+        if self._cache:
+            self._cache.put(b"GOM", replies[-1], version)
+        if accepted and auto_reset is not None:
+            self._auto_reset = auto_reset
+        return accepted and self.operation_mode == target
+
+    def _mode_commands(self, current: OperationMode, target: OperationMode,
+                       auto_reset: bool = None) -> list:
+        """(command, value) requests to go from *current* to *target*"""
+        commands = []
+        changed = (target ^ current).word
+        flag_masks = 0
+        for name, _ in FLAG_SETTERS:
+            flag_masks |= getattr(OperationMode, name).mask
+        if changed & ~flag_masks:
+            commands.append((b"SOM", bytes(target)))
+        else:
+            for name, command in FLAG_SETTERS:
+                if changed & getattr(OperationMode, name).mask:
+                    commands.append(
+                        (command, b"1" if getattr(target, name) else b"0"))
+        if auto_reset is not None and auto_reset != self._auto_reset:
+            commands.append((b"ARs", b"1" if auto_reset else b"0"))
+        return commands
+
+    def snapshot(self) -> "Settings":
+        """
+        Read the laser settings and identity in one pipelined exchange.
+
+        The returned :class:`Settings` can be stored (it is a namedtuple of
+        plain values: ``Settings(**json.loads(json.dumps(s._asdict())))``
+        round trips) and given to :meth:`restore`. ``auto_reset`` cannot be
+        read from the laser: it is the last value set through this object,
+        or None.
+        """
+        if self._cache:
+            self._cache.invalidate(*SETTINGS_QUERIES)
+        replies = self.query_many(SETTINGS_QUERIES, raw=True)
+        firmware, serial, specs, level, temporary, mode = replies
+        firmware, specs = decode_fields(firmware), decode_fields(specs)
+        mode = OperationMode(decode_bytes(mode))
+        self.operation_mode = mode
+        self._known_mode = OperationMode.from_int(mode.word)
+        return Settings(
+            serial_number=_first_field(serial),
+            model_code=firmware[0],
+            firmware_version=firmware[2],
+            wavelength=specs[0],
+            level_power=_hex_field(level),
+            temporary_power=decode_float(temporary),
+            operation_mode=mode.word,
+            auto_reset=self._auto_reset,
+        )
+
+    def restore(self, settings: "Settings", strict: bool = False) -> bool:
+        """
+        Bring the laser back to a :meth:`snapshot`.
+
+        The live settings are read in one pipelined exchange and only those
+        that differ are sent, in a second one that also reads them back.
+        Returns True if the laser ends up as in *settings*. A snapshot of
+        another laser (serial number) is logged, or refused with ValueError
+        if *strict*.
+        """
+        with self._scheduler.slot(CONTROL):
+            live = self.snapshot()
+            if live.serial_number != settings.serial_number:
+                message = "Restoring settings of laser {} on laser {}".format(
+                    settings.serial_number, live.serial_number)
+                if strict:
+                    raise ValueError(message)
+                logging.warning(message)
+
+            commands = []
+            if live.level_power != settings.level_power:
+                commands.append(
+                    (b"SLP", hex(settings.level_power)[2:].encode("Latin1")))
+            # Setting the level power also resets the temporary power.
+            if commands or live.temporary_power != settings.temporary_power:
+                commands.append(
+                    (b"TPP", str(settings.temporary_power).encode("Latin1")))
+            target = OperationMode.from_int(settings.operation_mode)
+            commands.extend(self._mode_commands(
+                OperationMode.from_int(live.operation_mode), target,
+                settings.auto_reset))
+            if not commands:
+                return True
+
+            commands.extend((command, b"") for command in (b"GLP", b"TPP", b"GOM"))
+            replies = self._pipeline(commands)
+            version = self._cache.version() if self._cache else None
+
+        accepted = all(decode_fields(raw)[0] == ">" for raw in replies[:-3])
+        level, temporary, mode = replies[-3:]
+        self.operation_mode = OperationMode(decode_bytes(mode))
+        self._known_mode = OperationMode.from_int(self.operation_mode.word)
+        if accepted and settings.auto_reset is not None:
+            self._auto_reset = settings.auto_reset
+        return accepted and _hex_field(level) == settings.level_power and \
+            decode_float(temporary) == settings.temporary_power and \
+            self.operation_mode == target
+
+    def _pipeline(self, commands) -> list:
+        """
+        Send (command, value) requests in one write and return the raw
+        replies. The caller must hold the link.
+        """
+        metrics = self.metrics
+        if self._cache:
+            for command, value in commands:
+                if value:
+                    self._cache.invalidate(*INVALIDATES.get(command, ()))
+        frame = b"".join(encode_query(command, value)
+                         for command, value in commands)
+        starts = [metrics.request(command, frame) for command, _ in commands]
+        self._conn.write(frame)
+        replies = []
+        for (command, _), start in zip(commands, starts):
+            self._use_timeout(command)
+            replies.append(self._reply(command))
+            metrics.response(command, replies[-1], start)
+        return replies
 
     def set_auto_powerup(self, value: bool) -> bool:
         response = self._set(b"SAP", str(int(value)).encode("Latin1"))[0]
@@ -431,21 +1018,101 @@ class Omicron_laser:
         response = self._ask(b"LOf")[0]
         return response == ">"
 
-    def reset(self) -> bool:
-        self._conn.write(b"?RsC\r")
-        response = self._conn.read_until(b'\r')
-        recv = response == b"!RsC\r"
-        logging.info("Reset command received. Laser reponse: {}".format(recv))
+    def _wait_adhoc(self, command: bytes, done=None, progress=None,
+                    deadline: float = None, aborted=None) -> bytes:
+        """
+        Wait for the ad-hoc frame ending a long operation.
 
-        if recv:
-            response = self._conn.read_until(b'\r')
-            while response != b'\x00$RsC>\r':
-                response += self._conn.read_until(b'\r')
-                logging.info(
-                    "Reset in course, Laser response: {}".format(response))
-            return True
+        *done* is the dispatcher waiter, if any. Otherwise the port is read
+        here and queued safety commands are let through between reads.
+        *progress(elapsed, raw)* is called after every read (*raw* is empty
+        when nothing came). Raises TimeoutError past *deadline* and
+        CancelledError once the *aborted* event is set.
+        """
+        start = time.monotonic()
+        while True:
+            if aborted is not None and aborted.is_set():
+                raise concurrent.futures.CancelledError(
+                    "{} aborted".format(command[1:].decode()))
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(
+                    "{} did not complete in time".format(command[1:].decode()))
+
+            raw = self._completed.pop(command, None)
+            if raw is not None:
+                return raw
+            if done is not None:
+                try:
+                    raw = done.get(timeout=WAIT_STEP)
+                except queue.Empty:
+                    raw = b""
+                else:
+                    if isinstance(raw, ConnectionError):
+                        # The dispatcher lost the port.
+                        raise raw
+                    return raw
+            else:
+                self._scheduler.yield_to(SAFETY, CONTROL)
+                raw = self._reader.read_until(EOL)
+                if is_adhoc(raw):
+                    self._handle_adhoc(raw)
+                elif raw:
+                    logging.info("{} in course, laser response: {}".format(
+                        command[1:].decode(), raw))
+            if progress is not None:
+                progress(time.monotonic() - start, raw)
+
+    def _start_operation(self, func, timeout: float, progress) -> "Operation":
+        operation = Operation()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def run():
+            if not operation.set_running_or_notify_cancel():
+                return
+            try:
+                operation.set_result(func(deadline, progress, operation.aborted))
+            except BaseException as error:
+                operation.set_exception(error)
+
+        threading.Thread(target=run, name="Omicron" + func.__name__,
+                         daemon=True).start()
+        return operation
+
+    def _reset(self, deadline=None, progress=None, aborted=None) -> bool:
+        with self._scheduler.slot(CONTROL):
+            if self._cache:
+                self._cache.clear()
+            self._known_mode = self._auto_reset = None
+            self._completed.pop(b"$RsC", None)
+            done = self._expect_adhoc(b"$RsC")
+            start = self.metrics.request(b"RsC", b"?RsC\r")
+            self._conn.write(b"?RsC\r")
+            self._use_timeout(b"RsC")
+            response = self._reply(b"RsC")
+            self.metrics.response(b"RsC", response, start)
+            recv = response == b"!RsC\r"
+            logging.info("Reset command received. Laser reponse: {}".format(recv))
+
+            if recv and done is None:
+                self._wait_adhoc(b"$RsC", None, progress, deadline, aborted)
+
+        if recv and done is not None:
+            # The dispatcher reads the port: leave the link free meanwhile.
+            self._wait_adhoc(b"$RsC", done, progress, deadline, aborted)
+        return recv
+
+    def reset(self, timeout: float = None, progress=None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return self._reset(deadline, progress)
+
+    def reset_async(self, timeout: float = None, progress=None) -> "Operation":
+        """
+        Start a reset in the background and return its :class:`Operation`.
 
-        return False
+        *progress(elapsed, raw)* is called while waiting for completion.
+        The operation fails with TimeoutError after *timeout* seconds.
+        """
+        return self._start_operation(self._reset, timeout, progress)
 
     def set_auto_reset(self, value) -> bool:
         """
@@ -453,28 +1120,58 @@ class Omicron_laser:
         CDRH mode.
         """
         response = self._set(b"ARs", str(int(value)).encode("Latin1"))[0]
+        self._auto_reset = bool(value) if response == ">" else None
         return response == ">"
 
-    def calibrate_laser_diode(self) -> CalibrationResult:
-        response = self._set(b"CLD", b'')[0]
-        if response == ">":
+    def _calibrate(self, deadline=None, progress=None,
+                   aborted=None) -> CalibrationResult:
+        with self._scheduler.slot(CONTROL):
+            self._completed.pop(b"$CLD", None)
+            done = self._expect_adhoc(b"$CLD")
+            response = self._set(b"CLD", b'')[0]
+            if response != ">":
+                return CalibrationResult.UNKNOWN_ERROR
+
             logging.info("Laser calibration initiated")
-            response = self._conn.read_until(b'\r')
-            logging.info("Laser GCI: {}".format(response))
+            logging.info("Laser GCI: {}".format(self._reply(b"GCI")))
+            if done is None:
+                response = self._wait_adhoc(
+                    b"$CLD", None, progress, deadline, aborted)
+
+        if done is not None:
+            response = self._wait_adhoc(b"$CLD", done, progress, deadline, aborted)
+        return CalibrationResult(int(response.lstrip(b"\x00")[4:-1]))
+
+    def calibrate_laser_diode(self, timeout: float = None,
+                              progress=None) -> CalibrationResult:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return self._calibrate(deadline, progress)
+
+    def calibrate_async(self, timeout: float = None, progress=None) -> "Operation":
+        """
+        Start a laser diode calibration in the background.
+
+        Returns an :class:`Operation` resolving to the CalibrationResult
+        delivered with ``$CLD``. See :meth:`reset_async` for the arguments.
+        """
+        return self._start_operation(self._calibrate, timeout, progress)
 
-            response = self._conn.read_until(b'\r')
-            while b"$CLD" not in response:
-                response += self._conn.read_until(b'\r')
-                print(response)
-                logging.info("Laser calibration in course.")
+    def command_metrics(self) -> dict:
+        """Count, outcomes and latency histogram of each command sent"""
+        return self.metrics.snapshot()
 
-            return CalibrationResult(int(response[4:-1]))
+    def timeout_info(self) -> dict:
+        """Adaptive timeout of each command (empty if disabled)"""
+        return self._timeouts.info() if self._timeouts else {}
 
-        return CalibrationResult.UNKNOWN_ERROR
+    def scheduler_metrics(self) -> dict:
+        """Queue depth and wait times of each command priority class"""
+        return self._scheduler.metrics()
 
 
 if __name__ == "__main__":
     from time import sleep
+    import serial
     logging.basicConfig(level=logging.INFO)
 
     s = serial.serial_for_url("COM4")
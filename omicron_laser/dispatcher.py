@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Background reader for Omicron_laser.
+
+The laser interleaves unsolicited ad-hoc messages (``$TPP``, ``$RsC``,
+``$CLD``, ...) with the replies to our queries. Without a dispatcher the
+client has to drain the port after every setpoint, paying a full serial
+timeout each time. The :class:`Dispatcher` owns the read side of the
+connection instead: replies (``!``) are queued for the waiting request and
+ad-hoc frames are handed to the registered callbacks.
+
+The connection must have a read timeout so the thread can notice when it is
+asked to stop. The thread also stops when the port fails (closed,
+unplugged): pending and later requests then raise ConnectionError.
+"""
+
+import logging
+import queue
+import threading
+
+from .core import EOL, adhoc_command, is_adhoc
+
+
+# Pause (s) after an unexpected read error before reading again.
+ERROR_BACKOFF = 1.0
+
+
+class Dispatcher(threading.Thread):
+
+    def __init__(self, conn):
+        super().__init__(name="OmicronDispatcher", daemon=True)
+        self._conn = conn
+        self._replies = queue.Queue()
+        self._callbacks = []
+        self._waiters = {}
+        self._waiters_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.error = None
+
+    def add_callback(self, callback):
+        """Register *callback(raw: bytes)* to be called for every ad-hoc frame"""
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    def expect(self, command: bytes) -> queue.Queue:
+        """
+        Return a queue that receives the next ad-hoc frame for *command*
+        (ex: ``b"$CLD"``). Call it before sending the request that triggers
+        the frame so it cannot be missed.
+        """
+        waiter = queue.Queue(maxsize=1)
+        with self._waiters_lock:
+            if self.error is not None:
+                waiter.put(self.error)
+            else:
+                self._waiters.setdefault(command, []).append(waiter)
+        return waiter
+
+    def readline(self, timeout=None) -> bytes:
+        """
+        Next reply frame, or ``b''`` on timeout (like ``read_until``).
+        Raises ConnectionError once the port has failed.
+        """
+        try:
+            raw = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            return b""
+        if isinstance(raw, ConnectionError):
+            # Leave it for the next reader too.
+            self._replies.put(raw)
+            raise raw
+        return raw
+
+    def _fail(self, error: Exception):
+        failure = ConnectionError("Omicron dispatcher stopped: {}".format(error))
+        failure.__cause__ = error
+        with self._waiters_lock:
+            self.error = failure
+            waiters, self._waiters = self._waiters, {}
+        self._replies.put(failure)
+        for waiter in (waiter for group in waiters.values() for waiter in group):
+            waiter.put(failure)
+
+    def _dispatch_adhoc(self, raw: bytes):
+        command = adhoc_command(raw)
+        with self._waiters_lock:
+            waiters = self._waiters.pop(command, ())
+        for waiter in waiters:
+            waiter.put(raw)
+        for callback in list(self._callbacks):
+            try:
+                callback(raw)
+            except Exception:
+                logging.exception("Error in ad-hoc callback for %r", raw)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                raw = self._conn.read_until(EOL)
+            except OSError as error:
+                # Includes SerialException: the port is gone, give up.
+                if not self._stop_event.is_set():
+                    logging.error("Omicron dispatcher read error: %s", error)
+                    self._fail(error)
+                break
+            except Exception:
+                if self._stop_event.is_set():
+                    break
+                logging.exception("Omicron dispatcher read error")
+                self._stop_event.wait(ERROR_BACKOFF)
+                continue
+            if not raw:
+                continue
+            if is_adhoc(raw):
+                self._dispatch_adhoc(raw)
+            else:
+                self._replies.put(raw)
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self.join(timeout)
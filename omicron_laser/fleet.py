@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Drive many Omicron lasers concurrently.
+
+Each laser sits on its own serial port, so commands to different lasers can
+run in parallel. A :class:`LaserGroup` fans a call out to every laser
+through a thread pool and collects one :class:`Result` per laser, so a
+fleet-wide sweep costs about one round trip of wall time::
+
+    group = LaserGroup.open(["/dev/ttyUSB0", "/dev/ttyUSB1"], baudrate=500000)
+    for name, result in group.laser_off().items():
+        print(name, result.value if result.ok else result.error)
+"""
+
+import collections
+import concurrent.futures
+import functools
+import time
+
+import serial
+
+from .core import Omicron_laser
+
+
+class Result(collections.namedtuple("Result", "value error")):
+    """Outcome of a call on one laser: a value or the exception raised"""
+
+    __slots__ = ()
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# Methods sent to a laser even while it is busy with another call: they
+# cut ahead of it through the laser's PriorityScheduler.
+SAFETY_METHODS = ("laser_off", "power_off")
+
+
+class LaserGroup:
+    """
+    A set of named Omicron_laser objects driven in parallel.
+
+    Any public Omicron_laser method can be called on the group; it returns a
+    dict mapping each laser name to a :class:`Result`. A laser that does not
+    answer within *timeout* seconds of its call gets a :class:`TimeoutError`
+    result. The blocked call itself cannot be interrupted: it finishes in
+    the background. Each laser has its own worker, so calls to a hung laser
+    queue up behind it without holding up the others, and a second one for
+    :data:`SAFETY_METHODS`, which are never held back.
+    """
+
+    def __init__(self, lasers: dict, timeout: float = None):
+        self.lasers = dict(lasers)
+        self.timeout = timeout
+        self._workers = {name: self._worker(name) for name in self.lasers}
+        self._safety_workers = {name: self._worker(name + " safety")
+                                for name in self.lasers}
+
+    @staticmethod
+    def _worker(name: str):
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="LaserGroup " + str(name))
+
+    @classmethod
+    def open(cls, urls, baudrate: int = 500000, read_timeout: float = 0.1,
+             timeout: float = None, **kwargs):
+        """
+        Open one serial connection and Omicron_laser per URL, in parallel.
+
+        The lasers are named after their URL. Extra keyword arguments are
+        passed to Omicron_laser. Raises the first connection error, after
+        closing the ports that did open.
+        """
+        def connect(url):
+            conn = serial.serial_for_url(url, baudrate=baudrate,
+                                         timeout=read_timeout)
+            try:
+                return Omicron_laser(conn, **kwargs)
+            except Exception:
+                conn.close()
+                raise
+
+        urls = list(urls)
+        with concurrent.futures.ThreadPoolExecutor(len(urls) or 1) as executor:
+            futures = [executor.submit(connect, url) for url in urls]
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            for future in futures:
+                if not future.exception():
+                    future.result()._conn.close()
+            raise errors[0]
+        return cls({url: future.result() for url, future in zip(urls, futures)},
+                   timeout=timeout)
+
+    def __len__(self) -> int:
+        return len(self.lasers)
+
+    def __getitem__(self, name) -> Omicron_laser:
+        return self.lasers[name]
+
+    def call(self, method: str, *args, **kwargs) -> dict:
+        """Call *method* on every laser concurrently"""
+        workers = self._safety_workers if method in SAFETY_METHODS \
+            else self._workers
+        return self._submit(
+            workers, lambda laser: getattr(laser, method)(*args, **kwargs))
+
+    def map(self, func) -> dict:
+        """Call *func(laser)* for every laser concurrently"""
+        return self._submit(self._workers, func)
+
+    def _submit(self, workers: dict, func) -> dict:
+        calls = {name: (workers[name].submit(func, laser), time.monotonic())
+                 for name, laser in self.lasers.items()}
+        return self._collect(calls)
+
+    def _collect(self, calls: dict) -> dict:
+        results = {}
+        for name, (future, start) in calls.items():
+            remaining = None if self.timeout is None else \
+                max(start + self.timeout - time.monotonic(), 0)
+            try:
+                results[name] = Result(future.result(remaining), None)
+            except concurrent.futures.TimeoutError:
+                results[name] = Result(None, TimeoutError(
+                    "{} did not answer within {}s".format(name, self.timeout)))
+            except Exception as error:
+                results[name] = Result(None, error)
+        return results
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not callable(getattr(Omicron_laser, name, None)):
+            raise AttributeError(
+                "{!r} object has no attribute {!r}".format(type(self).__name__, name))
+        return functools.partial(self.call, name)
+
+    def close(self):
+        for worker in list(self._workers.values()) + \
+                list(self._safety_workers.values()):
+            worker.shutdown(wait=False)
+        for laser in self.lasers.values():
+            laser.stop_dispatcher()
+            laser._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
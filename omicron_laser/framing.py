@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Incremental frame reader.
+
+``read_until(b"\\r")`` pulls one frame per call and builds it byte by byte.
+:class:`FrameReader` instead reads everything the port has available
+(``in_waiting``) into one reusable buffer and splits the frames out of it
+with memoryviews, so frames that arrive together (pipelined replies,
+ad-hoc messages) cost a single read.
+"""
+
+
+class FrameReader:
+    """
+    Frame reader over a pyserial-like connection (``read``, ``in_waiting``).
+
+    It offers the ``read_until`` subset of the pyserial API so it can stand
+    in for the connection on the read side. Once a FrameReader is in use all
+    reads must go through it: bytes may already be buffered here.
+    """
+
+    # Compact the buffer once this many consumed bytes precede the data.
+    COMPACT_SIZE = 4096
+
+    def __init__(self, conn, eol: bytes = b"\r"):
+        self._conn = conn
+        self._eol = eol
+        self._buffer = bytearray()
+        self._start = 0
+
+    @property
+    def timeout(self):
+        return getattr(self._conn, "timeout", None)
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._buffer) - self._start + self._conn.in_waiting
+
+    def _compact(self):
+        if self._start >= self.COMPACT_SIZE or self._start == len(self._buffer):
+            del self._buffer[:self._start]
+            self._start = 0
+
+    def _fill(self) -> bool:
+        # Block (up to the port timeout) for the first byte, then take
+        # whatever else already arrived.
+        data = self._conn.read(self._conn.in_waiting or 1)
+        if not data:
+            return False
+        self._buffer += data
+        waiting = self._conn.in_waiting
+        if waiting:
+            self._buffer += self._conn.read(waiting)
+        return True
+
+    def read_frame(self, parse=bytes, expected: bytes = None):
+        """
+        Return ``parse(frame)`` for the next frame, *frame* being a
+        memoryview on the internal buffer (terminator included). It is only
+        valid during the call: *parse* must not keep it. On timeout the
+        partial data is parsed, like ``read_until`` does.
+        """
+        eol = self._eol if expected is None else expected
+        end = self._buffer.find(eol, self._start)
+        while end < 0:
+            self._compact()
+            searched = max(len(self._buffer) - len(eol) + 1, self._start)
+            if not self._fill():
+                end = len(self._buffer) - len(eol)
+                break
+            end = self._buffer.find(eol, searched)
+        start, self._start = self._start, end + len(eol)
+        with memoryview(self._buffer) as view:
+            return parse(view[start:self._start])
+
+    def read_until(self, expected: bytes = None, size=None) -> bytes:
+        return self.read_frame(bytes, expected)
+
+    def readline(self) -> bytes:
+        return self.read_frame(bytes)
+
+    def reset_input_buffer(self):
+        del self._buffer[:]
+        self._start = 0
+        reset = getattr(self._conn, "reset_input_buffer", None)
+        if reset is not None:
+            reset()
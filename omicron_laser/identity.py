@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""On-disk cache of the laser identity values read during the handshake."""
+
+import json
+import logging
+import os
+
+
+class IdentityCache:
+    """
+    JSON file mapping (port, serial number) to the identity fields of a
+    laser (model, firmware, wavelength, ...), which cannot change while the
+    same head stays on the same port.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def _key(port: str, serial_number: str) -> str:
+        return "{}|{}".format(port, serial_number)
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as cache_file:
+                return json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logging.warning("Ignoring corrupt identity cache %s", self.path)
+            return {}
+
+    def get(self, port: str, serial_number: str):
+        return self._load().get(self._key(port, serial_number))
+
+    def put(self, port: str, serial_number: str, identity: dict):
+        entries = self._load()
+        entries[self._key(port, serial_number)] = identity
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as cache_file:
+            json.dump(entries, cache_file, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
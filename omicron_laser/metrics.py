@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Per-command latency and error instrumentation.
+
+Every request/reply pair goes through :meth:`CommandMetrics.request` and
+:meth:`CommandMetrics.response`, which cost two clock reads, a dict lookup
+and a few integer increments, so it can stay on at full polling rate.
+Example::
+
+    laser = Omicron_laser(conn)
+    laser.metrics.on_response.append(
+        lambda command, raw, latency, outcome: print(command, outcome))
+    ...
+    print(laser.metrics.snapshot()["MDP"])
+"""
+
+import bisect
+import threading
+import time
+
+
+# Upper bounds (s) of the latency histogram buckets. The last bucket of the
+# histogram counts everything slower.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2,
+                   0.5, 1.0)
+
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+MALFORMED = "malformed"
+
+OUTCOMES = (OK, ERROR, TIMEOUT, MALFORMED)
+
+
+def classify(command: bytes, raw: bytes) -> str:
+    """
+    Outcome of a reply frame: incomplete (timeout), not a reply to
+    *command* (malformed, ex: ``!UK`` for an unknown command), refused by
+    the laser (error, ``x`` instead of ``>``) or ok.
+    """
+    if not raw.endswith(b"\r"):
+        return TIMEOUT
+    if raw[1:4] != command or raw[:1] != b"!":
+        return MALFORMED
+    if raw[4:5] == b"x":
+        return ERROR
+    return OK
+
+
+class _Counters:
+
+    __slots__ = ("count", "outcomes", "total", "max", "histogram")
+
+    def __init__(self, buckets: int):
+        self.count = 0
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (buckets + 1)
+
+    def to_dict(self) -> dict:
+        return dict(count=self.count,
+                    mean=self.total / self.count if self.count else 0.0,
+                    max=self.max, histogram=list(self.histogram),
+                    **self.outcomes)
+
+
+class CommandMetrics:
+    """
+    Counters, outcomes and latency histogram per command.
+
+    *on_request(command, frame)* and *on_response(command, raw, latency,
+    outcome)* callbacks can be appended to the :attr:`on_request` and
+    :attr:`on_response` lists. They run in the calling thread, inside the
+    transaction, so they must be quick.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, clock=time.perf_counter):
+        self.buckets = tuple(buckets)
+        self.clock = clock
+        self.on_request = []
+        self.on_response = []
+        self._lock = threading.Lock()
+        self._commands = {}
+
+    def request(self, command: bytes, frame: bytes = b"") -> float:
+        """Record that *command* is being sent; returns the start time"""
+        for callback in self.on_request:
+            callback(command, frame)
+        return self.clock()
+
+    def response(self, command: bytes, raw: bytes, start: float) -> str:
+        """Record the reply to the request started at *start*"""
+        latency = self.clock() - start
+        outcome = classify(command, raw)
+        with self._lock:
+            counters = self._commands.get(command)
+            if counters is None:
+                counters = self._commands[command] = _Counters(len(self.buckets))
+            counters.count += 1
+            counters.outcomes[outcome] += 1
+            counters.total += latency
+            if latency > counters.max:
+                counters.max = latency
+            counters.histogram[bisect.bisect_left(self.buckets, latency)] += 1
+        for callback in self.on_response:
+            callback(command, raw, latency, outcome)
+        return outcome
+
+    def snapshot(self) -> dict:
+        """
+        Per command (str) dict with count, ok, error, timeout, malformed,
+        mean and max latency (s) and the histogram counts for
+        :attr:`buckets`.
+        """
+        with self._lock:
+            return {command.decode("Latin1"): counters.to_dict()
+                    for command, counters in self._commands.items()}
+
+    def reset(self):
+        with self._lock:
+            self._commands.clear()
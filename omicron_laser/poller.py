@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Poll a large fleet of lasers from several processes.
+
+With dozens of lasers one process spends its time decoding replies and
+fighting for the GIL. A :class:`FleetPoller` spreads the lasers over
+worker processes, each polling its lasers from one thread per port. Every
+laser writes its samples (the :data:`~omicron_laser.archive.RECORD` fields)
+to its own :class:`SampleRing` in shared memory, which the coordinator
+reads as numpy record arrays, with no pickling::
+
+    with FleetPoller(urls, processes=4) as poller:
+        while True:
+            for url, records in poller.read().items():
+                engine[url].process(records)
+            time.sleep(1)
+
+Requires numpy (``pip install omicron_laser[telemetry]``).
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy
+
+from .archive import FIELD_QUERIES, RECORD
+
+
+# Header of a ring: 8 uint64 words, padded to a cache line.
+HEADER_SIZE = 64
+WRITTEN, ERRORS, STATE = range(3)
+
+# States of the laser writing to a ring.
+STARTING, RUNNING, FAILED, STOPPED = range(4)
+
+
+class SampleRing:
+    """
+    Single-writer ring buffer of *capacity* records in shared memory.
+
+    The writer stores a record and then bumps the ``written`` counter of the
+    header; the reader copies what was written since its last read and
+    discards the records the writer may have overwritten meanwhile (counted
+    in :attr:`dropped`). Give *shm* to attach to an existing ring.
+    """
+
+    def __init__(self, capacity: int, shm: shared_memory.SharedMemory = None):
+        self.capacity = capacity
+        if shm is None:
+            shm = shared_memory.SharedMemory(
+                create=True, size=HEADER_SIZE + capacity * RECORD.itemsize)
+            shm.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        self.shm = shm
+        self.header = numpy.ndarray((HEADER_SIZE // 8,), numpy.uint64, shm.buf)
+        self.records = numpy.ndarray((capacity,), RECORD, shm.buf,
+                                     offset=HEADER_SIZE)
+        self.position = 0
+        self.dropped = 0
+
+    @property
+    def written(self) -> int:
+        return int(self.header[WRITTEN])
+
+    @property
+    def state(self) -> int:
+        return int(self.header[STATE])
+
+    def append(self, timestamp: float, *values):
+        written = int(self.header[WRITTEN])
+        self.records[written % self.capacity] = (timestamp,) + values
+        self.header[WRITTEN] = written + 1
+
+    def read(self) -> numpy.ndarray:
+        """Copy of the records written since the last read"""
+        written = int(self.header[WRITTEN])
+        start = max(self.position, written - self.capacity)
+        records = self.records[numpy.arange(start, written) % self.capacity]
+        # The writer may be storing record `now` over `now - capacity`.
+        now = int(self.header[WRITTEN])
+        overwritten = min(max(now + 1 - self.capacity - start, 0), len(records))
+        self.dropped += start - self.position + overwritten
+        self.position = written
+        return records[overwritten:]
+
+    def close(self, unlink: bool = False):
+        # The numpy views must go before the memory can be released.
+        del self.header, self.records
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _poll(url: str, ring: SampleRing, stop, period: float, baudrate: int,
+          read_timeout: float, kwargs: dict):
+    import serial
+    from .core import Omicron_laser
+
+    try:
+        conn = serial.serial_for_url(url, baudrate=baudrate,
+                                     timeout=read_timeout)
+    except (serial.SerialException, ValueError) as error:
+        logging.error("%s: %s", url, error)
+        ring.header[STATE] = FAILED
+        return
+    try:
+        laser = Omicron_laser(conn, handshake="lazy", **kwargs)
+        queries = [query for query, _ in FIELD_QUERIES]
+        decoders = [decode for _, decode in FIELD_QUERIES]
+        ring.header[STATE] = RUNNING
+        next_time = time.monotonic()
+        while not stop.is_set():
+            try:
+                replies = laser.query_many(queries, raw=True)
+                ring.append(time.time(), *(decode(raw) for decode, raw
+                                           in zip(decoders, replies)))
+            except Exception as error:
+                logging.error("%s: %s", url, error)
+                ring.header[ERRORS] += 1
+                stop.wait(1)
+                continue
+            if period:
+                next_time += period
+                stop.wait(max(next_time - time.monotonic(), 0))
+    finally:
+        conn.close()
+        ring.header[STATE] = STOPPED
+
+
+def _worker(jobs, stop, period: float, baudrate: int, read_timeout: float,
+            kwargs: dict):
+    """Process entry point: poll every (url, shm, capacity) of *jobs*"""
+    rings = [(url, SampleRing(capacity, shm)) for url, shm, capacity in jobs]
+    threads = [threading.Thread(target=_poll, name="poll " + url, daemon=True,
+                                args=(url, ring, stop, period, baudrate,
+                                      read_timeout, kwargs))
+               for url, ring in rings]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for _, ring in rings:
+        ring.close()
+
+
+class FleetPoller:
+    """
+    Sample every laser of *urls* from *processes* worker processes (one per
+    CPU by default, never more than lasers).
+
+    Each laser is sampled every *period* seconds (0: as fast as the link
+    allows) into a :class:`SampleRing` of *capacity* records; call
+    :meth:`read` often enough not to lose samples. Extra keyword arguments
+    are passed to Omicron_laser and must be picklable.
+    """
+
+    def __init__(self, urls, processes: int = None, capacity: int = 4096,
+                 period: float = 0.0, baudrate: int = 500000,
+                 read_timeout: float = 0.1, **kwargs):
+        self.urls = list(dict.fromkeys(urls))
+        self.processes = max(min(processes or os.cpu_count() or 1,
+                                 len(self.urls)), 1)
+        self.period = period
+        self.rings = {url: SampleRing(capacity) for url in self.urls}
+        self._options = (period, baudrate, read_timeout, kwargs)
+        self._stop = multiprocessing.Event()
+        self._workers = []
+
+    def start(self, timeout: float = 10.0):
+        """
+        Start the workers and wait until every laser is polled. Raises
+        ConnectionError, after stopping, if some port could not be opened.
+        A stopped poller can be started again.
+        """
+        self._stop.clear()
+        for ring in self.rings.values():
+            ring.header[STATE] = STARTING
+        for index in range(self.processes):
+            jobs = [(url, self.rings[url].shm, self.rings[url].capacity)
+                    for url in self.urls[index::self.processes]]
+            worker = multiprocessing.Process(
+                target=_worker, name="FleetPoller-{}".format(index),
+                args=(jobs, self._stop) + self._options, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        deadline = time.monotonic() + timeout
+        while any(ring.state == STARTING for ring in self.rings.values()) \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        failed = [url for url, ring in self.rings.items()
+                  if ring.state != RUNNING]
+        if failed:
+            self.stop()
+            raise ConnectionError("Could not poll {}".format(", ".join(failed)))
+
+    def read(self) -> dict:
+        """New records of each laser since the last read"""
+        return {url: ring.read() for url, ring in self.rings.items()}
+
+    def info(self) -> dict:
+        """Samples written, dropped by the reader and errors per laser"""
+        return {url: dict(written=ring.written, dropped=ring.dropped,
+                          errors=int(ring.header[ERRORS]),
+                          running=ring.state == RUNNING)
+                for url, ring in self.rings.items()}
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        self.stop()
+        for ring in self.rings.values():
+            ring.close(unlink=True)
+        self.rings = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
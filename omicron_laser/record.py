@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Record and replay the wire traffic of an Omicron_laser session.
+
+:class:`RecordingConnection` wraps the pyserial-like connection given to
+Omicron_laser and logs every write and read, with its time, to a compact
+binary file. :class:`ReplayConnection` feeds that file back to a client, at
+the original speed or faster, so a real hardware session can be replayed
+offline to test or benchmark the client::
+
+    conn = RecordingConnection(serial.serial_for_url("/dev/ttyUSB0"),
+                               "session.omlr")
+    laser = Omicron_laser(conn)
+    laser.calibrate_laser_diode()
+    conn.close()
+
+    laser = Omicron_laser(ReplayConnection("session.omlr", speed=10))
+    laser.calibrate_laser_diode()
+
+File format: a 5 byte header (``OMLR`` + version) followed by one record
+per write or read: direction (``W``/``R``), seconds since the start of the
+recording (float64), data length (uint32) and the data itself. Empty reads
+are recorded too: they are the read timeouts of the session.
+"""
+
+import collections
+import struct
+import threading
+import time
+
+
+MAGIC = b"OMLR\x01"
+
+RECORD = struct.Struct("<cdI")
+
+WRITE = b"W"
+READ = b"R"
+
+
+Record = collections.namedtuple("Record", "direction time data")
+
+
+def load(path) -> list:
+    """Return the list of :class:`Record` of a recording file"""
+    with open(path, "rb") as file:
+        content = file.read()
+    return parse(content)
+
+
+def parse(content: bytes) -> list:
+    if not content.startswith(MAGIC):
+        raise ValueError("Not an Omicron laser recording")
+    records = []
+    offset = len(MAGIC)
+    view = memoryview(content)
+    while offset < len(content):
+        direction, timestamp, size = RECORD.unpack_from(content, offset)
+        offset += RECORD.size
+        records.append(Record(direction, timestamp,
+                              bytes(view[offset:offset + size])))
+        offset += size
+    return records
+
+
+class RecordingConnection:
+    """
+    Pass-through wrapper of a pyserial-like connection recording the
+    traffic to *file* (a path or a binary file object).
+    """
+
+    def __new__(cls, conn, *args, **kwargs):
+        # Omicron_laser reads in bulk from classes defining in_waiting:
+        # only offer it if the wrapped connection has it.
+        if cls is RecordingConnection and hasattr(type(conn), "in_waiting"):
+            cls = _BufferedRecordingConnection
+        return super().__new__(cls)
+
+    def __init__(self, conn, file, clock=time.monotonic):
+        self._conn = conn
+        self._clock = clock
+        self._start = clock()
+        self._lock = threading.Lock()
+        self._own_file = not hasattr(file, "write")
+        self._file = open(file, "wb") if self._own_file else file
+        self._file.write(MAGIC)
+
+    def _record(self, direction: bytes, data: bytes):
+        with self._lock:
+            self._file.write(RECORD.pack(direction, self._clock() - self._start,
+                                         len(data)) + data)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @property
+    def timeout(self):
+        return self._conn.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._conn.timeout = value
+
+    def write(self, data: bytes):
+        self._record(WRITE, data)
+        return self._conn.write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        data = self._conn.read(size)
+        self._record(READ, data)
+        return data
+
+    def read_until(self, expected: bytes = b"\n", size=None) -> bytes:
+        data = self._conn.read_until(expected)
+        self._record(READ, data)
+        return data
+
+    def flush(self):
+        self._file.flush()
+        flush = getattr(self._conn, "flush", None)
+        if flush is not None:
+            flush()
+
+    def close(self):
+        """Close the connection and, if opened here, the recording file"""
+        if self._own_file:
+            self._file.close()
+        else:
+            self._file.flush()
+        self._conn.close()
+
+
+class _BufferedRecordingConnection(RecordingConnection):
+
+    @property
+    def in_waiting(self) -> int:
+        return self._conn.in_waiting
+
+
+class ReplayConnection:
+    """
+    pyserial-like connection replaying a recording (a path, or the list of
+    records from :func:`load`).
+
+    The data read after each write is released at the recorded delay from
+    that write, divided by *speed* (``float("inf")`` replays with no delay
+    at all). Recorded timeouts are reproduced; reading past what was
+    recorded before the next write waits *timeout* like a real port. With
+    *strict*, a write that differs from the recorded one raises ValueError.
+    """
+
+    def __init__(self, recording, speed: float = 1.0, strict: bool = True,
+                 timeout: float = None):
+        self.records = recording if isinstance(recording, list) \
+            else load(recording)
+        self.port = str(recording) if not isinstance(recording, list) \
+            else "replay"
+        self.speed = speed
+        self.strict = strict
+        self.timeout = timeout
+        self._index = 0
+        self._rx = bytearray()
+        self._changed = threading.Condition()
+        # Replay and recording time of the last write.
+        self._base = time.monotonic(), 0.0
+
+    def _release_time(self, record: Record) -> float:
+        base, recorded = self._base
+        return base + (record.time - recorded) / self.speed
+
+    def _next_read(self):
+        if self._index < len(self.records):
+            record = self.records[self._index]
+            if record.direction == READ:
+                return record
+
+    def _pump(self):
+        now = time.monotonic()
+        record = self._next_read()
+        while record is not None and record.data and \
+                self._release_time(record) <= now:
+            self._rx += record.data
+            self._index += 1
+            record = self._next_read()
+
+    @property
+    def in_waiting(self) -> int:
+        with self._changed:
+            self._pump()
+            return len(self._rx)
+
+    def write(self, data: bytes):
+        with self._changed:
+            # What was read before this write in the recording is due now.
+            record = self._next_read()
+            while record is not None:
+                self._rx += record.data
+                self._index += 1
+                record = self._next_read()
+            if self._index >= len(self.records):
+                raise EOFError("End of recording")
+            record = self.records[self._index]
+            if self.strict and record.data != data:
+                raise ValueError("Unexpected write {!r}, recorded {!r}".format(
+                    data, record.data))
+            self._index += 1
+            self._base = time.monotonic(), record.time
+            self._changed.notify_all()
+        return len(data)
+
+    def _read(self, done):
+        deadline = None if self.timeout is None else \
+            time.monotonic() + self.timeout
+        while True:
+            self._pump()
+            if done():
+                return
+            record = self._next_read()
+            now = time.monotonic()
+            if record is None:
+                # Nothing was recorded before the next write.
+                if deadline is None or now >= deadline:
+                    return
+                self._changed.wait(deadline - now)
+                continue
+            delay = self._release_time(record) - now
+            if delay <= 0:
+                # Recorded timeout.
+                self._index += 1
+                return
+            self._changed.wait(delay)
+
+    def read(self, size: int = 1) -> bytes:
+        with self._changed:
+            self._read(lambda: len(self._rx) >= size)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+            return data
+
+    def read_until(self, expected: bytes = b"\n", size=None) -> bytes:
+        with self._changed:
+            self._read(lambda: expected in self._rx)
+            end = self._rx.find(expected)
+            end = len(self._rx) if end < 0 else end + len(expected)
+            data = bytes(self._rx[:end])
+            del self._rx[:end]
+            return data
+
+    def reset_input_buffer(self):
+        with self._changed:
+            del self._rx[:]
+
+    def close(self):
+        pass
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Scheduled telemetry sampler for Omicron_laser.
+
+Each channel (a query command like ``b"MDP"``) is sampled at its own rate
+into a preallocated :class:`RingBuffer`, so memory stays flat no matter how
+long the sampler runs. Channels that are due at the same time are fetched
+with a single pipelined :meth:`~omicron_laser.core.Omicron_laser.query_many`.
+Example::
+
+    laser = Omicron_laser(serial.serial_for_url("/dev/ttyUSB0"))
+    sampler = Sampler(laser, {b"MDP": 10, b"MTD": 1, b"GAS": 1})
+    sampler.start()
+    ...
+    print(sampler[b"MDP"].stats(window=60))
+
+Requires numpy (``pip install omicron_laser[telemetry]``).
+"""
+
+import logging
+import threading
+import time
+
+import numpy
+
+from .core import decode_bytes, decode_float, pack_word
+
+
+def decode_word(raw: bytes) -> int:
+    return pack_word(decode_bytes(raw))
+
+
+# How each sampled channel is decoded and stored.
+CHANNELS = {
+    b"MDP": (decode_float, numpy.float64),
+    b"MTD": (decode_float, numpy.float64),
+    b"MTA": (decode_float, numpy.float64),
+    b"GAS": (decode_word, numpy.uint16),
+    b"GFB": (decode_word, numpy.uint16),
+    b"GLF": (decode_word, numpy.uint16),
+}
+
+
+class RingBuffer:
+    """Fixed-size buffer of timestamped samples backed by numpy arrays"""
+
+    def __init__(self, capacity: int, dtype=numpy.float64):
+        self.capacity = capacity
+        self.times = numpy.zeros(capacity, dtype=numpy.float64)
+        self.values = numpy.zeros(capacity, dtype=dtype)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp: float, value):
+        with self._lock:
+            index = self.count % self.capacity
+            self.times[index] = timestamp
+            self.values[index] = value
+            self.count += 1
+
+    def latest(self):
+        """Return the last (timestamp, value) pair or None if empty"""
+        with self._lock:
+            if not self.count:
+                return None
+            index = (self.count - 1) % self.capacity
+            return self.times[index], self.values[index]
+
+    def window(self, window: float = None, size: int = None):
+        """
+        Return (times, values) arrays in chronological order.
+
+        *window* keeps only the samples of the last *window* seconds and
+        *size* only the last *size* samples. The arrays are copies, safe to
+        keep while sampling continues.
+        """
+        with self._lock:
+            length = len(self)
+            start = self.count % self.capacity if self.count > self.capacity else 0
+            order = (numpy.arange(length) + start) % self.capacity
+            times, values = self.times[order], self.values[order]
+        if size is not None:
+            times, values = times[-size:], values[-size:]
+        if window is not None and len(times):
+            first = numpy.searchsorted(times, times[-1] - window)
+            times, values = times[first:], values[first:]
+        return times, values
+
+    def stats(self, window: float = None, size: int = None) -> dict:
+        """Mean, min, max, std and slope (units/s) of the selected window"""
+        times, values = self.window(window, size)
+        if not len(values):
+            return dict(count=0, mean=numpy.nan, min=numpy.nan, max=numpy.nan,
+                        std=numpy.nan, slope=numpy.nan)
+        values = values.astype(numpy.float64)
+        slope = numpy.nan
+        if len(values) > 1:
+            dt = times - times.mean()
+            denominator = numpy.dot(dt, dt)
+            if denominator:
+                slope = numpy.dot(dt, values - values.mean()) / denominator
+        return dict(count=len(values), mean=values.mean(), min=values.min(),
+                    max=values.max(), std=values.std(), slope=slope)
+
+
+class Sampler:
+    """
+    Poll an Omicron_laser in a background thread.
+
+    *rates* maps channel commands to their sampling rate in Hz. Every
+    channel gets a :class:`RingBuffer` of *capacity* samples, available as
+    ``sampler[command]``.
+    """
+
+    def __init__(self, laser, rates: dict, capacity: int = 86400):
+        unknown = set(rates) - set(CHANNELS)
+        if unknown:
+            raise ValueError("Unsupported channels: {}".format(sorted(unknown)))
+        self.laser = laser
+        self.periods = {command: 1.0 / rate for command, rate in rates.items()}
+        self.buffers = {command: RingBuffer(capacity, CHANNELS[command][1])
+                        for command in rates}
+        self._next = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __getitem__(self, command: bytes) -> RingBuffer:
+        return self.buffers[command]
+
+    def sample(self, commands, timestamp: float = None):
+        """Fetch *commands* in one pipelined batch and store the samples"""
+        commands = list(commands)
+        replies = self.laser.query_many(commands, raw=True)
+        if timestamp is None:
+            timestamp = time.time()
+        for command, raw in zip(commands, replies):
+            self.buffers[command].append(timestamp, CHANNELS[command][0](raw))
+
+    def _due(self, now: float) -> list:
+        due = [command for command in self.periods
+               if self._next.get(command, now) <= now]
+        for command in due:
+            # Keep the schedule anchored so the rate does not drift.
+            next_time = self._next.get(command, now) + self.periods[command]
+            self._next[command] = max(next_time, now)
+        return due
+
+    def run(self):
+        while not self._stop_event.is_set():
+            due = self._due(time.monotonic())
+            if due:
+                try:
+                    self.sample(due)
+                except Exception:
+                    logging.exception("Error sampling %s", due)
+            wait = min(self._next.values()) - time.monotonic()
+            if wait > 0:
+                self._stop_event.wait(wait)
+
+    def start(self):
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self.run, name="OmicronSampler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Prioritized access to the serial link.
+
+Only one transaction can use the link at a time. When several threads are
+waiting, the :class:`PriorityScheduler` hands the link to the most urgent
+one: safety commands (laser/power off) first, then control commands
+(setters, reset, calibration) and telemetry queries last. Long operations
+yield the link to waiting safety commands between reads, so a ``laser_off``
+never waits more than one transaction (or one read timeout).
+"""
+
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+
+SAFETY = 0
+CONTROL = 1
+TELEMETRY = 2
+
+PRIORITY_NAMES = {SAFETY: "safety", CONTROL: "control", TELEMETRY: "telemetry"}
+
+
+class PriorityScheduler:
+    """Reentrant lock granted by priority, then in arrival order"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._owner = None
+        self._depth = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._stats = {priority: [0, 0.0, 0.0] for priority in PRIORITY_NAMES}
+
+    def acquire(self, priority: int = TELEMETRY):
+        me = threading.get_ident()
+        with self._cond:
+            if self._owner == me:
+                self._depth += 1
+                return
+            self._wait_turn(priority)
+            self._owner, self._depth = me, 1
+
+    def _wait_turn(self, priority: int):
+        entry = (priority, next(self._sequence))
+        heapq.heappush(self._waiting, entry)
+        start = time.monotonic()
+        while self._owner is not None or self._waiting[0] != entry:
+            self._cond.wait()
+        heapq.heappop(self._waiting)
+        wait = time.monotonic() - start
+        stats = self._stats[priority]
+        stats[0] += 1
+        stats[1] += wait
+        stats[2] = max(stats[2], wait)
+
+    def release(self):
+        with self._cond:
+            if self._owner != threading.get_ident():
+                raise RuntimeError("cannot release un-acquired scheduler")
+            self._depth -= 1
+            if not self._depth:
+                self._owner = None
+                self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, priority: int = TELEMETRY):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def waiting(self, priority: int = SAFETY) -> bool:
+        """Whether a request of *priority* or more urgent is queued"""
+        with self._cond:
+            return bool(self._waiting) and self._waiting[0][0] <= priority
+
+    def yield_to(self, priority: int = SAFETY, resume: int = CONTROL):
+        """
+        Let queued requests of *priority* or more urgent run, then take the
+        link back (queued as *resume*). Must be called by the owner.
+        """
+        with self._cond:
+            if not (self._waiting and self._waiting[0][0] <= priority):
+                return
+            depth, self._owner, self._depth = self._depth, None, 0
+            self._cond.notify_all()
+            self._wait_turn(resume)
+            self._owner, self._depth = threading.get_ident(), depth
+
+    def metrics(self) -> dict:
+        """Queue depth and wait times (s) per priority class"""
+        with self._cond:
+            depths = dict.fromkeys(PRIORITY_NAMES, 0)
+            for priority, _ in self._waiting:
+                depths[priority] += 1
+            return {
+                name: dict(depth=depths[priority], granted=stats[0],
+                           mean_wait=stats[1] / stats[0] if stats[0] else 0.0,
+                           max_wait=stats[2])
+                for priority, name in PRIORITY_NAMES.items()
+                for stats in (self._stats[priority],)}
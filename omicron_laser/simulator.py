@@ -12,20 +12,338 @@
     - class: Omicron_laser
       package: omicron_laser.simulator
       transports:
-      - type: tcp
-        url: :5000
+      - type: serial
+        url: /tmp/omicron-laser
+        baudrate: 500000
+      latency: 0.002        # seconds before each reply
+      jitter: 0.001         # extra uniform random latency (seconds)
+      baudrate: 500000      # emulate the transfer time of every reply
+      reset_time: 2         # seconds between !RsC and $RsC>
+      calibration_time: 5   # seconds between !CLD> and $CLD
 
-A simple *nc* client can be used to connect to the instrument:
+A simple *miniterm* client can be used to talk to the instrument (commands
+and replies are terminated with a carriage return):
 
-    $ nc 0 5000
-    *IDN?
-    GE,Pace5000,204683,1.01A
+    $ python -m serial.tools.miniterm --eol CR /tmp/omicron-laser 500000
+    ?GFw|
+    !GFwLuxX|1234|1.0.2
+
+To drive the simulator in-process, without any server or serial port, wrap
+it in a :class:`Loopback` connection::
+
+    from omicron_laser.core import Omicron_laser
+    from omicron_laser.simulator import Loopback, Omicron_laser as Simulator
+
+    laser = Omicron_laser(Loopback(Simulator("laser", latency=0.001)))
 """
 
+import bisect
+import itertools
+import random
+import threading
+import time
+
+import gevent
 from sinstruments.simulator import BaseDevice
 
 
+CR = b"\r"
+
+
+def transfer_time(nb_bytes: int, baudrate=None) -> float:
+    """Time to send *nb_bytes* over a 8N1 serial line"""
+    return nb_bytes * 10.0 / baudrate if baudrate else 0.0
+
+
 class Omicron_laser(BaseDevice):
 
+    newline = CR
+
+    def __init__(self, name, latency=0.0, jitter=0.0, baudrate=None,
+                 reset_time=2.0, calibration_time=5.0, model_code="LuxX",
+                 device_id="1234", firmware_version="1.0.2",
+                 serial_number="203541", wavelength="405", power="100",
+                 max_power=100.0, **kwargs):
+        super().__init__(name, **kwargs)
+        self.latency = latency
+        self.jitter = jitter
+        self.baudrate = baudrate
+        self.reset_time = reset_time
+        self.calibration_time = calibration_time
+        self.model_code = model_code
+        self.device_id = device_id
+        self.firmware_version = firmware_version
+        self.serial_number = serial_number
+        self.wavelength = wavelength
+        self.power = power
+        self.max_power = max_power
+        self.level_power = 0
+        self.temporary_power = 0.0
+        self.auto_reset = False
+        # auto power-up, auto start-up and usb ad-hoc mode
+        self.operation_mode = 0xE034
+        # laser enable pin and key switch
+        self.inputs = 0x00C0
+        self.emitting = False
+        self.on_since = None
+        self.working_seconds = 0.0
+        self.reset_state()
+
+    def reset_state(self):
+        """Clear failures and restart as after a power cycle"""
+        self._switch(emitting=False)
+        self.latched_failure = 0
+        self.failure = 0
+        self.powered = bool(self.operation_mode & 0x8000)
+
+    def status(self) -> int:
+        word = self.inputs
+        word |= 0x0001 if self.latched_failure else 0
+        word |= 0x0002 if self.emitting else 0
+        word |= 0x0200 if self.powered else 0
+        return word
+
+    def diode_power(self) -> float:
+        if not self.emitting:
+            return 0.0
+        level = self.level_power / 0xFFF * self.max_power
+        return max(0.0, random.gauss(level, level * 0.002))
+
+    def working_hours(self) -> str:
+        seconds = self.working_seconds
+        if self.on_since is not None:
+            seconds += time.monotonic() - self.on_since
+        minutes = int(seconds // 60)
+        return "{:05d}:{:02d}".format(minutes // 60, minutes % 60)
+
+    def _word(self, word: int) -> bytes:
+        return bytes((word & 0xFF, word >> 8 & 0xFF))
+
+    def _switch(self, powered=None, emitting=None):
+        if powered is not None:
+            self.powered = powered
+            if not powered:
+                emitting = False
+        if emitting is not None and emitting != self.emitting:
+            now = time.monotonic()
+            if emitting:
+                self.on_since = now
+            else:
+                self.working_seconds += now - self.on_since
+                self.on_since = None
+            self.emitting = emitting
+
+    def _adhoc(self, command: bytes, value: bytes):
+        if self.operation_mode & 0x2000:
+            return [(0.0, b"$" + command + value + b"|")]
+        return []
+
+    def process(self, line: bytes) -> list:
+        """
+        Process one request line (without the CR terminator).
+
+        Returns a list of (delay, reply) pairs where *delay* is the time the
+        device spends before starting to send *reply* (not counting latency
+        and transfer time, see :meth:`reply_delay`).
+        """
+        line = line.strip(b"\x00")
+        if not line.startswith(b"?"):
+            return []
+        command, value = line[1:4], line[4:].rstrip(b"|")
+        head = b"!" + command
+
+        def ok():
+            return [(0.0, head + b">")]
+
+        def value_reply(data):
+            if isinstance(data, str):
+                data = data.encode("Latin1")
+            return [(0.0, head + data)]
+
+        if command == b"GFw":
+            return value_reply("|".join(
+                (self.model_code, self.device_id, self.firmware_version)))
+        elif command == b"GSN":
+            return value_reply(self.serial_number)
+        elif command == b"GSI":
+            return value_reply("{}|{}".format(self.wavelength, self.power))
+        elif command == b"GMP":
+            return value_reply("{:g}".format(self.max_power))
+        elif command == b"GWH":
+            return value_reply(self.working_hours())
+        elif command == b"MDP":
+            return value_reply("{:.3f}".format(self.diode_power()))
+        elif command == b"MTD":
+            return value_reply("{:.2f}".format(random.gauss(25.0, 0.05)))
+        elif command == b"MTA":
+            return value_reply("{:.2f}".format(random.gauss(22.0, 0.1)))
+        elif command == b"GAS":
+            return value_reply(self._word(self.status()))
+        elif command == b"GFB":
+            return value_reply(self._word(self.failure))
+        elif command == b"GLF":
+            return value_reply(self._word(self.latched_failure))
+        elif command == b"GLP":
+            return value_reply("{:03X}".format(self.level_power))
+        elif command == b"SLP":
+            self.level_power = min(int(value, 16), 0xFFF)
+            self.temporary_power = 100.0 * self.level_power / 0xFFF
+            tpp = "{:g}".format(self.temporary_power).encode("Latin1")
+            return ok() + self._adhoc(b"TPP", tpp)
+        elif command == b"TPP":
+            if not value:
+                return value_reply("{:g}".format(self.temporary_power))
+            self.temporary_power = float(value)
+            return ok() + self._adhoc(b"TPP", value)
+        elif command == b"GOM":
+            return value_reply(self._word(self.operation_mode))
+        elif command == b"SOM":
+            self.operation_mode = int(value, 16) & 0xFFFF
+            return ok()
+        elif command in (b"SAP", b"SAS"):
+            mask = 0x8000 if command == b"SAP" else 0x4000
+            if int(value):
+                self.operation_mode |= mask
+            else:
+                self.operation_mode &= ~mask
+            return ok()
+        elif command == b"ARs":
+            self.auto_reset = bool(int(value))
+            return ok()
+        elif command == b"POn":
+            self._switch(powered=True)
+            return ok()
+        elif command == b"POf":
+            self._switch(powered=False)
+            return ok()
+        elif command == b"LOn":
+            if not self.powered or self.latched_failure:
+                return value_reply("x")
+            self._switch(emitting=True)
+            return ok()
+        elif command == b"LOf":
+            self._switch(emitting=False)
+            return ok()
+        elif command == b"RsC":
+            self.reset_state()
+            return [(0.0, b"!RsC"), (self.reset_time, b"\x00$RsC>")]
+        elif command == b"CLD":
+            result = 0 if self.powered else 10
+            return [(0.0, head + b">"), (0.0, b"!GCI0"),
+                    (self.calibration_time, b"$CLD" + str(result).encode())]
+        return value_reply("UK")
+
+    def reply_delay(self, reply: bytes) -> float:
+        """Latency, jitter and transfer time of one reply"""
+        delay = self.latency + transfer_time(len(reply) + 1, self.baudrate)
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
     def handle_message(self, line):
+        for delay, reply in self.process(line):
+            delay += self.reply_delay(reply)
+            if delay:
+                gevent.sleep(delay)
+            yield reply + CR
+
+
+class Loopback:
+    """
+    In-process pyserial-like connection to a simulated laser.
+
+    Replies become readable after the delays computed by the simulator
+    (latency, jitter, transfer time, long operations), so client code sees
+    realistic timings without any serial port or server.
+    """
+
+    port = "loop://omicron_laser"
+
+    def __init__(self, device: Omicron_laser, timeout: float = 0.1):
+        self.device = device
+        self.timeout = timeout
+        self._rx = bytearray()
+        self._pending = []
+        self._sequence = itertools.count()
+        self._ready_at = 0.0
+        self._tx = b""
+        self._changed = threading.Condition()
+
+    def write(self, data: bytes) -> int:
+        with self._changed:
+            now = time.monotonic()
+            *lines, self._tx = (self._tx + data).split(CR)
+            for line in lines:
+                ready = now
+                for delay, reply in self.device.process(line):
+                    reply += CR
+                    if delay:
+                        # The device is busy: the line stays free meanwhile.
+                        ready += delay
+                    else:
+                        ready = max(ready, self._ready_at)
+                    ready += self.device.reply_delay(reply)
+                    if not delay:
+                        self._ready_at = ready
+                    bisect.insort(self._pending, (ready, next(self._sequence), reply))
+            self._changed.notify_all()
+        return len(data)
+
+    def _pump(self):
+        now = time.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            self._rx += self._pending.pop(0)[2]
+
+    def _wait(self, deadline) -> bool:
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            return False
+        if not self._pending:
+            if deadline is None:
+                # Nothing will ever arrive: don't block forever.
+                return False
+            self._changed.wait(deadline - now)
+        else:
+            wait = self._pending[0][0] - now
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            self._changed.wait(max(wait, 0))
+        return True
+
+    @property
+    def in_waiting(self) -> int:
+        with self._changed:
+            self._pump()
+            return len(self._rx)
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = None if self.timeout is None else \
+            time.monotonic() + self.timeout
+        with self._changed:
+            self._pump()
+            while len(self._rx) < size and self._wait(deadline):
+                self._pump()
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+            return data
+
+    def read_until(self, expected: bytes = b"\n", size=None) -> bytes:
+        deadline = None if self.timeout is None else \
+            time.monotonic() + self.timeout
+        with self._changed:
+            self._pump()
+            while expected not in self._rx and self._wait(deadline):
+                self._pump()
+            end = self._rx.find(expected)
+            end = len(self._rx) if end < 0 else end + len(expected)
+            data = bytes(self._rx[:end])
+            del self._rx[:end]
+            return data
+
+    def reset_input_buffer(self):
+        with self._changed:
+            self._pump()
+            del self._rx[:]
+
+    def close(self):
         pass
@@ -7,13 +7,32 @@
 
 """Tango server module for Omicron Laser."""
 
-from .omicron_laser import Omicron_laser
+import sys
+
+USAGE = """\
+usage: Omicron_laser instance_name [-v[trace_level]] [-nodb [-dlist <device name list>]]
+
+Tango device server of an Omicron laser. Device properties:
+  url             connection URL of the laser (ex: serial:///dev/ttyUSB0)
+  polling_period  seconds between two reads of the laser (default 0.5)"""
+
+
+def __getattr__(name):
+    # The device class pulls the whole tango stack: import it on demand.
+    if name == "Omicron_laser":
+        from .omicron_laser import Omicron_laser
+        return Omicron_laser
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name))
 
 
 def main():
-    import sys
+    if set(sys.argv[1:]) & {"-h", "--help", "-?"}:
+        print(USAGE)
+        return
     import logging
     import tango.server
+    from .omicron_laser import Omicron_laser
     args = ['Omicron_laser'] + sys.argv[1:]
     fmt = '%(asctime)s %(threadName)s %(levelname)s %(name)s %(message)s'
     logging.basicConfig(level=logging.INFO, format=fmt)
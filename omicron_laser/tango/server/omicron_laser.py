@@ -5,48 +5,310 @@
 # Copyright (c) 2021 Alberto López Sánchez
 # Distributed under the GNU General Public License v3. See LICENSE for more info.
 
-"""Tango server class for Omicron_laser"""
+"""Tango server class for Omicron_laser
 
-import serial
+A single poll loop refreshes a snapshot of the laser with one pipelined
+query per cycle. Attribute reads are served from that snapshot, so the
+serial traffic does not grow with the number of clients, and change/archive
+events are pushed whenever a value actually changes. A reply missing for
+``reply_timeout`` seconds fails the request and puts the device in UNKNOWN
+until the next successful poll.
+
+Reset and calibration take seconds: their commands only start them and
+return. The device is RUNNING meanwhile (polling goes on), at most
+``operation_timeout`` seconds, and the ``operation`` attribute reports the
+progress and the result.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from tango import AttrWriteType, DevState
 from tango.server import Device, attribute, command, device_property
 
-import omicron_laser.core
+from omicron_laser.aio import AsyncOmicronLaser
+from omicron_laser.core import LatchedFailure, Status
+
+
+# Queries refreshed every poll cycle, in a single write.
+POLL_QUERIES = (b"MDP", b"MTD", b"MTA", b"GAS", b"GLF", b"GLP", b"GOM")
+
+LEVEL_POWER_MAX = 0xFFF
+
+
+def snapshot_attribute(key, **kwargs):
+    """Read-only attribute served from the poll snapshot"""
+    def read(self):
+        return self._snapshot[key]
+    read.__name__ = "read_" + key
+    return attribute(fget=read, **kwargs)
 
 
 class Omicron_laser(Device):
 
     url = device_property(dtype=str)
+    polling_period = device_property(dtype=float, default_value=0.5)
+    operation_timeout = device_property(dtype=float, default_value=120.0)
+    reply_timeout = device_property(dtype=float, default_value=1.0)
+
+    async def init_device(self):
+        await super().init_device()
+        self._snapshot = {}
+        self._status = None
+        self._poll_task = None
+        self._operation = dict(name=None, running=False, elapsed=0.0,
+                               result=None, error=None)
+        self._operation_task = None
+        for name in self.snapshot_names():
+            self.set_change_event(name, True, False)
+            self.set_archive_event(name, True, False)
+        from connio import connection_for_url
+        self.connection = connection_for_url(self.url)
+        self.omicron_laser = AsyncOmicronLaser(self.connection,
+                                               timeout=self.reply_timeout)
+        await self.omicron_laser.initialize()
+        await self.poll()
+        self._poll_task = asyncio.ensure_future(self.poll_loop())
+
+    async def delete_device(self):
+        for task in (self._poll_task, self._operation_task):
+            if task is not None:
+                task.cancel()
+        connection = getattr(self, "connection", None)
+        if connection is not None:
+            try:
+                await connection.close()
+            except Exception:
+                logging.exception("Error closing %s", self.url)
+            self.connection = None
+        await super().delete_device()
+
+    @staticmethod
+    def snapshot_names():
+        names = ["diode_power", "temperature_diode", "temperature_ambient",
+                 "level_power", "status_word", "latched_failure_word",
+                 "operation_mode_word", "latched_failures"]
+        names.extend(name for name, _ in Status._fields)
+        names.extend(("auto_powerup", "auto_startup"))
+        return names
+
+    async def poll(self):
+        replies = await self.omicron_laser.query_many(POLL_QUERIES)
+        power, temp_diode, temp_ambient, status, failure, level, mode = replies
+        snapshot = dict(
+            diode_power=power,
+            temperature_diode=temp_diode,
+            temperature_ambient=temp_ambient,
+            level_power=100.0 * level / LEVEL_POWER_MAX,
+            status_word=int(status),
+            latched_failure_word=int(failure),
+            operation_mode_word=int(mode),
+            latched_failures=sorted(failure),
+            auto_powerup=mode.auto_powerup,
+            auto_startup=mode.auto_startup,
+        )
+        snapshot.update(status.to_dict())
+        self.update_snapshot(snapshot, status)
+
+    def update_snapshot(self, snapshot, status: Status):
+        previous, self._snapshot = self._snapshot, snapshot
+        for name, value in snapshot.items():
+            if previous.get(name) != value:
+                self.push_change_event(name, value)
+                self.push_archive_event(name, value)
+        self._status = status
+        self.update_state()
+
+    def update_state(self):
+        status = self._status
+        if self._operation["running"]:
+            state = DevState.RUNNING
+        elif status is None:
+            return
+        elif status.error:
+            state = DevState.FAULT
+        elif status.on:
+            state = DevState.ON
+        elif status.system_power:
+            state = DevState.STANDBY
+        else:
+            state = DevState.OFF
+        if state != self.get_state():
+            self.set_state(state)
+
+    async def poll_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.polling_period)
+
+    async def refresh(self):
+        """Poll right away; the state is UNKNOWN while the laser is silent"""
+        try:
+            await self.poll()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception("Error polling %s", self.url)
+            self.set_state(DevState.UNKNOWN)
+
+    async def execute(self, request, *args):
+        """
+        Send *request* and poll right away, so its effect (or the laser
+        not answering) is reflected without waiting a cycle
+        """
+        try:
+            return await request(*args)
+        finally:
+            await self.refresh()
+
+    def start_operation(self, name: str, run) -> bool:
+        """Start *run(progress)* in the background unless one is running"""
+        if self._operation["running"]:
+            return False
+        self._operation = dict(name=name, running=True, elapsed=0.0,
+                               result=None, error=None)
+        self._operation_task = asyncio.ensure_future(
+            self.run_operation(self._operation, run))
+        self.set_state(DevState.RUNNING)
+        return True
+
+    async def run_operation(self, operation: dict, run):
+        start = time.monotonic()
+
+        def progress(elapsed, raw):
+            operation["elapsed"] = elapsed
+
+        try:
+            operation["result"] = await asyncio.wait_for(
+                run(progress), self.operation_timeout)
+        except asyncio.TimeoutError:
+            logging.error("%s of %s timed out", operation["name"], self.url)
+            operation["error"] = "Did not complete within {}s".format(
+                self.operation_timeout)
+        except Exception as error:
+            logging.exception("Error in %s of %s", operation["name"], self.url)
+            operation["error"] = str(error)
+        finally:
+            operation["elapsed"] = time.monotonic() - start
+            operation["running"] = False
+            self.update_state()
+        await self.refresh()
+
+    ############################################################################
+
+    diode_power = snapshot_attribute(
+        "diode_power", dtype=float, unit="mW", label="Diode power")
+    temperature_diode = snapshot_attribute(
+        "temperature_diode", dtype=float, unit="degC", label="Diode temperature")
+    temperature_ambient = snapshot_attribute(
+        "temperature_ambient", dtype=float, unit="degC",
+        label="Ambient temperature")
+
+    status_word = snapshot_attribute("status_word", dtype=int)
+    latched_failure_word = snapshot_attribute("latched_failure_word", dtype=int)
+    operation_mode_word = snapshot_attribute("operation_mode_word", dtype=int)
+    latched_failures = snapshot_attribute(
+        "latched_failures", dtype=(str,), max_dim_x=len(LatchedFailure._fields))
+
+    error = snapshot_attribute("error", dtype=bool)
+    on = snapshot_attribute("on", dtype=bool, label="Laser on")
+    preheating = snapshot_attribute("preheating", dtype=bool)
+    attention_required = snapshot_attribute("attention_required", dtype=bool)
+    enabled_pin = snapshot_attribute("enabled_pin", dtype=bool)
+    key_switch = snapshot_attribute("key_switch", dtype=bool)
+    toggle_key = snapshot_attribute("toggle_key", dtype=bool)
+    system_power = snapshot_attribute("system_power", dtype=bool)
+    external_sensor_connected = snapshot_attribute(
+        "external_sensor_connected", dtype=bool)
+
+    @attribute(dtype=float, unit="%", label="Level power",
+               access=AttrWriteType.READ_WRITE, min_value=0, max_value=100)
+    def level_power(self):
+        return self._snapshot["level_power"]
+
+    @level_power.setter
+    async def level_power(self, value):
+        accepted = await self.execute(
+            self.omicron_laser.set_level_power,
+            int(round(value / 100.0 * LEVEL_POWER_MAX)))
+        if not accepted:
+            raise ValueError("Level power {}% rejected by the laser".format(value))
+
+    @attribute(dtype=bool, access=AttrWriteType.READ_WRITE)
+    def auto_powerup(self):
+        return self._snapshot["auto_powerup"]
+
+    @auto_powerup.setter
+    async def auto_powerup(self, value):
+        await self.execute(self.omicron_laser.set_auto_powerup, value)
+
+    @attribute(dtype=bool, access=AttrWriteType.READ_WRITE)
+    def auto_startup(self):
+        return self._snapshot["auto_startup"]
+
+    @auto_startup.setter
+    async def auto_startup(self, value):
+        await self.execute(self.omicron_laser.set_auto_startup, value)
+
+    @attribute(dtype=str)
+    def serial_number(self):
+        return self.omicron_laser.serial_number
+
+    @attribute(dtype=str)
+    def model(self):
+        return self.omicron_laser.model_code
+
+    @attribute(dtype=str)
+    def firmware_version(self):
+        return self.omicron_laser.firmware_version
+
+    @attribute(dtype=str, unit="nm")
+    def wavelength(self):
+        return self.omicron_laser.wavelength
+
+    @attribute(dtype=str)
+    def command_metrics(self):
+        """Per-command counters and latencies as JSON"""
+        return json.dumps(self.omicron_laser.metrics.snapshot())
 
-    def init_device(self):
-        super().init_device()
-        self.connection = serial.serial_for_url(self.url)
-        self.omicron_laser = omicron_laser.core.Omicron_laser(
-            self.connection)
+    @command(dtype_out=bool)
+    async def power_on(self):
+        return await self.execute(self.omicron_laser.power_on)
 
+    @command(dtype_out=bool)
+    async def power_off(self):
+        return await self.execute(self.omicron_laser.power_off)
 
-    
+    @command(dtype_out=bool)
+    async def laser_on(self):
+        return await self.execute(self.omicron_laser.laser_on)
 
-################################################################################
+    @command(dtype_out=bool)
+    async def laser_off(self):
+        return await self.execute(self.omicron_laser.laser_off)
 
-    @attribute(dtype=float, unit="bar", label="Pressure set point")
-    def pressure_setpoint(self):
-        # example processing the result
-        setpoint = self.omicron_laser.get_pressure_setpoint()
-        return setpoint / 1000
+    @attribute(dtype=str)
+    def operation(self):
+        """Last reset or calibration (name, running, elapsed, result) as JSON"""
+        return json.dumps(self._operation)
 
-    @pressure_setpoint.setter
-    def pressure_setpoint(self, value):
-        # example returning the coroutine back to tango
-        return self.omicron_laser.get_pressure_setpoint(value * 1000)
+    @command(dtype_out=bool)
+    async def reset(self):
+        """Start a reset; False if an operation is already running"""
+        return self.start_operation("reset", self.omicron_laser.reset)
 
-    @command
-    def turn_on(self):
-        # example returning the coroutine back to who calling function
-        return self.omicron_laser.turn_on()
+    @command(dtype_out=bool)
+    async def calibrate_laser_diode(self):
+        """Start a calibration; the result name ends in ``operation``"""
+        async def calibrate(progress):
+            result = await self.omicron_laser.calibrate_laser_diode(progress)
+            return result.name
+        return self.start_operation("calibrate_laser_diode", calibrate)
 
 
 if __name__ == "__main__":
-    import logging
     fmt = "%(asctime)s %(levelname)s %(name)s %(message)s"
     logging.basicConfig(level="DEBUG", format=fmt)
     Omicron_laser.run_server()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the Omicron Laser project
+#
+# Copyright (c) 2021 Alberto López Sánchez
+# Distributed under the GNU General Public License v3. See LICENSE for more info.
+
+"""
+Link tuning: adaptive read timeouts and baud rate probing.
+
+One serial timeout does not fit all commands: it is far too long for a fast
+query whose reply got lost and too short for a reset. With
+``Omicron_laser(conn, adaptive_timeout=True)`` each command gets its own
+timeout, a high percentile of its measured latency plus a margin, within
+the bounds of its class (see :data:`TIMEOUT_CLASSES`). Every timeout
+doubles the timeout of its command until the latency history catches up.
+"""
+
+import collections
+import math
+import time
+
+import serial
+
+from .core import EOL, encode_query
+
+
+# Initial, minimum and maximum timeout (s) of each command class.
+TIMEOUT_CLASSES = {
+    "query": (0.1, 0.005, 0.5),
+    "setpoint": (0.1, 0.005, 1.0),
+    "operation": (1.0, 0.05, 5.0),
+}
+
+COMMAND_CLASSES = {
+    b"SLP": "setpoint",
+    b"TPP": "setpoint",
+    b"SOM": "setpoint",
+    b"SAP": "setpoint",
+    b"SAS": "setpoint",
+    b"ARs": "setpoint",
+    b"POn": "setpoint",
+    b"POf": "setpoint",
+    b"LOn": "setpoint",
+    b"LOf": "setpoint",
+    b"RsC": "operation",
+    b"CLD": "operation",
+}
+
+
+class _Command:
+
+    __slots__ = ("latencies", "timeout", "pending")
+
+    def __init__(self, window: int, timeout: float):
+        self.latencies = collections.deque(maxlen=window)
+        self.timeout = timeout
+        self.pending = 0
+
+
+class AdaptiveTimeouts:
+    """
+    Per-command read timeouts learnt from the observed latencies.
+
+    The timeout of a command is ``percentile(latencies) * factor + margin``,
+    rounded up to the millisecond and clamped to its class bounds. It is
+    recomputed every *update* observations, once *min_samples* are known.
+    :meth:`observe` has the signature of a
+    :class:`~omicron_laser.metrics.CommandMetrics` ``on_response`` hook.
+    """
+
+    def __init__(self, percentile: float = 99.0, factor: float = 1.5,
+                 margin: float = 0.002, window: int = 256,
+                 min_samples: int = 20, update: int = 16,
+                 classes: dict = None):
+        self.percentile = percentile
+        self.factor = factor
+        self.margin = margin
+        self.window = window
+        self.min_samples = min_samples
+        self.update = update
+        self.classes = dict(TIMEOUT_CLASSES if classes is None else classes)
+        self._commands = {}
+
+    def _bounds(self, command: bytes) -> tuple:
+        return self.classes[COMMAND_CLASSES.get(command, "query")]
+
+    def _command(self, command: bytes) -> _Command:
+        entry = self._commands.get(command)
+        if entry is None:
+            entry = self._commands[command] = _Command(
+                self.window, self._bounds(command)[0])
+        return entry
+
+    def get(self, command: bytes) -> float:
+        """Current read timeout (s) for the reply to *command*"""
+        entry = self._commands.get(command)
+        return self._bounds(command)[0] if entry is None else entry.timeout
+
+    def observe(self, command: bytes, raw: bytes, latency: float,
+                outcome: str):
+        entry = self._command(command)
+        _, low, high = self._bounds(command)
+        if outcome == "timeout":
+            # Too tight: back off now and remember it for a while.
+            entry.timeout = min(entry.timeout * 2, high)
+            entry.latencies.append(entry.timeout)
+            entry.pending = 0
+            return
+        entry.latencies.append(latency)
+        entry.pending += 1
+        if entry.pending >= self.update and \
+                len(entry.latencies) >= self.min_samples:
+            entry.pending = 0
+            ordered = sorted(entry.latencies)
+            index = min(len(ordered) - 1,
+                        int(math.ceil(self.percentile / 100 * len(ordered))) - 1)
+            timeout = ordered[index] * self.factor + self.margin
+            entry.timeout = min(max(math.ceil(timeout * 1000) / 1000, low), high)
+
+    def info(self) -> dict:
+        """Current timeout and number of samples per command"""
+        return {command.decode("Latin1"): dict(timeout=entry.timeout,
+                                               samples=len(entry.latencies))
+                for command, entry in self._commands.items()}
+
+
+BAUDRATES = (500000, 460800, 230400, 115200, 57600, 38400, 19200, 9600)
+
+
+def probe_baudrate(url: str, baudrates=BAUDRATES, queries: int = 20,
+                   timeout: float = 0.5) -> dict:
+    """
+    Find the fastest baud rate the laser on *url* answers reliably.
+
+    Each baud rate (fastest first) is tried with *queries* ``?GSN`` round
+    trips; it is reliable if every reply is complete and identical.
+    Returns ``dict(recommended=baudrate or None, results={...})`` with the
+    errors and mean round trip (s) of each rate tried. Probing stops at the
+    first reliable rate.
+    """
+    results = {}
+    recommended = None
+    request = encode_query(b"GSN")
+    for baudrate in baudrates:
+        errors, elapsed = 0, 0.0
+        try:
+            conn = serial.serial_for_url(url, baudrate=baudrate,
+                                         timeout=timeout)
+        except (serial.SerialException, ValueError) as error:
+            results[baudrate] = dict(errors=queries, error=str(error))
+            continue
+        try:
+            conn.reset_input_buffer()
+            replies = []
+            for _ in range(queries):
+                start = time.perf_counter()
+                conn.write(request)
+                replies.append(conn.read_until(EOL))
+                elapsed += time.perf_counter() - start
+            errors = sum(not reply.startswith(b"!GSN") or
+                         not reply.endswith(EOL) or reply != replies[0]
+                         for reply in replies)
+        finally:
+            conn.close()
+        results[baudrate] = dict(errors=errors, mean=elapsed / queries)
+        if not errors:
+            recommended = baudrate
+            break
+    return dict(recommended=recommended, results=results)
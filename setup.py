@@ -24,6 +24,7 @@ requirements = [
 extra_requirements = {
     "tango": ["pytango"],
     "simulator": ["sinstruments>=1"],
+    "telemetry": ["numpy"],
 }
 if extra_requirements:
     extra_requirements["all"] = list(set.union(*(set(i) for i in extra_requirements.values())))
@@ -52,6 +53,7 @@ setup(
     entry_points={
         'console_scripts': [
             'Omicron_laser=omicron_laser.tango.server:main [tango]',
+            'omicron-laser=omicron_laser.cli:main',
         ],
     },
     install_requires=requirements,
@@ -0,0 +1,146 @@
+"""Shared fixtures for the omicron_laser tests."""
+
+import socketserver
+import threading
+
+import pytest
+
+
+REPLIES = {
+    b"?GFw|": [b"!GFwLuxX|1234|1.0.2\r"],
+    b"?GSN|": [b"!GSN203541\r"],
+    b"?GSI|": [b"!GSI405|100\r"],
+    b"?GMP|": [b"!GMP100\r"],
+    b"?GWH|": [b"!GWH00123:45\r"],
+    b"?MDP|": [b"!MDP12.5\r"],
+    b"?MTD|": [b"!MTD25.1\r"],
+    b"?MTA|": [b"!MTA22.4\r"],
+    b"?GAS|": [b"!GAS\x43\x02\r"],
+    b"?GFB|": [b"!GFB\x00\x00\r"],
+    b"?GLF|": [b"!GLF\x00\x02\r"],
+    b"?GLP|": [b"!GLP19\r"],
+    b"?SLP19|": [b"!SLP>\r", b"$TPP0.6|\r"],
+    b"?TPP|": [b"!TPP0.6\r"],
+    b"?TPP0.01|": [b"!TPP>\r", b"$TPP0.01|\r"],
+    b"?GOM|": [b"!GOM\x34\xe1\r"],
+    b"?SAP1|": [b"!SAP>\r"],
+    b"?SAS1|": [b"!SAS>\r"],
+    b"?ARs1|": [b"!ARs>\r"],
+    b"?POn|": [b"!POn>\r"],
+    b"?POf|": [b"!POf>\r"],
+    b"?LOn|": [b"!LOn>\r"],
+    b"?LOf|": [b"!LOf>\r"],
+    b"?RsC": [b"!RsC\r", b"\x00$RsC>\r"],
+    b"?CLD|": [b"!CLD>\r", b"!GCI0\r", b"$CLD0\r"],
+}
+
+
+class FakeSerial:
+    """Scripted stand-in for a pyserial port talking to a laser."""
+
+    def __init__(self, replies=None):
+        self.replies = dict(REPLIES if replies is None else replies)
+        self.written = []
+        self._rx = bytearray()
+
+    def write(self, data: bytes):
+        for frame in data.split(b"\r")[:-1]:
+            self.written.append(frame)
+            self._rx += b"".join(self.replies.get(frame, [b"!UK\r"]))
+        return len(data)
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._rx)
+
+    def read(self, size=1) -> bytes:
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def read_until(self, expected=b"\n") -> bytes:
+        end = self._rx.find(expected)
+        return self.read(len(self._rx) if end < 0 else end + len(expected))
+
+
+class AsyncFakeConnection:
+    """connio-like asyncio wrapper around FakeSerial."""
+
+    def __init__(self, replies=None):
+        self.serial = FakeSerial(replies)
+
+    async def write(self, data: bytes):
+        self.serial.write(data)
+
+    async def readline(self, eol=b"\n") -> bytes:
+        return self.serial.read_until(eol)
+
+
+@pytest.fixture
+def fake_serial():
+    return FakeSerial()
+
+
+@pytest.fixture
+def fake_connection():
+    return AsyncFakeConnection()
+
+
+class ThreadedFakeSerial(FakeSerial):
+    """FakeSerial whose reads block up to *timeout* like a real port."""
+
+    def __init__(self, replies=None, timeout=0.05):
+        super().__init__(replies)
+        self.timeout = timeout
+        self._data = threading.Condition()
+
+    def write(self, data: bytes):
+        with self._data:
+            super().write(data)
+            self._data.notify_all()
+        return len(data)
+
+    def read(self, size=1) -> bytes:
+        with self._data:
+            self._data.wait_for(lambda: len(self._rx) >= size, self.timeout)
+            return super().read(size)
+
+    def read_until(self, expected=b"\n") -> bytes:
+        with self._data:
+            self._data.wait_for(lambda: expected in self._rx, self.timeout)
+            if expected not in self._rx:
+                return self.read(len(self._rx))
+            return super().read_until(expected)
+
+
+@pytest.fixture
+def threaded_serial():
+    return ThreadedFakeSerial()
+
+
+@pytest.fixture
+def simulator_url():
+    """tcp:// URL of a simulated laser served from a background thread"""
+    simulator = pytest.importorskip("omicron_laser.simulator")
+    device = simulator.Omicron_laser("laser", reset_time=0.01,
+                                     calibration_time=0.01)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            pending = b""
+            while True:
+                data = self.request.recv(4096)
+                if not data:
+                    return
+                *lines, pending = (pending + data).split(b"\r")
+                for line in lines:
+                    for _, reply in device.process(line):
+                        self.request.sendall(reply + b"\r")
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "tcp://127.0.0.1:{}".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
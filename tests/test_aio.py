@@ -0,0 +1,115 @@
+"""Tests for `omicron_laser.aio`."""
+
+import asyncio
+
+from omicron_laser import aio
+from omicron_laser.aio import AsyncOmicronLaser
+from omicron_laser.core import CalibrationResult
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_initialize(fake_connection):
+    laser = AsyncOmicronLaser(fake_connection)
+    run(laser.initialize())
+    assert laser.model_code == "LuxX"
+    assert laser.serial_number == "203541"
+    assert laser.wavelength == "405"
+
+
+def test_concurrent_queries_do_not_interleave(fake_connection):
+    laser = AsyncOmicronLaser(fake_connection)
+
+    async def sweep():
+        return await asyncio.gather(
+            laser.measure_diode_power(),
+            laser.measure_temperature_diode(),
+            laser.measure_temperature_ambient(),
+            laser.get_level_power(),
+        )
+
+    assert run(sweep()) == [12.5, 25.1, 22.4, 0x19]
+
+
+def test_set_level_power_consumes_adhoc(fake_connection):
+    laser = AsyncOmicronLaser(fake_connection)
+    assert run(laser.set_level_power(25))
+    assert run(laser.get_level_power()) == 0x19
+    assert laser.temporal_power == 0.6
+
+
+def test_nul_prefixed_adhoc_is_skipped(fake_connection):
+    # Completion of a reset cancelled earlier, read before the next reply.
+    fake_connection.serial._rx += b"\x00$RsC>\r"
+    laser = AsyncOmicronLaser(fake_connection)
+    assert run(laser.measure_diode_power()) == 12.5
+
+
+def test_status_and_calibration(fake_connection):
+    laser = AsyncOmicronLaser(fake_connection)
+    status = run(laser.get_status())
+    assert status.error and status.on and status.enabled_pin
+    assert status.system_power
+    assert run(laser.calibrate_laser_diode()) is CalibrationResult.SUCCESS
+    assert run(laser.reset())
+
+
+def test_queries_run_during_calibration(fake_connection):
+    laser = AsyncOmicronLaser(fake_connection)
+
+    async def both():
+        return await asyncio.gather(laser.calibrate_laser_diode(),
+                                    laser.measure_diode_power())
+    # The query reads past the calibration frames and hands $CLD over.
+    assert run(both()) == [CalibrationResult.SUCCESS, 12.5]
+
+
+def test_slow_frames_are_not_cut(fake_connection, monkeypatch):
+    async def trickle(eol=b"\n") -> bytes:
+        # connio-like: the frame is collected one byte at a time.
+        line = bytearray()
+        while not line.endswith(eol):
+            await asyncio.sleep(0.02)
+            line += fake_connection.serial.read(1)
+        return bytes(line)
+
+    fake_connection.readline = trickle
+    monkeypatch.setattr(aio, "WAIT_STEP", 0.05)
+    laser = AsyncOmicronLaser(fake_connection)
+    result = run(asyncio.wait_for(laser.calibrate_laser_diode(), 5))
+    assert result is CalibrationResult.SUCCESS
+
+
+def test_lost_reply_times_out(fake_connection):
+    async def readline(eol=b"\n") -> bytes:
+        # connio-like: wait for the frame, one byte at a time.
+        line = bytearray()
+        while not line.endswith(eol):
+            data = fake_connection.serial.read(1)
+            if not data:
+                await asyncio.sleep(0.01)
+            line += data
+        return bytes(line)
+
+    async def reset_input_buffer():
+        fake_connection.serial.read(fake_connection.serial.in_waiting)
+
+    fake_connection.readline = readline
+    fake_connection.reset_input_buffer = reset_input_buffer
+    fake_connection.serial.replies[b"?MDP|"] = [b"!MDP1"]
+    laser = AsyncOmicronLaser(fake_connection, timeout=0.1)
+
+    async def main():
+        try:
+            await laser.measure_diode_power()
+        except TimeoutError:
+            pass
+        else:
+            raise AssertionError("a lost reply must time out")
+        # The partial frame was dropped: the next reply is read whole.
+        return await laser.measure_temperature_diode()
+
+    assert run(asyncio.wait_for(main(), 5)) == 25.1
+    assert laser.metrics.snapshot()["MDP"]["timeout"] == 1
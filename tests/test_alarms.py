@@ -0,0 +1,70 @@
+"""Tests for `omicron_laser.alarms`."""
+
+import numpy
+import pytest
+
+from omicron_laser.alarms import (AlarmEngine, BitTransition, Event,
+                                  PowerBelowSetpoint, RateOfChange, Threshold,
+                                  default_rules)
+from omicron_laser.archive import Archive, ArchiveWriter
+from omicron_laser.core import LatchedFailure, Status
+
+
+def batch(**fields):
+    return {name: numpy.asarray(values) for name, values in fields.items()}
+
+
+def test_threshold_edges_across_batches():
+    engine = AlarmEngine([Threshold("hot", "temperature_diode", high=30)])
+    events = engine.process(batch(time=[0, 1, 2, 3],
+                                  temperature_diode=[25, 31, 32, 29]))
+    assert events == [Event(1.0, "hot", True, 31), Event(3.0, "hot", False, 29)]
+    assert engine.process(batch(time=[4, 5], temperature_diode=[35, 36])) == \
+        [Event(4.0, "hot", True, 35)]
+    assert engine.active() == ["hot"]
+    assert engine.process(batch(time=[6], temperature_diode=[36])) == []
+
+
+def test_rate_of_change_window():
+    rule = RateOfChange("drift", "temperature_ambient", limit=0.04, window=10)
+    engine = AlarmEngine([rule])
+    times = numpy.arange(0, 20.0)
+    values = numpy.where(times < 10, 20.0, 20.0 + 0.5 * (times - 9))
+    first = engine.process(batch(time=times[:12], temperature_ambient=values[:12]))
+    assert [(e.time, e.active) for e in first] == [(10.0, True)]
+    assert first[0].value == pytest.approx(0.05)
+    assert engine.process(batch(time=times[12:], temperature_ambient=values[12:])) == []
+
+
+def test_power_below_setpoint_only_when_on():
+    on = Status.on.mask
+    engine = AlarmEngine([PowerBelowSetpoint("low", max_power=100)])
+    events = engine.process(batch(
+        time=[0, 1, 2, 3], diode_power=[50, 40, 40, 50],
+        level_power=[0x7FF] * 4, status=[on, on, 0, on]))
+    assert [(e.time, e.active) for e in events] == [(1.0, True), (2.0, False)]
+
+
+def test_bit_transitions():
+    error, on = Status.error.mask, Status.on.mask
+    engine = AlarmEngine([BitTransition("status", "status", Status)])
+    assert engine.process(batch(time=[0, 1], status=[on, on])) == []
+    events = engine.process(batch(time=[2, 3], status=[on | error, 0]))
+    assert events == [Event(2.0, "status.error", True, on | error),
+                      Event(3.0, "status.error", False, 0),
+                      Event(3.0, "status.on", False, 0)]
+
+
+def test_default_rules_on_archive(tmp_path):
+    path = tmp_path / "laser.oma"
+    with ArchiveWriter(path) as writer:
+        for t in range(5):
+            failure = LatchedFailure.diode_temp.mask if t == 3 else 0
+            writer.append(t, 10.0, 25.0 + 10 * (t == 3), 22.0,
+                          Status.on.mask, 0, failure)
+    engine = AlarmEngine(default_rules(max_power=20, level_power=0xFFF))
+    events = engine.process(Archive(path).range())
+    names = {(event.rule, event.active) for event in events}
+    assert ("power_below_setpoint", True) in names
+    assert ("latched_failure.diode_temp", True) in names
+    assert ("diode_temperature_drift", True) in names
@@ -0,0 +1,63 @@
+"""Tests for `omicron_laser.archive`."""
+
+import numpy
+import pytest
+
+from omicron_laser.archive import Archive, ArchiveWriter, index_path
+from omicron_laser.core import Omicron_laser
+
+
+def fill(path, times, chunk_size=4):
+    with ArchiveWriter(path, chunk_size=chunk_size) as writer:
+        for t in times:
+            writer.append(t, t / 10, 25.0, 22.5, 0x0243, 0, 0)
+
+
+def test_range_views(tmp_path):
+    path = tmp_path / "laser.oma"
+    fill(path, range(10))
+    archive = Archive(path)
+    assert len(archive) == 10
+    assert list(archive.index) == [0, 4, 8]
+    records = archive.range(3, 9)
+    assert isinstance(records, numpy.memmap)
+    assert list(records["time"]) == [3, 4, 5, 6, 7, 8]
+    times, power = archive.column("diode_power", 8.5)
+    assert list(times) == [9]
+    assert power[0] == pytest.approx(0.9)
+    assert len(archive.range(20)) == 0
+    assert len(archive.range(None, -1)) == 0
+    assert list(archive.range()["status"]) == [0x0243] * 10
+
+
+def test_reopen_and_append(tmp_path):
+    path = tmp_path / "laser.oma"
+    fill(path, range(6))
+    with open(path, "ab") as file:
+        file.write(b"\x01\x02")      # half written record
+    fill(path, range(6, 9), chunk_size=1000)   # chunk size kept from header
+    archive = Archive(path)
+    assert list(archive.range()["time"]) == list(range(9))
+    assert list(archive.index) == [0, 4, 8]
+    with pytest.raises(ValueError):
+        fill(path, [1])
+
+
+def test_index_rebuilt(tmp_path):
+    path = tmp_path / "laser.oma"
+    fill(path, range(9))
+    open(index_path(path), "wb").close()
+    assert list(Archive(path).range(5, 7)["time"]) == [5, 6]
+    fill(path, [9])
+    assert list(Archive(path).index) == [0, 4, 8]
+
+
+def test_sample_laser(tmp_path, fake_serial):
+    laser = Omicron_laser(fake_serial)
+    path = tmp_path / "laser.oma"
+    with ArchiveWriter(path) as writer:
+        writer.sample(laser, timestamp=100.0)
+    record = Archive(path).range()[0]
+    assert record["time"] == 100.0
+    assert record["diode_power"] == pytest.approx(laser.measure_diode_power())
+    assert record["status"] == int(laser.get_status())
@@ -0,0 +1,16 @@
+"""Smoke tests for the benchmark suite."""
+
+import json
+
+from benchmarks import bench_core
+
+
+def test_benchmarks_report(tmp_path):
+    output = tmp_path / "bench.json"
+    bench_core.main(["--iterations", "5", "--timeout", "0.001",
+                     "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert set(report["results"]) == set(bench_core.BENCHMARKS)
+    for result in report["results"].values():
+        assert result["p50"] <= result["p99"] <= result["max"]
+        assert result["rate"] > 0
@@ -0,0 +1,94 @@
+"""Tests for `omicron_laser.cache`."""
+
+import pytest
+
+from omicron_laser.cache import TTLCache
+from omicron_laser.core import DEFAULT_CACHE_TTL, Omicron_laser
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry():
+    clock = Clock()
+    cache = TTLCache({b"GLP": 5}, clock=clock)
+    cache.put(b"GLP", b"!GLP19\r")
+    cache.put(b"MDP", b"!MDP1\r")
+    assert cache.get(b"GLP") == b"!GLP19\r"
+    assert cache.get(b"MDP") is None
+    clock.now = 6
+    assert cache.get(b"GLP") is None
+    assert cache.info() == dict(hits=1, misses=1, size=1)
+
+
+def test_bad_replies_are_not_cached():
+    cache = TTLCache({b"GLP": 5, b"GMP": float("inf")})
+    cache.put(b"GLP", b"")
+    cache.put(b"GMP", b"!UK\r")
+    cache.put(b"GMP", b"!GMPx\r")
+    assert cache.info()["size"] == 0
+
+
+@pytest.fixture
+def laser(fake_serial):
+    return Omicron_laser(fake_serial, cache_ttl=DEFAULT_CACHE_TTL)
+
+
+def test_cached_queries_skip_the_link(laser, fake_serial):
+    assert laser.get_maximum_power() == 100
+    assert laser.get_level_power() == 0x19
+    assert laser.get_level_power() == 0x19
+    assert fake_serial.written.count(b"?GMP|") == 1
+    assert fake_serial.written.count(b"?GLP|") == 1
+    assert laser.cache_info()["hits"] == 2
+
+
+def test_timeout_is_not_cached(laser, fake_serial):
+    replies = fake_serial.replies
+    good, replies[b"?GLP|"] = replies[b"?GLP|"], []
+    with pytest.raises(ValueError):
+        laser.get_level_power()
+    replies[b"?GLP|"] = good
+    assert laser.get_level_power() == 0x19
+
+
+def test_setter_invalidates(laser, fake_serial):
+    laser.get_level_power()
+    laser.set_level_power(25)
+    laser.get_level_power()
+    assert fake_serial.written.count(b"?GLP|") == 2
+
+
+def test_query_many_sends_only_misses(laser, fake_serial):
+    laser.get_level_power()
+    del fake_serial.written[:]
+    assert laser.query_many([b"MDP", b"GLP", b"GMP"]) == [12.5, 0x19, 100]
+    assert fake_serial.written == [b"?MDP|"]
+
+
+def test_reset_clears(laser, fake_serial):
+    laser.get_level_power()
+    laser.reset()
+    laser.get_level_power()
+    assert fake_serial.written.count(b"?GLP|") == 2
+
+
+def test_setter_during_query_is_not_overwritten(laser, fake_serial):
+    transaction = laser._transaction
+
+    def racing_transaction(frame, priority):
+        raw = transaction(frame, priority)
+        if frame == b"?GLP|\r":
+            # Another thread changes the level while the reply is on its way.
+            laser.set_level_power(25)
+        return raw
+
+    laser._transaction = racing_transaction
+    laser.get_level_power()
+    del laser._transaction
+    laser.get_level_power()
+    assert fake_serial.written.count(b"?GLP|") == 2
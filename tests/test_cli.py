@@ -0,0 +1,53 @@
+"""Tests for `omicron_laser.cli`."""
+
+import csv
+import io
+import json
+import queue
+import threading
+
+from omicron_laser import cli
+from omicron_laser.core import Omicron_laser
+
+
+def test_monitor_csv(simulator_url, capsys):
+    url = simulator_url.replace("tcp://", "socket://")
+    assert cli.main(["monitor", url, url, "-n", "3", "-c", "MDP", "-c", "GAS"]) == 0
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+    assert len(rows) == 6
+    assert list(rows[0]) == ["time", "port", "diode_power", "error", "on",
+                             "preheating", "attention_required", "enabled_pin",
+                             "key_switch", "toggle_key", "system_power",
+                             "external_sensor_connected"]
+    assert rows[0]["port"] == url
+    assert rows[0]["system_power"] == "True"
+
+
+def test_monitor_json(simulator_url, capsys):
+    url = simulator_url.replace("tcp://", "socket://")
+    assert cli.main(["monitor", url, "-n", "2", "--format", "json"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    sample = json.loads(lines[0])
+    assert set(sample) == set(cli.columns(cli.CHANNELS))
+    assert isinstance(sample["temperature_diode"], float)
+    assert sample["failure"] == 0
+
+
+def test_monitor_bad_port(capsys):
+    assert cli.main(["monitor", "/dev/does-not-exist"]) == 1
+
+
+def test_backpressure(fake_serial):
+    laser = Omicron_laser(fake_serial)
+    rows, stop = queue.Queue(maxsize=2), threading.Event()
+    thread = threading.Thread(target=cli.poll,
+                              args=("fake", laser, ["MDP"], rows, stop))
+    thread.start()
+    thread.join(0.2)
+    # The poller waits for the writer instead of queueing more rows.
+    assert thread.is_alive() and rows.full()
+    stop.set()
+    while thread.is_alive():
+        rows.get()
+        thread.join(0.2)
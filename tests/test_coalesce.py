@@ -0,0 +1,69 @@
+"""Tests for `omicron_laser.coalesce` and thread-safety of Omicron_laser."""
+
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from omicron_laser.coalesce import SingleFlight
+from omicron_laser.core import Omicron_laser
+from omicron_laser.simulator import Loopback
+from omicron_laser.simulator import Omicron_laser as Simulator
+
+
+def test_single_flight_shares_result_and_error():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 42
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(flights.do, "key", slow)
+        started.wait()
+        followers = [executor.submit(flights.do, "key", slow) for _ in range(3)]
+        while flights.coalesced < 3:
+            time.sleep(0.001)
+        release.set()
+        assert [f.result() for f in [leader] + followers] == [42] * 4
+    assert calls == [1]
+
+    with pytest.raises(ZeroDivisionError):
+        flights.do("key", lambda: 1 / 0)
+
+
+@pytest.fixture
+def loopback():
+    return Loopback(Simulator("laser", latency=0.02), timeout=1)
+
+
+def test_concurrent_queries_are_coalesced(loopback):
+    laser = Omicron_laser(loopback)
+    written = []
+    write = loopback.write
+    loopback.write = lambda data: written.append(data) or write(data)
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: laser.get_status(), range(8)))
+
+    assert all(status == results[0] for status in results)
+    assert len(written) < 8
+
+
+def test_concurrent_mixed_queries_do_not_interleave(loopback):
+    laser = Omicron_laser(loopback)
+    calls = [laser.get_level_power, laser.get_maximum_power,
+             laser.get_working_hours, laser.get_operation_mode] * 4
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda call: call(), calls))
+
+    assert results[0] == 0
+    assert results[1] == 100.0
+    assert results[2] == "00000:00"
+    assert all(results[i] == results[i % 4] for i in range(len(calls)))
@@ -0,0 +1,143 @@
+"""Tests for `Omicron_laser.configure`, `snapshot` and `restore`."""
+
+import json
+import threading
+import time
+
+import pytest
+
+from omicron_laser.core import Omicron_laser, OperationMode, Settings
+from omicron_laser.scheduler import CONTROL
+from omicron_laser.simulator import Loopback
+from omicron_laser.simulator import Omicron_laser as Simulator
+
+
+@pytest.fixture
+def device():
+    return Simulator("laser")
+
+
+@pytest.fixture
+def conn(device):
+    conn = Loopback(device, timeout=0.05)
+    conn.written = []
+    write = conn.write
+
+    def spy(data):
+        conn.written.append(data)
+        return write(data)
+    conn.write = spy
+    return conn
+
+
+@pytest.fixture
+def laser(conn):
+    laser = Omicron_laser(conn)
+    laser.get_operation_mode()
+    conn.written.clear()
+    return laser
+
+
+def test_flags_only_changes(laser, conn, device):
+    assert laser.configure(auto_startup=False, auto_reset=True)
+    assert conn.written == [b"?SAS0|\r?ARs1|\r?GOM|\r"]
+    assert not device.operation_mode & OperationMode.auto_startup.mask
+    assert not laser.operation_mode.auto_startup
+
+    # Nothing changes: only the mode is read back.
+    conn.written.clear()
+    assert laser.configure(auto_startup=False, auto_reset=True,
+                           auto_powerup=True)
+    assert conn.written == [b"?GOM|\r"]
+
+
+def test_stale_known_mode(laser, conn, device):
+    # Changed behind our back: the known mode says there is nothing to do.
+    device.operation_mode &= ~OperationMode.auto_startup.mask
+    assert laser.configure(auto_startup=True)
+    assert conn.written == [b"?GOM|\r", b"?SAS1|\r?GOM|\r"]
+    assert device.operation_mode & OperationMode.auto_startup.mask
+
+
+def test_configure_while_mode_query_waits(laser):
+    # A GOM query queued behind configure must not deadlock it.
+    laser._known_mode = None
+    results = []
+
+    def configure():
+        with laser._scheduler.slot(CONTROL):
+            query = threading.Thread(target=laser.get_operation_mode,
+                                     daemon=True)
+            query.start()
+            time.sleep(0.05)
+            results.append(laser.configure(auto_powerup=False))
+
+    thread = threading.Thread(target=configure, daemon=True)
+    thread.start()
+    thread.join(2)
+    assert results == [True]
+
+
+def test_mode_change_uses_single_som(laser, conn, device):
+    assert laser.configure(usb_adhoc_mode=False, auto_powerup=False)
+    assert len(conn.written) == 1
+    assert conn.written[0].startswith(b"?SOM")
+    assert conn.written[0].endswith(b"?GOM|\r")
+    assert device.operation_mode == laser.operation_mode.word
+    assert not laser.operation_mode.usb_adhoc_mode
+
+
+def test_update_operation_mode_sends_diff(laser, conn):
+    laser.operation_mode.auto_powerup = False
+    assert laser.update_operation_mode()
+    assert conn.written == [b"?SAP0|\r?GOM|\r"]
+
+
+def test_verification_failure(laser, device):
+    # The laser ignores the request: read back does not match.
+    device.operation_mode |= OperationMode.usb_adhoc_mode.mask
+    laser.get_operation_mode()
+    original = device.process
+
+    def ignore_som(line):
+        return original(b"?GOM|" if line.startswith(b"?SOM") else line)
+    device.process = ignore_som
+    assert not laser.configure(usb_adhoc_mode=False)
+    assert laser.operation_mode.usb_adhoc_mode
+
+
+def test_unknown_flag(laser):
+    with pytest.raises(ValueError):
+        laser.configure(turbo=True)
+
+
+def test_snapshot_restore(laser, conn, device):
+    assert laser.set_level_power(0x800)
+    assert laser.configure(usb_adhoc_mode=False, auto_reset=True)
+    settings = laser.snapshot()
+    assert settings.serial_number == device.serial_number
+    assert settings.level_power == 0x800
+    assert settings.temporary_power == pytest.approx(50, abs=0.1)
+    assert settings.auto_reset is True
+    assert settings == Settings(**json.loads(json.dumps(settings._asdict())))
+
+    # Controller swap: factory settings and a new client.
+    device.level_power, device.temporary_power = 0, 0.0
+    device.operation_mode = 0xE034
+    laser = Omicron_laser(conn)
+    conn.written.clear()
+    assert laser.restore(settings)
+    # One read of the live settings and one batch of changes + read back.
+    assert len(conn.written) == 2
+    assert laser.snapshot() == settings
+
+    conn.written.clear()
+    assert laser.restore(settings)
+    assert len(conn.written) == 1
+
+
+def test_restore_other_laser(laser):
+    settings = laser.snapshot()._replace(serial_number="000000")
+    assert laser.restore(settings)
+    with pytest.raises(ValueError):
+        laser.restore(settings, strict=True)
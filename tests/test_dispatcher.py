@@ -0,0 +1,65 @@
+"""Tests for `omicron_laser.dispatcher`."""
+
+import time
+
+import pytest
+
+from omicron_laser.core import CalibrationResult, Omicron_laser
+from omicron_laser.dispatcher import Dispatcher
+
+
+@pytest.fixture
+def laser(threaded_serial):
+    laser = Omicron_laser(threaded_serial, dispatcher=True)
+    yield laser
+    laser.stop_dispatcher()
+
+
+def test_setpoint_skips_drain_timeout(laser, threaded_serial):
+    threaded_serial.timeout = 1
+    start = time.monotonic()
+    assert laser.set_level_power(25)
+    assert time.monotonic() - start < 0.5
+    assert laser.measure_diode_power() == 12.5
+
+
+def test_adhoc_callbacks(laser):
+    frames = []
+    laser.add_adhoc_callback(frames.append)
+    assert laser.set_temporary_power(0.01)
+    assert laser.get_level_power() == 0x19
+    assert frames == [b"$TPP0.01|\r"]
+    assert laser.temporal_power == 0.01
+
+
+def test_long_operations(laser):
+    assert laser.calibrate_laser_diode() is CalibrationResult.SUCCESS
+    assert laser.reset()
+    assert laser.get_level_power() == 0x19
+
+
+class BrokenPort:
+    timeout = 0.01
+
+    def __init__(self):
+        self.reads = 0
+
+    def read_until(self, expected=b"\n") -> bytes:
+        self.reads += 1
+        raise OSError("device disconnected")
+
+
+def test_port_failure_stops_and_fails_requests():
+    port = BrokenPort()
+    dispatcher = Dispatcher(port)
+    waiter = dispatcher.expect(b"$RsC")
+    dispatcher.start()
+    dispatcher.join(1)
+    assert not dispatcher.is_alive()
+    assert port.reads == 1
+    assert isinstance(waiter.get(timeout=1), ConnectionError)
+    with pytest.raises(ConnectionError):
+        dispatcher.readline(timeout=1)
+    with pytest.raises(ConnectionError):
+        dispatcher.readline(timeout=1)
+    assert isinstance(dispatcher.expect(b"$CLD").get_nowait(), ConnectionError)
@@ -0,0 +1,44 @@
+"""Tests for the Status, LatchedFailure and OperationMode bitfields."""
+
+import numpy
+import pytest
+
+from omicron_laser.core import LatchedFailure, OperationMode, Status, pack_word
+
+
+def test_status_decoding():
+    status = Status(b"\x43\x02")
+    assert status.error and status.on and status.enabled_pin
+    assert not status.preheating and not status.key_switch
+    assert status.system_power and not status.toggle_key
+    assert int(status) == 0x0243
+    assert set(status) == {"error", "on", "enabled_pin", "system_power"}
+    assert status.to_dict()["on"] is True
+
+
+def test_equality_and_diff():
+    before = LatchedFailure(b"\x00\x02")
+    after = LatchedFailure(b"\x01\x02")
+    assert before == LatchedFailure(b"\x00\x02")
+    assert before != after
+    assert list(before ^ after) == ["error_state"]
+    assert Status.from_int(0x0243) == Status(b"\x43\x02")
+    assert Status.from_int(1) != LatchedFailure.from_int(1)
+
+
+def test_operation_mode_is_mutable():
+    mode = OperationMode(b"\x34\xe1")
+    assert mode.usb_adhoc_mode and mode.auto_powerup
+    mode.usb_adhoc_mode = False
+    assert not mode.usb_adhoc_mode
+    assert bytes(mode) == b"c134"
+    with pytest.raises(AttributeError):
+        mode.unknown = True
+
+
+def test_decode_array():
+    words = numpy.array([pack_word(b"\x43\x02"), 0, 0x0080], dtype=numpy.uint16)
+    columns = Status.decode_array(words)
+    assert list(columns["on"]) == [True, False, False]
+    assert list(columns["key_switch"]) == [False, False, True]
+    assert set(columns) == set(Status(b"\x00\x00").to_dict())
@@ -0,0 +1,76 @@
+"""Tests for `omicron_laser.fleet`."""
+
+import threading
+import time
+
+from omicron_laser.core import Omicron_laser
+from omicron_laser.fleet import LaserGroup
+from omicron_laser.simulator import Loopback
+from omicron_laser.simulator import Omicron_laser as Simulator
+
+
+def make_group(count, latency=0.0, timeout=None):
+    lasers = {
+        "laser{}".format(i): Omicron_laser(
+            Loopback(Simulator("laser{}".format(i), latency=latency)))
+        for i in range(count)}
+    return LaserGroup(lasers, timeout=timeout)
+
+
+def test_fan_out_runs_in_parallel():
+    group = make_group(8, latency=0.02)
+    start = time.monotonic()
+    results = group.laser_off()
+    elapsed = time.monotonic() - start
+    assert set(results) == set(group.lasers)
+    assert all(result.ok and result.value for result in results.values())
+    assert elapsed < 8 * 0.02
+    group.close()
+
+
+def test_per_device_errors_and_timeouts():
+    group = make_group(2, timeout=0.05)
+    group["laser1"]._conn.device.latency = 0.5
+    results = group.call("get_level_power")
+    assert results["laser0"].ok and results["laser0"].value == 0
+    assert isinstance(results["laser1"].error, TimeoutError)
+
+    results = group.map(lambda laser: laser.get_status().system_power)
+    assert results["laser0"].value is True
+    group.close()
+
+
+def test_hung_laser_does_not_hold_up_the_others():
+    group = make_group(2, timeout=0.05)
+    group["laser1"]._conn.device.latency = 0.3
+    assert isinstance(group.get_level_power()["laser1"].error, TimeoutError)
+
+    # laser1 queues the call behind the previous one; laser0 is unaffected.
+    start = time.monotonic()
+    results = group.get_level_power()
+    assert time.monotonic() - start < 0.1
+    assert results["laser0"].ok
+    assert isinstance(results["laser1"].error, TimeoutError)
+
+    group["laser1"]._conn.device.latency = 0.0
+    time.sleep(1)
+    assert group.get_level_power()["laser1"].ok
+    group.close()
+
+
+def test_laser_off_during_calibration():
+    lasers = {"laser": Omicron_laser(Loopback(
+        Simulator("laser", calibration_time=0.5), timeout=0.02))}
+    group = LaserGroup(lasers, timeout=0.2)
+    device = lasers["laser"]._conn.device
+    assert group.laser_on()["laser"].value
+    assert device.emitting
+
+    calibration = threading.Thread(target=group.calibrate_laser_diode)
+    calibration.start()
+    time.sleep(0.05)
+    result = group.laser_off()["laser"]
+    assert result.ok and result.value
+    assert not device.emitting
+    calibration.join()
+    group.close()
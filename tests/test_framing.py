@@ -0,0 +1,61 @@
+"""Tests for `omicron_laser.framing`."""
+
+from omicron_laser.core import Omicron_laser
+from omicron_laser.framing import FrameReader
+
+
+class ChunkedSerial:
+    """Port delivering its data in the given chunks, one per read."""
+
+    def __init__(self, *chunks):
+        self.chunks = list(chunks)
+        self.reads = 0
+
+    @property
+    def in_waiting(self) -> int:
+        return 0
+
+    def read(self, size=1) -> bytes:
+        self.reads += 1
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+def test_frames_read_together(fake_serial):
+    fake_serial._rx += b"!MDP1.5\r$TPP2\r!MTD30|x\r"
+    reader = FrameReader(fake_serial)
+    assert reader.readline() == b"!MDP1.5\r"
+    assert fake_serial.in_waiting == 0
+    assert reader.in_waiting == 15
+    assert reader.read_frame(lambda frame: frame[:4].tobytes()) == b"$TPP"
+    assert reader.read_until(b"\r") == b"!MTD30|x\r"
+
+
+def test_frame_split_across_reads():
+    conn = ChunkedSerial(b"!MD", b"P42.25\r!MT", b"A20\r\x00$Rs", b"C>\r")
+    reader = FrameReader(conn)
+    assert reader.read_frame(lambda frame: float(frame[4:-1])) == 42.25
+    assert reader.readline() == b"!MTA20\r"
+    assert reader.readline() == b"\x00$RsC>\r"
+    assert conn.reads == 4
+
+
+def test_timeout_returns_partial_frame():
+    reader = FrameReader(ChunkedSerial(b"!GA"))
+    assert reader.readline() == b"!GA"
+    assert reader.readline() == b""
+
+
+def test_buffer_compaction():
+    conn = ChunkedSerial(*[b"!MDP1\r"] * 1000)
+    reader = FrameReader(conn)
+    reader.COMPACT_SIZE = 64
+    for _ in range(1000):
+        assert reader.readline() == b"!MDP1\r"
+    assert len(reader._buffer) <= 64 + 6
+
+
+def test_laser_reads_through_frame_reader(fake_serial):
+    laser = Omicron_laser(fake_serial)
+    assert isinstance(laser._reader, FrameReader)
+    assert laser.measure_diode_power() == float(fake_serial.replies[b"?MDP|"][0][4:-1])
+    assert laser.get_level_power() == int(fake_serial.replies[b"?GLP|"][0][4:-1], 16)
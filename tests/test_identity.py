@@ -0,0 +1,54 @@
+"""Tests for the Omicron_laser handshake modes and `omicron_laser.identity`."""
+
+import pytest
+
+from omicron_laser.core import Omicron_laser
+
+
+def test_pipelined_handshake(fake_serial):
+    writes = []
+    write = fake_serial.write
+    fake_serial.write = lambda data: writes.append(data) or write(data)
+    laser = Omicron_laser(fake_serial, handshake="pipelined")
+    assert len(writes) == 1
+    assert laser.model_code == "LuxX"
+    assert laser.max_power == ["100"]
+
+
+def test_lazy_handshake(fake_serial):
+    laser = Omicron_laser(fake_serial, handshake="lazy")
+    assert fake_serial.written == []
+    assert laser.wavelength == "405"
+    assert laser.serial_number == "203541"
+    assert fake_serial.written == [b"?GFw|", b"?GSN|", b"?GSI|", b"?GMP|"]
+    with pytest.raises(AttributeError):
+        laser.unknown
+
+
+def test_lazy_handshake_retries(fake_serial):
+    write = fake_serial.write
+
+    def unplugged(data):
+        raise OSError("device disconnected")
+    fake_serial.write = unplugged
+    laser = Omicron_laser(fake_serial, handshake="lazy")
+    with pytest.raises(OSError):
+        laser.wavelength
+    fake_serial.write = write
+    assert laser.wavelength == "405"
+
+
+def test_identity_cache(fake_serial, tmp_path):
+    path = str(tmp_path / "identity.json")
+    first = Omicron_laser(fake_serial, identity_cache=path)
+    assert fake_serial.written.count(b"?GSN|") == 1
+    del fake_serial.written[:]
+    second = Omicron_laser(fake_serial, identity_cache=path)
+    assert fake_serial.written == [b"?GSN|"]
+    assert second.firmware_version == first.firmware_version == "1.0.2"
+    assert second.max_power == first.max_power
+
+
+def test_unknown_handshake(fake_serial):
+    with pytest.raises(ValueError):
+        Omicron_laser(fake_serial, handshake="fast")
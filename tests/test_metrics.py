@@ -0,0 +1,64 @@
+"""Tests for `omicron_laser.metrics`."""
+
+import asyncio
+
+import pytest
+
+from omicron_laser.aio import AsyncOmicronLaser
+from omicron_laser.core import Omicron_laser
+from omicron_laser.metrics import CommandMetrics, classify
+
+
+def test_classify():
+    assert classify(b"MDP", b"!MDP1.5\r") == "ok"
+    assert classify(b"LOn", b"!LOn>\r") == "ok"
+    assert classify(b"LOn", b"!LOnx\r") == "error"
+    assert classify(b"XYZ", b"!UK\r") == "malformed"
+    assert classify(b"MDP", b"!MD") == "timeout"
+    assert classify(b"MDP", b"") == "timeout"
+
+
+def test_histogram_and_hooks():
+    now = [0.0]
+    metrics = CommandMetrics(buckets=(0.01, 0.1), clock=lambda: now[0])
+    seen = []
+    metrics.on_request.append(lambda command, frame: seen.append(command))
+    metrics.on_response.append(
+        lambda command, raw, latency, outcome: seen.append(outcome))
+    for latency, raw in ((0.005, b"!MDP1\r"), (0.05, b"!MDP1\r"), (1, b"")):
+        start = metrics.request(b"MDP")
+        now[0] += latency
+        metrics.response(b"MDP", raw, start)
+    counters = metrics.snapshot()["MDP"]
+    assert counters["count"] == 3
+    assert counters["ok"] == 2 and counters["timeout"] == 1
+    assert counters["histogram"] == [1, 1, 1]
+    assert counters["max"] == pytest.approx(1)
+    assert seen == [b"MDP", "ok", b"MDP", "ok", b"MDP", "timeout"]
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_laser_commands_are_counted(fake_serial):
+    laser = Omicron_laser(fake_serial)
+    laser.measure_diode_power()
+    laser.set_auto_startup(True)
+    laser.query_many([b"MDP", b"MTD"])
+    laser._ask(b"XYZ")
+    metrics = laser.command_metrics()
+    assert metrics["MDP"]["count"] == 2
+    assert metrics["SAS"]["ok"] == 1
+    assert metrics["XYZ"]["malformed"] == 1
+    assert metrics["GFw"]["count"] == 1
+
+
+def test_async_laser_commands_are_counted(fake_connection):
+    laser = AsyncOmicronLaser(fake_connection)
+
+    async def run():
+        await laser.measure_diode_power()
+        await laser.query_many([b"MDP", b"GAS"])
+    asyncio.run(run())
+    metrics = laser.metrics.snapshot()
+    assert metrics["MDP"]["count"] == 2
+    assert metrics["GAS"]["ok"] == 1
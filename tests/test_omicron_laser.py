@@ -2,6 +2,9 @@
 
 """Tests for `omicron_laser` package."""
 
+import subprocess
+import sys
+
 import pytest
 
 
@@ -22,3 +25,55 @@ def test_content(response):
     """Sample pytest test function with the pytest fixture as an argument."""
     # from bs4 import BeautifulSoup
     # assert 'GitHub' in BeautifulSoup(response.content).title.string
+
+
+@pytest.fixture
+def laser(fake_serial):
+    return core.Omicron_laser(fake_serial)
+
+
+def test_identity(laser):
+    assert laser.model_code == "LuxX"
+    assert laser.device_id == "1234"
+    assert laser.firmware_version == "1.0.2"
+    assert laser.serial_number == "203541"
+
+
+def test_query_many_single_write(laser, fake_serial):
+    writes = []
+    write = fake_serial.write
+    fake_serial.write = lambda data: writes.append(data) or write(data)
+
+    power, temp_diode, temp_ambient, status, failure = laser.query_many(
+        [b"MDP", b"MTD", b"MTA", b"GAS", b"GFB"])
+
+    assert len(writes) == 1
+    assert (power, temp_diode, temp_ambient) == (12.5, 25.1, 22.4)
+    assert isinstance(status, core.Status) and status.on
+    assert failure == b"\x00\x00"
+
+
+def test_query_many_skips_adhoc(laser, fake_serial):
+    fake_serial.replies[b"?MDP|"] = [b"$TPP0.5|\r", b"!MDP3.5\r"]
+    assert laser.query_many([b"MDP", b"GLP"]) == [3.5, 0x19]
+    assert laser.temporal_power == 0.5
+
+
+def test_bad_reply_is_shown(laser, fake_serial):
+    fake_serial.replies[b"?MDP|"] = [b"!MDP\r"]
+    with pytest.raises(ValueError, match=r"b'!MDP\\r'"):
+        laser.measure_diode_power()
+    # A timed out reply.
+    fake_serial.replies[b"?GLP|"] = []
+    with pytest.raises(ValueError, match="b''"):
+        laser.get_level_power()
+
+
+def test_lazy_imports():
+    code = (
+        "import sys, omicron_laser, omicron_laser.tango.server\n"
+        "heavy = {'serial', 'asyncio', 'tango', 'connio', "
+        "'omicron_laser.core'} & set(sys.modules)\n"
+        "assert not heavy, heavy\n"
+        "assert omicron_laser.Omicron_laser.__module__ == 'omicron_laser.core'\n")
+    subprocess.run([sys.executable, "-c", code], check=True)
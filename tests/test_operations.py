@@ -0,0 +1,63 @@
+"""Tests for the non-blocking reset and calibration operations."""
+
+import concurrent.futures
+import time
+
+import pytest
+
+from omicron_laser.core import CalibrationResult, Omicron_laser
+from omicron_laser.simulator import Loopback
+from omicron_laser.simulator import Omicron_laser as Simulator
+
+
+@pytest.fixture
+def device():
+    return Simulator("laser", reset_time=0.2, calibration_time=0.2)
+
+
+@pytest.fixture(params=[False, True], ids=["reader", "dispatcher"])
+def laser(request, device):
+    laser = Omicron_laser(Loopback(device, timeout=0.02),
+                          dispatcher=request.param)
+    yield laser
+    laser.stop_dispatcher()
+
+
+def test_calibration_future_with_progress(laser):
+    steps = []
+    operation = laser.calibrate_async(
+        progress=lambda elapsed, raw: steps.append(elapsed))
+    assert not operation.done()
+    assert operation.result(timeout=2) is CalibrationResult.SUCCESS
+    assert steps and steps == sorted(steps)
+
+
+def test_reset_future(laser):
+    assert laser.reset_async().result(timeout=2) is True
+
+
+def test_timeout(laser):
+    operation = laser.calibrate_async(timeout=0.05)
+    with pytest.raises(TimeoutError):
+        operation.result(timeout=2)
+
+
+def test_cancel_running_operation(laser):
+    operation = laser.reset_async()
+    time.sleep(0.05)
+    assert operation.running()
+    assert operation.cancel()
+    with pytest.raises(concurrent.futures.CancelledError):
+        operation.result(timeout=2)
+    assert not operation.cancel()
+
+
+def test_telemetry_runs_during_calibration_with_dispatcher(device):
+    laser = Omicron_laser(Loopback(device, timeout=0.02), dispatcher=True)
+    operation = laser.calibrate_async()
+    time.sleep(0.05)
+    assert not operation.done()
+    assert laser.measure_temperature_ambient() > 0
+    assert not operation.done()
+    assert operation.result(timeout=2) is CalibrationResult.SUCCESS
+    laser.stop_dispatcher()
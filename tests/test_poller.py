@@ -0,0 +1,73 @@
+"""Tests for `omicron_laser.poller`."""
+
+import time
+
+import pytest
+
+from omicron_laser.archive import RECORD
+from omicron_laser.poller import FleetPoller, SampleRing
+
+
+def test_ring_read_and_overflow():
+    ring = SampleRing(4)
+    try:
+        for i in range(3):
+            ring.append(float(i), 1.5, 25.0, 22.0, 0x0243, 0, i)
+        records = ring.read()
+        assert records.dtype == RECORD
+        assert list(records["time"]) == [0.0, 1.0, 2.0]
+        assert list(records["latched_failure"]) == [0, 1, 2]
+        assert not len(ring.read())
+
+        for i in range(3, 13):
+            ring.append(float(i), 1.5, 25.0, 22.0, 0, 0, 0)
+        # The writer lapped the reader: only the last records survive.
+        assert list(ring.read()["time"]) == [10.0, 11.0, 12.0]
+        assert ring.dropped == 7
+
+        # Another view of the same memory, like a worker process has.
+        writer = SampleRing(4, ring.shm)
+        writer.append(13.0, 1.5, 25.0, 22.0, 0, 0, 0)
+        assert list(ring.read()["time"]) == [13.0]
+        del writer.header, writer.records
+    finally:
+        ring.close(unlink=True)
+
+
+def test_fleet_poller(simulator_url):
+    port = simulator_url.rsplit(":", 1)[1]
+    urls = ["socket://127.0.0.1:" + port, "socket://localhost:" + port]
+    with FleetPoller(urls, processes=2, capacity=256, period=0.01) as poller:
+        samples = {url: [] for url in urls}
+        deadline = time.monotonic() + 5
+        while min(map(len, samples.values())) < 5 and \
+                time.monotonic() < deadline:
+            time.sleep(0.05)
+            for url, records in poller.read().items():
+                samples[url].extend(records)
+        info = poller.info()
+    for url in urls:
+        assert len(samples[url]) >= 5
+        times = [record["time"] for record in samples[url]]
+        assert times == sorted(times)
+        assert info[url]["running"] and not info[url]["errors"]
+        assert info[url]["dropped"] == 0
+
+
+def test_fleet_poller_restart(simulator_url):
+    url = simulator_url.replace("tcp://", "socket://")
+    with FleetPoller([url], capacity=256, period=0.01) as poller:
+        poller.stop()
+        written = poller.info()[url]["written"]
+        poller.start()
+        time.sleep(0.2)
+        assert poller.info()[url]["running"]
+        assert poller.info()[url]["written"] > written
+        assert len(poller.read()[url]) > written
+
+
+def test_fleet_poller_bad_port():
+    poller = FleetPoller(["/dev/does-not-exist"])
+    with pytest.raises(ConnectionError):
+        poller.start()
+    poller.close()
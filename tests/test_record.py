@@ -0,0 +1,94 @@
+"""Tests for `omicron_laser.record`."""
+
+import io
+import time
+
+import pytest
+
+from omicron_laser.core import Omicron_laser
+from omicron_laser.record import (READ, WRITE, RecordingConnection,
+                                  ReplayConnection, load, parse)
+
+
+def session(laser):
+    return (laser.serial_number, laser.measure_diode_power(),
+            laser.get_status(), laser.query_many([b"MTD", b"GLF"]),
+            laser.laser_on(), laser.reset(),
+            laser.calibrate_laser_diode())
+
+
+@pytest.fixture
+def recording(tmp_path, fake_serial):
+    path = tmp_path / "session.omlr"
+    with open(path, "wb") as file:
+        expected = session(Omicron_laser(RecordingConnection(fake_serial, file)))
+    return path, expected
+
+
+def test_recording_format(recording):
+    path, _ = recording
+    records = load(path)
+    assert records[0] == (WRITE, records[0].time, b"?GFw|\r")
+    assert records[1].direction == READ
+    assert b"".join(record.data for record in records
+                    if record.direction == READ).count(b"\r") > 10
+    times = [record.time for record in records]
+    assert times == sorted(times)
+
+
+def test_replay(recording):
+    path, expected = recording
+    conn = ReplayConnection(str(path), speed=float("inf"))
+    assert session(Omicron_laser(conn)) == expected
+    with pytest.raises(EOFError):
+        conn.write(b"?MDP|\r")
+
+
+def test_replay_strict(recording):
+    path, _ = recording
+    conn = ReplayConnection(load(path))
+    with pytest.raises(ValueError):
+        conn.write(b"?MDP|\r")
+
+
+def test_replay_timing(fake_serial):
+    buffer = io.BytesIO()
+    now = [0.0]
+    conn = RecordingConnection(fake_serial, buffer, clock=lambda: now[0])
+    conn.write(b"?MDP|\r")
+    now[0] = 0.2
+    conn.read_until(b"\r")
+    now[0] = 0.5
+    assert conn.read_until(b"\r") == b""
+
+    records = parse(buffer.getvalue())
+    replay = ReplayConnection(records, speed=2)
+    replay.write(b"?MDP|\r")
+    assert replay.in_waiting == 0
+    start = time.monotonic()
+    assert replay.read_until(b"\r") == fake_serial.replies[b"?MDP|"][0]
+    assert time.monotonic() - start == pytest.approx(0.1, abs=0.05)
+    # The recorded timeout comes back, also scaled.
+    assert replay.read_until(b"\r") == b""
+    assert time.monotonic() - start == pytest.approx(0.25, abs=0.05)
+
+
+class LineSerial:
+    """Port without in_waiting, read a line at a time."""
+
+    def __init__(self, fake_serial):
+        self._fake = fake_serial
+        self.write = fake_serial.write
+        self.read_until = fake_serial.read_until
+
+    def close(self):
+        pass
+
+
+def test_recording_without_in_waiting(fake_serial):
+    conn = RecordingConnection(LineSerial(fake_serial), io.BytesIO())
+    assert not hasattr(type(conn), "in_waiting")
+    assert hasattr(type(RecordingConnection(fake_serial, io.BytesIO())),
+                   "in_waiting")
+    laser = Omicron_laser(conn)
+    assert laser.measure_diode_power() == 12.5
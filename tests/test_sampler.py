@@ -0,0 +1,45 @@
+"""Tests for `omicron_laser.sampler`."""
+
+import numpy
+import pytest
+
+from omicron_laser.core import Omicron_laser
+from omicron_laser.sampler import RingBuffer, Sampler
+
+
+def test_ring_buffer_wraps():
+    buffer = RingBuffer(4)
+    for i in range(6):
+        buffer.append(float(i), 2.0 * i)
+    times, values = buffer.window()
+    assert len(buffer) == 4
+    assert list(times) == [2, 3, 4, 5]
+    assert list(values) == [4, 6, 8, 10]
+    assert buffer.latest() == (5.0, 10.0)
+    assert list(buffer.window(window=1.5)[0]) == [4, 5]
+
+
+def test_ring_buffer_stats():
+    buffer = RingBuffer(10)
+    for i in range(5):
+        buffer.append(float(i), 3.0 * i + 1)
+    stats = buffer.stats()
+    assert stats["count"] == 5
+    assert stats["min"] == 1 and stats["max"] == 13
+    assert stats["mean"] == pytest.approx(7)
+    assert stats["slope"] == pytest.approx(3)
+    assert numpy.isnan(RingBuffer(3).stats()["mean"])
+
+
+def test_sampler_batches_due_channels(fake_serial):
+    laser = Omicron_laser(fake_serial)
+    sampler = Sampler(laser, {b"MDP": 10, b"GAS": 1}, capacity=8)
+    sampler.sample([b"MDP", b"GAS"], timestamp=100.0)
+    assert sampler[b"MDP"].latest() == (100.0, 12.5)
+    assert sampler[b"GAS"].latest() == (100.0, 0x0243)
+    assert sampler[b"GAS"].values.dtype == numpy.uint16
+
+
+def test_sampler_rejects_unknown_channel(fake_serial):
+    with pytest.raises(ValueError):
+        Sampler(Omicron_laser(fake_serial), {b"XYZ": 1})
@@ -0,0 +1,72 @@
+"""Tests for `omicron_laser.scheduler`."""
+
+import threading
+import time
+
+from omicron_laser.core import CalibrationResult, Omicron_laser
+from omicron_laser.scheduler import (CONTROL, SAFETY, TELEMETRY,
+                                     PriorityScheduler)
+from omicron_laser.simulator import Loopback
+from omicron_laser.simulator import Omicron_laser as Simulator
+
+
+def test_priority_order():
+    scheduler = PriorityScheduler()
+    order = []
+    scheduler.acquire(CONTROL)
+
+    def worker(priority, name):
+        with scheduler.slot(priority):
+            order.append(name)
+
+    threads = [threading.Thread(target=worker, args=args) for args in
+               [(TELEMETRY, "telemetry"), (CONTROL, "control"),
+                (SAFETY, "safety")]]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    assert scheduler.metrics()["telemetry"]["depth"] == 1
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+    assert order == ["safety", "control", "telemetry"]
+    assert scheduler.metrics()["safety"]["granted"] == 1
+
+
+def test_reentrant():
+    scheduler = PriorityScheduler()
+    with scheduler.slot(CONTROL):
+        with scheduler.slot(TELEMETRY):
+            pass
+    assert not scheduler.waiting(TELEMETRY)
+
+
+def test_laser_off_preempts_calibration():
+    device = Simulator("laser", calibration_time=0.5)
+    laser = Omicron_laser(Loopback(device, timeout=0.02))
+    result = []
+    calibration = threading.Thread(
+        target=lambda: result.append(laser.calibrate_laser_diode()))
+    calibration.start()
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    assert laser.laser_off()
+    assert time.monotonic() - start < 0.1
+
+    calibration.join()
+    assert result == [CalibrationResult.SUCCESS]
+    assert laser.scheduler_metrics()["safety"]["granted"] == 1
+
+
+def test_temporary_power_query_is_telemetry(fake_serial):
+    laser = Omicron_laser(fake_serial)
+
+    def granted(name):
+        return laser.scheduler_metrics()[name]["granted"]
+    telemetry, control = granted("telemetry"), granted("control")
+    laser.get_temporary_power()
+    assert (granted("telemetry"), granted("control")) == (telemetry + 1, control)
+    laser.set_temporary_power(0.01)
+    assert (granted("telemetry"), granted("control")) == (telemetry + 1,
+                                                          control + 1)
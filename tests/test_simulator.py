@@ -0,0 +1,70 @@
+"""Tests for `omicron_laser.simulator`."""
+
+import time
+
+import pytest
+
+from omicron_laser.core import CalibrationResult, Omicron_laser
+from omicron_laser.simulator import Loopback
+from omicron_laser.simulator import Omicron_laser as Simulator
+
+
+@pytest.fixture
+def device():
+    return Simulator("laser", reset_time=0.01, calibration_time=0.01)
+
+
+@pytest.fixture
+def laser(device):
+    return Omicron_laser(Loopback(device, timeout=0.05))
+
+
+def test_identity(laser, device):
+    assert laser.model_code == device.model_code
+    assert laser.serial_number == device.serial_number
+    assert laser.get_maximum_power() == device.max_power
+
+
+def test_power_cycle(laser):
+    assert laser.get_status().system_power
+    assert laser.set_level_power(0x800)
+    assert laser.get_level_power() == 0x800
+    assert laser.temporal_power == pytest.approx(50, abs=0.1)
+    assert laser.laser_on()
+    assert laser.get_status().on
+    assert laser.measure_diode_power() == pytest.approx(50, rel=0.05)
+    assert laser.power_off()
+    status = laser.get_status()
+    assert not status.on and not status.system_power
+    assert not laser.laser_on()
+
+
+def test_operation_mode_roundtrip(laser):
+    mode = laser.get_operation_mode()
+    assert mode.usb_adhoc_mode and mode.auto_powerup
+    mode.usb_adhoc_mode = False
+    assert laser.update_operation_mode()
+    assert not laser.get_operation_mode().usb_adhoc_mode
+    assert laser.set_auto_startup(False)
+    assert not laser.get_operation_mode().auto_startup
+
+
+def test_failures(laser, device):
+    device.latched_failure = 0x0200
+    assert laser.get_status().error
+    assert laser.get_latched_failure().external_interlock
+    assert laser.reset()
+    assert not laser.get_status().error
+
+
+def test_calibration(laser):
+    assert laser.calibrate_laser_diode() is CalibrationResult.SUCCESS
+
+
+def test_latency_and_baudrate(device):
+    device.latency = 0.01
+    device.baudrate = 9600
+    laser = Omicron_laser(Loopback(device), handshake="lazy")
+    start = time.monotonic()
+    laser.measure_temperature_ambient()
+    assert time.monotonic() - start >= 0.01 + 10 * 10 / 9600
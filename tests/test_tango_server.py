@@ -0,0 +1,56 @@
+"""Tests for `omicron_laser.tango.server`."""
+
+import json
+import time
+
+import pytest
+
+tango = pytest.importorskip("tango")
+
+from tango.test_context import DeviceTestContext  # noqa: E402
+
+from omicron_laser.tango.server.omicron_laser import Omicron_laser  # noqa: E402
+
+
+@pytest.fixture
+def proxy(simulator_url):
+    properties = dict(url=simulator_url, polling_period=0.05)
+    with DeviceTestContext(Omicron_laser, properties=properties,
+                           green_mode=tango.GreenMode.Asyncio,
+                           process=True) as proxy:
+        yield proxy
+
+
+def test_snapshot_and_events(proxy):
+    assert proxy.state() == tango.DevState.STANDBY
+    assert proxy.serial_number == "203541"
+    assert proxy.system_power and not proxy.on
+
+    proxy.level_power = 50
+    assert proxy.laser_on()
+    assert proxy.state() == tango.DevState.ON
+    assert proxy.level_power == pytest.approx(50, abs=0.1)
+
+    values = []
+    event_id = proxy.subscribe_event(
+        "diode_power", tango.EventType.CHANGE_EVENT,
+        lambda event: values.append(event.attr_value))
+    time.sleep(0.3)
+    proxy.unsubscribe_event(event_id)
+    values = [value.value for value in values if value is not None]
+    assert len(values) > 1
+    assert values[-1] == pytest.approx(50, rel=0.05)
+
+
+def test_long_operations_return_at_once(proxy):
+    for name, result in (("reset", True),
+                         ("calibrate_laser_diode", "SUCCESS")):
+        assert proxy.command_inout(name)
+        deadline = time.monotonic() + 5
+        operation = json.loads(proxy.operation)
+        while operation["running"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+            operation = json.loads(proxy.operation)
+        assert operation["name"] == name
+        assert operation["result"] == result and operation["error"] is None
+    assert proxy.state() == tango.DevState.STANDBY
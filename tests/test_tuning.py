@@ -0,0 +1,63 @@
+"""Tests for `omicron_laser.tuning`."""
+
+import logging
+
+import pytest
+
+from omicron_laser.core import CalibrationResult, Omicron_laser
+from omicron_laser.tuning import AdaptiveTimeouts, probe_baudrate
+
+
+def test_timeout_follows_latency():
+    timeouts = AdaptiveTimeouts(min_samples=4, update=4)
+    assert timeouts.get(b"GAS") == 0.1
+    assert timeouts.get(b"RsC") == 1.0
+    for _ in range(4):
+        timeouts.observe(b"GAS", b"!GAS\x00\x00\r", 0.002, "ok")
+    # 0.002 * 1.5 + 0.002
+    assert timeouts.get(b"GAS") == pytest.approx(0.005)
+    timeouts.observe(b"GAS", b"", 0.005, "timeout")
+    assert timeouts.get(b"GAS") == pytest.approx(0.01)
+    for _ in range(400):
+        timeouts.observe(b"GAS", b"!GAS\x00\x00\r", 1.0, "ok")
+    assert timeouts.get(b"GAS") == 0.5
+    assert timeouts.info()["GAS"] == dict(timeout=0.5, samples=256)
+
+
+def test_laser_adapts_timeout(threaded_serial):
+    timeouts = AdaptiveTimeouts(min_samples=4, update=4)
+    laser = Omicron_laser(threaded_serial, adaptive_timeout=timeouts)
+    for _ in range(8):
+        laser.get_status()
+    assert threaded_serial.timeout == timeouts.get(b"GAS") < 0.05
+    assert laser.timeout_info()["GAS"]["samples"] == 8
+
+
+def test_late_reply_dropped(threaded_serial, caplog):
+    laser = Omicron_laser(threaded_serial, adaptive_timeout=True)
+    # A reply that arrived after its request timed out.
+    threaded_serial._rx += b"!MTD25.0\r"
+    assert laser.measure_diode_power() == pytest.approx(
+        float(threaded_serial.replies[b"?MDP|"][0][4:-1]))
+
+    # Not the acknowledgement of a setter either.
+    threaded_serial._rx += b"!MTD25.0\r"
+    assert laser.set_auto_powerup(True)
+
+    # Nor of a reset or calibration.
+    threaded_serial._rx += b"!MDP12.5\r"
+    assert laser.reset(timeout=1)
+    threaded_serial.replies[b"?CLD|"] = [
+        b"!CLD>\r", b"!MDP12.5\r", b"!GCI0\r", b"$CLD0\r"]
+    with caplog.at_level(logging.INFO):
+        assert laser.calibrate_laser_diode(timeout=1) is \
+            CalibrationResult.SUCCESS
+    assert "Laser GCI: b'!GCI0\\r'" in caplog.text
+
+
+def test_probe_baudrate():
+    result = probe_baudrate("loop://", baudrates=(500000, 9600), queries=3,
+                            timeout=0.01)
+    # Nothing answers on a loopback port: the request comes back.
+    assert result["recommended"] is None
+    assert result["results"][500000]["errors"] == 3